@@ -1,6 +0,0 @@
-touch auth_service/__init__.py
-touch note_service/__init__.py
-touch note_service/ai/__init__.py
-touch note_service/daos/__init__.py
-touch note_service/models/__init__.py
-touch note_service/services/__init__.py
\ No newline at end of file
@@ -1,13 +1,18 @@
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 
-import jwt
 from passlib.context import CryptContext
-from auth_service.database import get_db_cursor
+from common.cache import TTLCache
+from common.metrics import timed_db
+from auth_service.database import DBSession, db_cursor
+# JWT helpers live in tokens.py (shared with the other services); re-exported here
+from auth_service.tokens import JWT_ALG, JWT_EXP_MIN, JWT_SECRET, create_jwt, parse_jwt  # noqa: F401
 
 # ---------- Password hashing ----------
-pwd_context = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto")
+# Cost factor (log2 iterations). Hashes made with a different cost are
+# rehashed on the user's next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto", bcrypt_sha256__rounds=BCRYPT_ROUNDS)
 
 def hash_password(plain: str) -> str:
     return pwd_context.hash(plain or "")
@@ -18,14 +23,20 @@ def verify_password(plain: str, hashed: str) -> bool:
     except Exception:
         return False
 
-# ---------- Database user lookup ----------
-def get_user_by_email(email: str) -> Optional[Dict]:
-    """
-    Query the database for a user by email.
-    Returns user dict with 'id', 'email', 'password_hash' if found, else None.
-    """
-    conn, cur = get_db_cursor()
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """(valid, replacement hash if hashed uses outdated parameters, else None)"""
     try:
+        return pwd_context.verify_and_update(plain or "", hashed or "")
+    except Exception:
+        return False, None
+
+# ---------- Database user lookup ----------
+# Functions taking `db` run on the request's shared connection when given one
+# (see database.get_db_session), otherwise on a connection of their own.
+@timed_db("auth", "query_user_by_email")
+def _query_user_by_email(email: str, db: Optional[DBSession] = None) -> Optional[Dict]:
+    """Like get_user_by_email, but database errors propagate (so they are never cached)."""
+    with db_cursor(db) as cur:
         cur.execute("SELECT id, email, password FROM app_user WHERE email = %s", (email,))
         row = cur.fetchone()
         if not row:
@@ -36,19 +47,24 @@ def get_user_by_email(email: str) -> Optional[Dict]:
             "email": row["email"],
             "password_hash": row["password"],  # Database stores as 'password'
         }
+
+def get_user_by_email(email: str, db: Optional[DBSession] = None) -> Optional[Dict]:
+    """
+    Query the database for a user by email.
+    Returns user dict with 'id', 'email', 'password_hash' if found, else None.
+    """
+    try:
+        return _query_user_by_email(email, db)
     except Exception as e:
         print(f"Error querying user: {e}")
         return None
-    finally:
-        cur.close()
-        conn.close()
 
-def verify_credentials(email: str, password: str) -> Optional[Dict]:
+def verify_credentials(email: str, password: str, db: Optional[DBSession] = None) -> Optional[Dict]:
     """
     Verify credentials against database.
     Return full user dict (with 'id', 'email', 'password_hash') if valid, else None.
     """
-    user = get_user_by_email(email)
+    user = get_user_by_email(email, db)
     if not user:
         return None
     
@@ -57,64 +73,104 @@ def verify_credentials(email: str, password: str) -> Optional[Dict]:
     
     return user
 
-def user_id_for_email(email: str) -> Optional[str]:
+# ---------- email -> user id cache ----------
+# /auth/me resolves the id on every page load. Unknown emails are cached too
+# (briefly), so a stale cookie for a missing account doesn't hit the database
+# on every request either. Per process; call invalidate_user() whenever a user
+# is created or their email/id changes.
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))  # seconds; 0 disables
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "5"))  # seconds
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+_NO_USER = ""
+
+user_id_cache: TTLCache[str] = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def _email_key(email: str) -> str:
+    # app_user.email is CITEXT
+    return email.lower()
+
+def invalidate_user(email: str) -> None:
+    user_id_cache.invalidate(_email_key(email))
+
+def user_id_for_email(email: str, db: Optional[DBSession] = None) -> Optional[str]:
     """
     Get user ID from database for a given email.
     Returns the user ID if found, otherwise returns None.
     """
-    user = get_user_by_email(email)
+    key = _email_key(email)
+    cached = user_id_cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    token = user_id_cache.token()
+    try:
+        user = _query_user_by_email(email, db)
+    except Exception as e:
+        print(f"Error querying user: {e}")
+        return None
     if user:
+        user_id_cache.set(key, user["id"], token)
         return user["id"]
+    user_id_cache.set(key, _NO_USER, token, ttl=USER_CACHE_NEGATIVE_TTL)
     return None
 
-def create_user(email: str, password: str) -> Optional[Dict]:
+@timed_db("auth")
+def update_password_hash(user_id: str, password_hash: str, db: Optional[DBSession] = None) -> None:
+    """Store a rehashed password (after a login with outdated hash parameters)."""
+    try:
+        with db_cursor(db) as cur:
+            cur.execute("UPDATE app_user SET password = %s WHERE id = %s", (password_hash, user_id))
+    except Exception as e:
+        print(f"Error updating password hash: {e}")
+
+@timed_db("auth")
+def create_user(
+    email: str, password: str, password_hash: Optional[str] = None, db: Optional[DBSession] = None
+) -> Optional[Dict]:
     """
     Create a new user in the database.
-    Returns user dict with 'id', 'email', 'password_hash' if successful, else None.
+    Pass password_hash when the password was already hashed (see hashing.PasswordHasher).
+    Returns user dict with 'id', 'email', 'password_hash' if successful, else None
+    (also when the email is taken).
+
+    One statement, one round trip: the unique email constraint decides, so
+    concurrent signups for the same email can't both pass a separate existence check.
     """
     import uuid
-    conn, cur = get_db_cursor()
-    try:
-        # Check if user already exists
-        existing_user = get_user_by_email(email)
-        if existing_user:
-            return None
-        
-        # Create new user
-        user_id = str(uuid.uuid4())
+    if password_hash is None:
         password_hash = hash_password(password)
-        
-        cur.execute(
-            "INSERT INTO app_user (id, email, password) VALUES (%s, %s, %s)",
-            (user_id, email, password_hash)
-        )
-        conn.commit()
-        
-        return {
-            "id": user_id,
-            "email": email,
-            "password_hash": password_hash
-        }
+    try:
+        with db_cursor(db) as cur:
+            cur.execute("""
+                INSERT INTO app_user (id, email, password) VALUES (%s, %s, %s)
+                ON CONFLICT (email) DO NOTHING
+                RETURNING id, email
+            """, (str(uuid.uuid4()), email, password_hash))
+            row = cur.fetchone()
     except Exception as e:
         print(f"Error creating user: {e}")
-        conn.rollback()
         return None
-    finally:
-        cur.close()
-        conn.close()
+    if not row:
+        return None
+    # Drop a cached "no such user" for this email
+    invalidate_user(email)
+    
+    return {
+        "id": str(row["id"]),
+        "email": row["email"],
+        "password_hash": password_hash
+    }
 
 # ---------- JWT ----------
-JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
-JWT_ALG = "HS256"
-JWT_EXP_MIN = int(os.getenv("JWT_EXP_MIN", "120"))
-
-def create_jwt(sub: str) -> str:
-    now = datetime.utcnow()
-    payload = {"sub": sub, "iat": now, "exp": now + timedelta(minutes=JWT_EXP_MIN)}
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
+# Fast mode: trust the uid/email claims of tokens issued with them instead of
+# looking the user up. A deleted user stays signed in until the token expires.
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "0").lower() in ("1", "true", "yes", "on")
 
-def parse_jwt(token: str) -> Optional[dict]:
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-    except Exception:
-        return None
\ No newline at end of file
+def user_from_claims(payload: dict) -> Optional[Dict]:
+    """{'id', 'email'} straight from a verified token, in fast mode, if it carries them."""
+    if not AUTH_TRUST_TOKEN_CLAIMS:
+        return None
+    uid, email = payload.get("uid"), payload.get("email")
+    if not uid or not email:
+        return None
+    return {"id": uid, "email": email}
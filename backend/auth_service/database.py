@@ -1,7 +1,10 @@
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from contextlib import contextmanager
+from typing import Optional
 import os
 
+from common.db import connect as instrumented_connect
+
 DATABASE_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
     'port': os.getenv('DB_PORT', 5432),
@@ -11,11 +14,58 @@ DATABASE_CONFIG = {
 }
 
 def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(**DATABASE_CONFIG)
+    """Get database connection (metrics and tracing: see common/db.py)"""
+    return instrumented_connect(**DATABASE_CONFIG)
 
 def get_db_cursor():
     """Get database cursor with dict-like access"""
     conn = get_db_connection()
     return conn, conn.cursor(cursor_factory=RealDictCursor)
 
+class DBSession:
+    """
+    One connection per request, opened on first use and shared by every query
+    the request makes. Autocommit: each statement is its own transaction, so a
+    lookup doesn't leave the connection idle in a transaction while the request
+    waits on something else (e.g. password hashing).
+    """
+
+    def __init__(self):
+        self._conn = None
+
+    def connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = get_db_connection()
+            self._conn.autocommit = True
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def get_db_session():
+    """FastAPI dependency: a DBSession closed when the request is done"""
+    session = DBSession()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@contextmanager
+def db_cursor(db: Optional[DBSession] = None):
+    """Dict cursor on the request's shared connection, or on a new one that is closed afterwards"""
+    if db is not None:
+        conn = db.connection()
+        owned = False
+    else:
+        conn = get_db_connection()
+        conn.autocommit = True
+        owned = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        yield cur
+    finally:
+        cur.close()
+        if owned:
+            conn.close()
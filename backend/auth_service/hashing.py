@@ -0,0 +1,82 @@
+"""
+Password hashing off the request threadpool.
+
+bcrypt is deliberately slow CPU work; run on Starlette's shared threadpool, a
+burst of logins starves cheap endpoints (/healthz, /auth/me) and, holding the
+GIL for parts of it, the event loop too. PasswordHasher runs it in a process
+pool sized to the machine instead, and sheds load once HASH_QUEUE_SIZE requests
+are waiting: callers get HasherBusyError, which the API turns into
+503 + Retry-After, instead of queuing without bound.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from auth_service.auth import hash_password, verify_and_update_password
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))  # 0 = threads instead of processes
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", str(4 * max(1, HASH_WORKERS))))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "1"))  # seconds, sent as Retry-After
+
+
+class HasherBusyError(Exception):
+    """All workers are busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int = HASH_RETRY_AFTER):
+        super().__init__("Too many sign-in requests, try again shortly")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.limit = max(1, workers) + queue_size
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn: the server process has threads, which don't mix with fork
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._pool
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.limit:
+                raise HasherBusyError()
+            self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def hash(self, plain: str) -> str:
+        return await self._run(hash_password, plain)
+
+    async def verify_and_update(self, plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash if the stored one uses outdated parameters)."""
+        return await self._run(verify_and_update_password, plain, hashed)
+
+    def start(self) -> None:
+        """Start the worker processes now rather than on the first login."""
+        pool = self._executor()
+        if pool is not None:
+            for _ in range(self.workers):
+                pool.submit(hash_password, "warm-up")
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -1,14 +1,29 @@
 from fastapi import FastAPI, Depends, HTTPException, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
 import argparse
 import uvicorn
 import os
 
-from auth_service.auth import verify_credentials, create_jwt, parse_jwt, user_id_for_email, create_user
+from auth_service.auth import (
+    create_user,
+    get_user_by_email,
+    update_password_hash,
+    user_from_claims,
+    user_id_for_email,
+)
+from auth_service.tokens import COOKIE_NAME, create_jwt, parse_jwt
+from auth_service.database import DBSession, get_db_session
+from auth_service.hashing import HasherBusyError, PasswordHasher
 from auth_service.schemas import LoginRequest, SignupRequest, UserPublic
+from common.metrics import MetricsMiddleware, metrics_response
+from common.tracing import TracedJSONResponse, TracingMiddleware, exporter_from_env
+from common.profiling import ProfilingMiddleware
+from common.watchdog import LoopWatchdogMiddleware, loop_watchdog
 
-app = FastAPI(title="Auth Service", version="1.0.0")
+app = FastAPI(title="Auth Service", version="1.0.0", default_response_class=TracedJSONResponse)
 
 # Frontend origin for dev (Vite default)
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
@@ -20,8 +35,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so latency covers every middleware
+app.add_middleware(MetricsMiddleware)
+# Spans, slow-request log and (with OTEL_EXPORTER_OTLP_ENDPOINT) OTLP export
+trace_exporter = exporter_from_env("auth_service")
+app.add_middleware(TracingMiddleware, service_name="auth_service", exporter=trace_exporter)
+if trace_exporter:
+    app.add_event_handler("shutdown", trace_exporter.shutdown)
+# Opt-in profiles of single requests (X-Profile: $PROFILE_TOKEN, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware, service_name="auth_service")
+# Warns (slowlog + event_loop_blocked_total) when a handler blocks the event loop
+app.add_middleware(LoopWatchdogMiddleware)
+
+# The watchdog's heartbeat also records event_loop_lag_seconds
+app.add_event_handler("startup", loop_watchdog.start)
+app.add_event_handler("shutdown", loop_watchdog.stop)
+
+# bcrypt runs in its own process pool, not on the request threadpool
+password_hasher = PasswordHasher()
+app.add_event_handler("startup", password_hasher.start)
+app.add_event_handler("shutdown", password_hasher.shutdown)
+
+@app.exception_handler(HasherBusyError)
+async def hasher_busy_handler(request: Request, exc: HasherBusyError):
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-COOKIE_NAME = "access_token"
 COOKIE_MAX_AGE = 60 * 60 * 24  # 1 day
 
 def _unpack_sub(sub: str) -> tuple[str, str]:
@@ -40,37 +82,47 @@ def _unpack_sub(sub: str) -> tuple[str, str]:
     # otherwise treat as id only
     return (sub, "user@example.com")
 
-def get_current_user(request: Request) -> Optional[UserPublic]:
+def get_current_user(request: Request, db: DBSession = Depends(get_db_session)) -> Optional[UserPublic]:
     token = request.cookies.get(COOKIE_NAME)
     if not token:
         return None
     payload = parse_jwt(token)
     if not payload:
         return None
+    claimed = user_from_claims(payload)
+    if claimed:
+        return UserPublic(id=claimed["id"], email=claimed["email"])
     sub = payload.get("sub") or ""
     uid, email = _unpack_sub(sub)
     if not uid or not email:
         return None
     # Always use the current user_id_for_email to ensure correct ID
     # This fixes the issue where old tokens have outdated user IDs
-    current_uid = user_id_for_email(email)
+    # (cached per process, see USER_CACHE_TTL)
+    current_uid = user_id_for_email(email, db)
     if not current_uid:
         return None
     return UserPublic(id=current_uid, email=email)
 
 @app.post("/auth/login", response_model=UserPublic)
-def login(payload: LoginRequest, response: Response):
+async def login(payload: LoginRequest, response: Response, db: DBSession = Depends(get_db_session)):
     """
     Verifies credentials. On success, sets an HttpOnly cookie with the JWT.
     Returns a minimal user object (no token in body).
     """
-    user = verify_credentials(payload.email, payload.password)
+    user = await run_in_threadpool(get_user_by_email, payload.email, db)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await password_hasher.verify_and_update(payload.password, user["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS
+        await run_in_threadpool(update_password_hash, user["id"], new_hash, db)
 
     # Encode both id and email into sub so we can reconstruct the user from the cookie later.
     sub_value = f"{user['id']}|{user['email']}"
-    token = create_jwt(sub=sub_value)
+    token = create_jwt(sub=sub_value, uid=user["id"], email=user["email"])
 
     response.set_cookie(
         key=COOKIE_NAME,
@@ -86,18 +138,19 @@ def login(payload: LoginRequest, response: Response):
     return UserPublic(id=user["id"], email=user["email"])
 
 @app.post("/auth/register", response_model=UserPublic)
-def register(payload: SignupRequest, response: Response):
+async def register(payload: SignupRequest, response: Response, db: DBSession = Depends(get_db_session)):
     """
     Creates a new user account. On success, sets an HttpOnly cookie with the JWT.
     Returns a minimal user object (no token in body).
     """
-    user = create_user(payload.email, payload.password)
+    password_hash = await password_hasher.hash(payload.password)
+    user = await run_in_threadpool(create_user, payload.email, payload.password, password_hash, db)
     if not user:
         raise HTTPException(status_code=400, detail="Email already exists or registration failed")
 
     # Encode both id and email into sub so we can reconstruct the user from the cookie later.
     sub_value = f"{user['id']}|{user['email']}"
-    token = create_jwt(sub=sub_value)
+    token = create_jwt(sub=sub_value, uid=user["id"], email=user["email"])
 
     response.set_cookie(
         key=COOKIE_NAME,
@@ -121,6 +174,11 @@ def logout(response: Response):
 def me(user: Optional[UserPublic] = Depends(get_current_user)):
     return user
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format: request latency, DAO timings, connections, event loop lag"""
+    return metrics_response()
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
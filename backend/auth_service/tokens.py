@@ -0,0 +1,40 @@
+"""
+JWT issuing and verification.
+
+Kept free of database and password-hashing imports: the note and document
+services import this module (through common.auth) to verify the session
+cookie locally, with the same secret and algorithm.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import jwt
+
+COOKIE_NAME = "access_token"
+
+JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
+JWT_ALG = "HS256"
+JWT_EXP_MIN = int(os.getenv("JWT_EXP_MIN", "120"))
+
+def create_jwt(sub: str, uid: Optional[str] = None, email: Optional[str] = None) -> str:
+    now = datetime.utcnow()
+    payload = {"sub": sub, "iat": now, "exp": now + timedelta(minutes=JWT_EXP_MIN)}
+    if uid and email:
+        # Taken from the database row at login/registration
+        payload["uid"] = uid
+        payload["email"] = email
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
+
+def parse_jwt(token: str) -> Optional[dict]:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    except Exception:
+        return None
+
+def user_id_from_claims(payload: dict) -> Optional[str]:
+    """
+    The user id a verified token was issued for: its uid claim. Tokens without
+    one (issued before login set it) identify nobody; their sub may hold a stale id.
+    """
+    return payload.get("uid") or None
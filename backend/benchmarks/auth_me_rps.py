@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Requests per second of GET /auth/me for each way of resolving the user:
+
+    uncached  a database query per request (the user id cache disabled)
+    cached    email -> user id from the per-process TTL cache
+    claims    AUTH_TRUST_TOKEN_CLAIMS: uid/email taken from the verified token
+
+Drives the app in-process through httpx's ASGITransport (no network, so the
+numbers are the service's own cost), with --concurrency requests in flight.
+Needs the database and an existing user (the demo user by default).
+
+    cd backend && python benchmarks/auth_me_rps.py
+    python benchmarks/auth_me_rps.py --seconds 10 --concurrency 32 --email demo@user.com
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import httpx  # noqa: E402
+
+from auth_service import auth  # noqa: E402
+from common.cache import TTLCache  # noqa: E402
+from auth_service.main import COOKIE_NAME, app  # noqa: E402
+
+
+def configure(mode: str) -> None:
+    auth.AUTH_TRUST_TOKEN_CLAIMS = mode == "claims"
+    ttl = 0 if mode == "uncached" else auth.USER_CACHE_TTL or 300
+    auth.user_id_cache = TTLCache(maxsize=auth.USER_CACHE_SIZE, ttl=ttl)
+
+
+async def run(token: str, seconds: float, concurrency: int) -> tuple:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={COOKIE_NAME: token}) as client:
+        # Warm up (and fill the cache)
+        response = await client.get("/auth/me")
+        if response.status_code != 200 or not response.json():
+            raise SystemExit(f"/auth/me did not return the user: {response.status_code} {response.text}")
+
+        deadline = time.perf_counter() + seconds
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/auth/me")
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    return len(latencies) / elapsed, p50, p99
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", default="demo@user.com", help="Existing user to sign in as")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration per mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", default="uncached,cached,claims")
+    args = parser.parse_args()
+
+    user = auth.get_user_by_email(args.email)
+    if not user:
+        raise SystemExit(f"No user {args.email!r} (is the database up?)")
+    token = auth.create_jwt(f"{user['id']}|{user['email']}", uid=user["id"], email=user["email"])
+
+    print(f"{'mode':<10} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes.split(","):
+        configure(mode)
+        rps, p50, p99 = asyncio.run(run(token, args.seconds, args.concurrency))
+        print(f"{mode:<10} {rps:>9.0f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the service entry modules.
+
+Imports each module in a fresh interpreter with `-X importtime`, reports the
+cumulative import time and fails (exit code 1) if a module exceeds its budget
+or pulls in a module that must stay lazy (e.g. the Gemini SDK).
+
+    cd backend && python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 800 --module note_service.main
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+# module -> modules that must NOT be imported as a side effect of importing it
+DEFAULT_CHECKS = {
+    "note_service.main": ["google.generativeai", "dotenv"],
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+def measure(module: str, forbidden: list[str]) -> tuple[float, list[str]]:
+    """Return (cumulative import ms, forbidden modules that were imported)."""
+    code = (
+        "import sys, json\n"
+        f"import {module}\n"
+        f"print(json.dumps([m for m in {forbidden!r} if m in sys.modules]))\n"
+    )
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{BACKEND_DIR}{os.pathsep}{env.get('PYTHONPATH', '')}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(BACKEND_DIR),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative_us = 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m and m.group(4) == module and not m.group(3):
+            cumulative_us = int(m.group(2))
+
+    leaked = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative_us / 1000.0, leaked
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--module", action="append", help="Module to check (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="Take the best of N runs")
+    args = parser.parse_args()
+
+    modules = args.module or list(DEFAULT_CHECKS)
+    failed = False
+    for module in modules:
+        forbidden = DEFAULT_CHECKS.get(module, [])
+        best_ms, leaked = min(measure(module, forbidden) for _ in range(max(1, args.runs)))
+        status = "ok"
+        if best_ms > args.budget_ms:
+            status = f"OVER BUDGET ({args.budget_ms:.0f} ms)"
+            failed = True
+        if leaked:
+            status = f"eagerly imports {', '.join(leaked)}"
+            failed = True
+        print(f"{module:<28} {best_ms:8.1f} ms  {status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Load test of all three services with a student workload.
+
+--users simulated students each log in, list their notes, and then loop until
+--seconds are up. Each iteration picks a weighted action and then pauses for a
+random think time (exponential, mean --think-ms):
+
+    open_note       GET  /notes/{id}
+    autosave        a burst of 3-8 PUT /notes/{id}, 150-400ms apart (editor autosave)
+    list_notes      GET  /notes
+    create_note     POST /notes
+    summarize       PUT  /notes/{id}/summary
+    list_documents  GET  /documents
+    view_pdf        GET  /documents/{id}/view
+    upload_pdf      POST /documents/upload (a generated 1-4 page PDF)
+
+Use --weights open_note=10,summarize=0 to change the mix.
+
+Targets:
+    asgi (default)  the three apps in this process through httpx's ASGITransport,
+                    with their startup/shutdown handlers run. The Gemini client
+                    is replaced by a fake that sleeps --llm-ms and returns a
+                    well-formed summary. Rate limiting is off unless --rate-limits.
+    http            running services (start_services.py) at --auth-url,
+                    --notes-url and --documents-url. Summaries use whatever LLM
+                    those services have, so consider --weights summarize=0.
+
+Both need the database (database/docker-compose.yml). The students are registered
+through /auth/register and deleted afterwards, together with their notes and documents,
+unless --keep is passed.
+
+Reports count, errors (5xx / failed requests), 429s, throughput and p50/p95/p99 latency
+per route. --save writes the results as JSON. --compare reads such a file and exits
+with status 1 if a route's p95 regressed by more than --tolerance, or its error rate
+went up.
+
+    cd backend && python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --users 50 --seconds 60 --save baseline.json
+    python benchmarks/loadtest.py --users 50 --seconds 60 --compare baseline.json
+    python benchmarks/loadtest.py --target http --weights summarize=0
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import httpx  # noqa: E402
+
+from auth_service.tokens import COOKIE_NAME  # noqa: E402
+
+WEIGHTS = {
+    "open_note": 30,
+    "autosave": 25,
+    "list_notes": 15,
+    "create_note": 5,
+    "summarize": 5,
+    "list_documents": 8,
+    "view_pdf": 8,
+    "upload_pdf": 4,
+}
+
+WORDS = (
+    "entropy gradient lecture theorem proof vector matrix enzyme protein cell market equilibrium "
+    "algorithm complexity graph recursion essay thesis citation experiment hypothesis variable "
+    "integral derivative momentum energy photosynthesis mitochondria revolution treaty empire"
+).split()
+
+
+# --------------------------------------------------------------------
+# Fake LLM and generated content
+# --------------------------------------------------------------------
+
+class FakeLLM:
+    """Stands in for GeminiClient: sleeps like a model call and returns a well-formed summary."""
+
+    def __init__(self, latency_ms: float, seed: int):
+        self.latency = latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def _wait(self) -> None:
+        self.calls += 1
+        time.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+
+    def _summary(self) -> Dict:
+        words = self.rng.sample(WORDS, 8)
+        return {
+            "title": " ".join(words[:3]).title(),
+            "tldr": f"Covers {words[0]} and {words[1]}.",
+            "key_points": [f"{w} matters" for w in words[:4]],
+            "action_items": [f"Review {words[4]}"],
+            "questions": [f"How does {words[5]} relate to {words[6]}?"],
+            "keywords": words,
+        }
+
+    def generate_json(self, prompt: str, schema_hint: Optional[Dict] = None, temperature: float = 0.2) -> Dict:
+        self._wait()
+        return self._summary()
+
+    def generate_json_object(self, prompt: str, temperature: float = 0.2) -> Dict:
+        self._wait()
+        return {key: self._summary() for key in re.findall(r"<<<NOTE (n\d+)>>>", prompt)}
+
+
+def sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_pdf(rng: random.Random, pages: int) -> bytes:
+    """A small valid PDF with `pages` pages of text (random, so uploads don't deduplicate)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [sentence(rng, 8) for _ in range(20)]
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 780 Td {text} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % content_ref
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# --------------------------------------------------------------------
+# Measurements
+# --------------------------------------------------------------------
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.limited: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, status: int, seconds: float) -> None:
+        self.latencies[route].append(seconds)
+        if status == 429:
+            self.limited[route] += 1
+        elif status == 0 or status >= 500:
+            self.errors[route] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict]:
+        routes = {}
+        for route in sorted(self.latencies):
+            values = self.latencies[route]
+            routes[route] = {
+                "count": len(values),
+                "errors": self.errors[route],
+                "limited": self.limited[route],
+                "rps": len(values) / elapsed,
+                "p50_ms": _percentile(values, 0.5),
+                "p95_ms": _percentile(values, 0.95),
+                "p99_ms": _percentile(values, 0.99),
+                "max_ms": max(values) * 1000,
+            }
+        return routes
+
+
+class Services:
+    """One httpx client per service, in-process (asgi) or over HTTP."""
+
+    def __init__(self, args):
+        self.args = args
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.llm: Optional[FakeLLM] = None
+        self._stack = contextlib.AsyncExitStack()
+
+    async def __aenter__(self):
+        timeout = httpx.Timeout(self.args.timeout)
+        if self.args.target == "http":
+            urls = {"auth": self.args.auth_url, "notes": self.args.notes_url, "documents": self.args.documents_url}
+            for name, url in urls.items():
+                self.clients[name] = await self._stack.enter_async_context(httpx.AsyncClient(base_url=url, timeout=timeout))
+            return self
+
+        if not self.args.rate_limits:
+            os.environ["RATE_LIMIT_ENABLED"] = "0"  # read when common.ratelimit is imported
+        from auth_service import main as auth_main
+        from document_service import main as document_main
+        from note_service import main as note_main
+
+        self.llm = FakeLLM(self.args.llm_ms, self.args.seed)
+        note_main.summarize_service._gemini = self.llm
+        apps = {"auth": auth_main.app, "notes": note_main.app, "documents": document_main.app}
+        for name, app in apps.items():
+            await self._stack.enter_async_context(app.router.lifespan_context(app))
+            transport = httpx.ASGITransport(app=app)
+            self.clients[name] = await self._stack.enter_async_context(
+                httpx.AsyncClient(transport=transport, base_url=f"http://{name}", timeout=timeout)
+            )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._stack.aclose()
+
+
+class Student:
+    def __init__(self, index: int, run_id: str, services: Services, recorder: Recorder, rng: random.Random, args):
+        self.email = f"load-{run_id}-{index}@example.com"
+        self.password = f"load-{run_id}-password"
+        self.services = services
+        self.recorder = recorder
+        self.rng = rng
+        self.args = args
+        self.user_id: Optional[str] = None
+        self.headers: Dict[str, str] = {}
+        self.notes: List[str] = []
+        self.documents: List[str] = []
+
+    async def request(self, service: str, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Send a request and record it under `route`; None if it failed or wasn't 2xx."""
+        client = self.services.clients[service]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, headers=self.headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.recorder.record(route, status, time.perf_counter() - start)
+        return response if response is not None and response.is_success else None
+
+    async def think(self, mean_ms: Optional[float] = None) -> None:
+        mean_ms = self.args.think_ms if mean_ms is None else mean_ms
+        if mean_ms > 0:
+            await asyncio.sleep(self.rng.expovariate(1000 / mean_ms))
+
+    # --- setup (not recorded) ---
+
+    async def register(self) -> bool:
+        r = await self.services.clients["auth"].post(
+            "/auth/register", json={"email": self.email, "password": self.password}
+        )
+        if r.status_code != 200:
+            return False
+        self.user_id = r.json()["id"]
+        return True
+
+    # --- actions ---
+
+    async def login(self) -> bool:
+        r = await self.request("auth", "POST /auth/login", "POST", "/auth/login",
+                               json={"email": self.email, "password": self.password})
+        if r is None:
+            return False
+        self.headers = {"Cookie": f"{COOKIE_NAME}={r.cookies.get(COOKIE_NAME)}"}
+        return True
+
+    async def list_notes(self) -> None:
+        r = await self.request("notes", "GET /notes", "GET", "/notes")
+        if r is not None:
+            self.notes = [note["id"] for note in r.json()] or self.notes
+
+    async def create_note(self) -> None:
+        body = {"title": sentence(self.rng, 4), "markdown": "\n\n".join(sentence(self.rng) for _ in range(6))}
+        r = await self.request("notes", "POST /notes", "POST", "/notes", json=body)
+        if r is not None:
+            self.notes.append(r.json()["id"])
+
+    async def open_note(self) -> None:
+        if not self.notes:
+            return await self.create_note()
+        await self.request("notes", "GET /notes/{id}", "GET", f"/notes/{self.rng.choice(self.notes)}")
+
+    async def autosave(self) -> None:
+        if not self.notes:
+            return await self.create_note()
+        note_id = self.rng.choice(self.notes)
+        markdown = sentence(self.rng)
+        for _ in range(self.rng.randint(3, 8)):
+            markdown += " " + sentence(self.rng, 6)
+            await self.request("notes", "PUT /notes/{id}", "PUT", f"/notes/{note_id}", json={"markdown": markdown})
+            await asyncio.sleep(self.rng.uniform(0.15, 0.4))
+
+    async def summarize(self) -> None:
+        if not self.notes:
+            return await self.create_note()
+        await self.request("notes", "PUT /notes/{id}/summary", "PUT", f"/notes/{self.rng.choice(self.notes)}/summary")
+
+    async def list_documents(self) -> None:
+        await self.request("documents", "GET /documents", "GET", "/documents")
+
+    async def upload_pdf(self) -> None:
+        pdf = make_pdf(self.rng, self.rng.randint(1, 4))
+        r = await self.request(
+            "documents", "POST /documents/upload", "POST", "/documents/upload",
+            files={"file": (f"lecture-{self.rng.randint(1, 99)}.pdf", pdf, "application/pdf")},
+            data={"title": sentence(self.rng, 3)},
+        )
+        if r is not None:
+            self.documents.append(r.json()["id"])
+
+    async def view_pdf(self) -> None:
+        if not self.documents:
+            return await self.upload_pdf()
+        await self.request("documents", "GET /documents/{id}/view", "GET", f"/documents/{self.rng.choice(self.documents)}/view")
+
+    async def run(self, start_at: float, deadline: float, weights: Dict[str, float]) -> None:
+        await asyncio.sleep(max(0.0, start_at - time.perf_counter()))
+        if not await self.login():
+            return
+        await self.list_notes()
+        actions = [getattr(self, name) for name in weights]
+        while time.perf_counter() < deadline:
+            await self.rng.choices(actions, weights=list(weights.values()))[0]()
+            await self.think()
+
+    async def cleanup(self) -> None:
+        for document_id in self.documents:
+            await self.services.clients["documents"].delete(f"/documents/{document_id}", headers=self.headers)
+
+
+def delete_users(user_ids: List[str]) -> None:
+    """Notes and documents rows go with their owner (ON DELETE CASCADE)."""
+    from auth_service.database import get_db_cursor
+
+    conn, cur = get_db_cursor()
+    try:
+        cur.execute("DELETE FROM app_user WHERE id = ANY(%s::uuid[])", (user_ids,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+async def run(args, weights: Dict[str, float]) -> Dict:
+    master = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    async with Services(args) as services:
+        students = [
+            Student(i, run_id, services, Recorder(), random.Random(master.random()), args) for i in range(args.users)
+        ]
+        registered = await asyncio.gather(*(s.register() for s in students))
+        students = [s for s, ok in zip(students, registered) if ok]
+        if not students:
+            raise SystemExit("Could not register any students (are the database and services up?)")
+        try:
+            # Everyone starts with a few notes
+            for _ in range(args.initial_notes):
+                await asyncio.gather(*(s.login() for s in students if not s.headers))
+                await asyncio.gather(*(s.create_note() for s in students))
+            # Only the timed run is recorded, and it starts with each student logging in
+            recorder = Recorder()
+            for s in students:
+                s.recorder, s.headers = recorder, {}
+
+            start = time.perf_counter()
+            deadline = start + args.seconds
+            await asyncio.gather(*(
+                s.run(start + args.ramp * i / len(students), deadline, weights) for i, s in enumerate(students)
+            ))
+            elapsed = time.perf_counter() - start
+        finally:
+            if not args.keep:
+                await asyncio.gather(*(s.cleanup() for s in students))
+                delete_users([s.user_id for s in students])
+
+    routes = recorder.summary(elapsed)
+    count = sum(r["count"] for r in routes.values())
+    return {
+        "meta": {
+            "target": args.target,
+            "users": len(students),
+            "seconds": round(elapsed, 3),
+            "think_ms": args.think_ms,
+            "llm_ms": args.llm_ms if args.target == "asgi" else None,
+            "seed": args.seed,
+            "weights": weights,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "total": {
+            "count": count,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "limited": sum(r["limited"] for r in routes.values()),
+            "rps": count / elapsed,
+        },
+        "routes": routes,
+    }
+
+
+def print_report(result: Dict) -> None:
+    print(f"{'route':<30} {'count':>7} {'errors':>7} {'429s':>6} {'req/s':>8} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for route, r in result["routes"].items():
+        print(f"{route:<30} {r['count']:>7} {r['errors']:>7} {r['limited']:>6} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms")
+    total, meta = result["total"], result["meta"]
+    print(f"{'total':<30} {total['count']:>7} {total['errors']:>7} {total['limited']:>6} {total['rps']:>8.1f}"
+          f"   ({meta['users']} students, {meta['seconds']:.1f}s)")
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> bool:
+    """Print p95 and error rate against the baseline; True if any route regressed."""
+    regressed = False
+    print(f"\n{'route':<30} {'p95 base':>10} {'p95 now':>10} {'change':>8} {'err% base':>10} {'err% now':>9}")
+    for route, now in result["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+        change = now["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        err_base = base["errors"] / base["count"] * 100
+        err_now = now["errors"] / now["count"] * 100
+        # Ignore sub-millisecond noise on very fast routes
+        slower = change > tolerance and now["p95_ms"] - base["p95_ms"] > 1.0
+        flag = "  REGRESSED" if slower or err_now > err_base else ""
+        regressed = regressed or bool(flag)
+        print(f"{route:<30} {base['p95_ms']:>8.1f}ms {now['p95_ms']:>8.1f}ms {change * 100:>+7.1f}% "
+              f"{err_base:>9.1f}% {err_now:>8.1f}%{flag}")
+    return regressed
+
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    weights = dict(WEIGHTS)
+    for item in filter(None, (spec or "").split(",")):
+        name, _, value = item.partition("=")
+        if name not in WEIGHTS:
+            raise SystemExit(f"Unknown action {name!r} (one of: {', '.join(WEIGHTS)})")
+        weights[name] = float(value)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent students")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which students start")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="Mean pause between actions")
+    parser.add_argument("--initial-notes", type=int, default=5, help="Notes each student has at the start")
+    parser.add_argument("--weights", help="Action weight overrides, e.g. summarize=0,upload_pdf=10")
+    parser.add_argument("--llm-ms", type=float, default=1500.0, help="Mean fake model call latency (asgi)")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the services' rate limits (asgi)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--auth-url", default="http://localhost:8000")
+    parser.add_argument("--notes-url", default="http://localhost:8001")
+    parser.add_argument("--documents-url", default="http://localhost:8002")
+    parser.add_argument("--keep", action="store_true", help="Don't delete the students and their data")
+    parser.add_argument("--save", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON from --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 increase (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args, parse_weights(args.weights)))
+    print_report(result)
+    if args.save:
+        Path(args.save).write_text(json.dumps(result, indent=2))
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
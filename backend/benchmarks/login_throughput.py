@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Login throughput under a burst, and what it does to cheap endpoints.
+
+For each hashing mode, --concurrency clients log in back to back for --seconds
+while a probe requests /healthz every 50ms:
+
+    threads    bcrypt on a thread pool (how login worked before the process pool)
+    processes  auth_service.hashing.PasswordHasher's process pool with load shedding
+
+Reports logins/s, shed requests (503) and /healthz latency. Drives the app
+in-process through httpx's ASGITransport. Creates a temporary user (deleted
+afterwards), so the database must be up.
+
+    cd backend && python benchmarks/login_throughput.py
+    python benchmarks/login_throughput.py --concurrency 64 --seconds 10
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import httpx  # noqa: E402
+
+from auth_service import main as auth_main  # noqa: E402
+from auth_service.auth import create_user  # noqa: E402
+from auth_service.database import get_db_cursor  # noqa: E402
+from auth_service.hashing import HASH_QUEUE_SIZE, HASH_WORKERS, PasswordHasher  # noqa: E402
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def run(email: str, password: str, seconds: float, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=auth_main.app)
+    stats = {"ok": 0, "shed": 0, "other": 0}
+    probe_latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + seconds
+
+        async def login_worker():
+            while time.perf_counter() < deadline:
+                r = await client.post("/auth/login", json={"email": email, "password": password})
+                if r.status_code == 200:
+                    stats["ok"] += 1
+                elif r.status_code == 503:
+                    stats["shed"] += 1
+                    await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+                else:
+                    stats["other"] += 1
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/healthz")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        await asyncio.gather(probe(), *(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    stats["logins_per_s"] = stats["ok"] / elapsed
+    stats["healthz_p50_ms"] = _percentile(probe_latencies, 0.5)
+    stats["healthz_p99_ms"] = _percentile(probe_latencies, 0.99)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration per mode")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=max(1, HASH_WORKERS), help="Process pool size")
+    parser.add_argument("--modes", default="threads,processes")
+    args = parser.parse_args()
+
+    email, password = f"bench-{uuid.uuid4().hex[:8]}@example.com", "bench-password"
+    user = create_user(email, password)
+    if not user:
+        raise SystemExit("Could not create the benchmark user (is the database up?)")
+
+    hashers = {
+        "threads": lambda: PasswordHasher(workers=0, queue_size=10 ** 6),
+        "processes": lambda: PasswordHasher(workers=args.workers, queue_size=HASH_QUEUE_SIZE),
+    }
+    try:
+        print(f"{'mode':<10} {'logins/s':>9} {'503s':>6} {'healthz p50':>12} {'healthz p99':>12}")
+        for mode in args.modes.split(","):
+            hasher = hashers[mode]()
+            hasher.start()
+            auth_main.password_hasher = hasher
+            try:
+                s = asyncio.run(run(email, password, args.seconds, args.concurrency))
+            finally:
+                hasher.shutdown()
+            print(f"{mode:<10} {s['logins_per_s']:>9.1f} {s['shed']:>6} "
+                  f"{s['healthz_p50_ms']:>10.1f}ms {s['healthz_p99_ms']:>10.1f}ms")
+    finally:
+        conn, cur = get_db_cursor()
+        try:
+            cur.execute("DELETE FROM app_user WHERE id = %s", (user["id"],))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
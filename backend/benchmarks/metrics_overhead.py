@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cost of the common.metrics instrumentation.
+
+    requests   a trivial FastAPI route called directly over ASGI (no HTTP
+               client or network in the way, so the middleware's share is as
+               large as it can get), with and without MetricsMiddleware
+    dao        a no-op function with and without @timed_db
+    primitives ns per Counter.inc / Histogram.observe, from 1 and --threads threads
+
+No database needed.
+
+    cd backend && python benchmarks/metrics_overhead.py
+    python benchmarks/metrics_overhead.py --requests 50000 --threads 8
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi import FastAPI  # noqa: E402
+
+from common.metrics import MetricsMiddleware, Registry, timed_db  # noqa: E402
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def drive(app, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/items/42", "raw_path": b"/items/42", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(n, 1000)):  # warm up
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / n
+
+
+def per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def threaded(fn, n: int, threads: int) -> float:
+    """Wall time per call with `threads` threads each making n calls."""
+    workers = [threading.Thread(target=lambda: [fn() for _ in range(n)]) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return (time.perf_counter() - start) / (n * threads)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=500000, help="Calls per primitive/DAO measurement")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3, help="Best of N")
+    args = parser.parse_args()
+
+    plain, instrumented = build_app(False), build_app(True)
+    base = min(asyncio.run(drive(plain, args.requests)) for _ in range(args.rounds))
+    metered = min(asyncio.run(drive(instrumented, args.requests)) for _ in range(args.rounds))
+    print(f"{'requests':<28} {base * 1e6:>8.1f}us -> {metered * 1e6:>8.1f}us  "
+          f"(+{(metered - base) * 1e6:.1f}us, {(metered / base - 1) * 100:+.1f}%)")
+
+    def noop():
+        return None
+
+    wrapped = timed_db("bench")(noop)
+    base = min(per_call(noop, args.calls) for _ in range(args.rounds))
+    metered = min(per_call(wrapped, args.calls) for _ in range(args.rounds))
+    print(f"{'dao call':<28} {base * 1e9:>8.0f}ns -> {metered * 1e9:>8.0f}ns  (+{(metered - base) * 1e9:.0f}ns)")
+
+    registry = Registry()
+    counter = registry.counter("bench_total", "bench").labels()
+    histogram = registry.histogram("bench_seconds", "bench").labels()
+    primitives = {"Counter.inc": counter.inc, "Histogram.observe": lambda: histogram.observe(0.003)}
+    for name, fn in primitives.items():
+        single = min(per_call(fn, args.calls) for _ in range(args.rounds))
+        multi = threaded(fn, args.calls // args.threads, args.threads)
+        print(f"{name:<28} {single * 1e9:>8.0f}ns  ({args.threads} threads: {multi * 1e9:.0f}ns/call)")
+    expected = args.calls // args.threads * args.threads
+    total = next(line.split()[1] for line in registry.render().splitlines() if line.startswith("bench_total "))
+    print(f"counter total after threaded run: {total} (expected {args.rounds * args.calls + expected})")
+
+
+if __name__ == "__main__":
+    main()
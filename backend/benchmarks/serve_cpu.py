@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+CPU cost of serving document bytes, per GB, for each DocumentFileResponse mode.
+
+Runs the response against a minimal in-process ASGI "server" that writes to a
+socketpair, the way a real server writes to the client connection:
+
+    chunked       no extensions: the app reads the file and sends body chunks
+    zerocopysend  the server sendfile()s (fd, offset, count) messages
+    pathsend      the server sendfile()s the whole file by path
+
+A thread drains the other end of the socket; its own CPU time is subtracted so
+the numbers are what the serving side spends.
+
+    cd backend && python benchmarks/serve_cpu.py
+    python benchmarks/serve_cpu.py --size-mb 512 --requests 8 --range
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from document_service.file_responses import PATHSEND, ZEROCOPYSEND, DocumentFileResponse  # noqa: E402
+from document_service.storage import LocalStorage  # noqa: E402
+
+MODES = {
+    "chunked": {},
+    "zerocopysend": {ZEROCOPYSEND: {}},
+    "pathsend": {PATHSEND: {}},
+}
+
+
+class _Drain(threading.Thread):
+    """Reads and discards everything sent to the socket."""
+
+    def __init__(self, sock: socket.socket):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.received = 0
+        self.cpu = 0.0
+
+    def run(self) -> None:
+        start = time.thread_time()
+        buf = bytearray(1024 * 1024)
+        while True:
+            n = self.sock.recv_into(buf)
+            if not n:
+                break
+            self.received += n
+        self.cpu = time.thread_time() - start
+
+
+async def _serve(response: DocumentFileResponse, extensions: dict, sock: socket.socket, range_header: str) -> None:
+    loop = asyncio.get_running_loop()
+    headers = [(b"range", range_header.encode())] if range_header else []
+    scope = {"type": "http", "method": "GET", "headers": headers, "extensions": extensions}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        kind = message["type"]
+        if kind == "http.response.body":
+            if message.get("body"):
+                await loop.sock_sendall(sock, message["body"])
+        elif kind == ZEROCOPYSEND:
+            await loop.sock_sendfile(sock, message["file"], message.get("offset", 0), message.get("count"))
+        elif kind == PATHSEND:
+            with open(message["path"], "rb") as f:
+                await loop.sock_sendfile(sock, f)
+
+    await response(scope, receive, send)
+
+
+def run_mode(mode: str, path: Path, requests: int, range_header: str) -> dict:
+    storage = LocalStorage(path.parent)
+    server, client = socket.socketpair()
+    server.setblocking(False)
+    drain = _Drain(client)
+    drain.start()
+
+    async def main():
+        for _ in range(requests):
+            response = DocumentFileResponse(storage, path.name, media_type="application/pdf")
+            await _serve(response, MODES[mode], server, range_header)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    asyncio.run(main())
+    server.shutdown(socket.SHUT_WR)
+    drain.join()
+    cpu = time.process_time() - cpu_start - drain.cpu
+    wall = time.perf_counter() - wall_start
+    server.close()
+    client.close()
+
+    gb = drain.received / 1e9
+    return {"mode": mode, "gb": gb, "cpu_s": cpu, "cpu_s_per_gb": cpu / gb if gb else 0.0, "gb_per_s": gb / wall}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CPU per GB served by DocumentFileResponse")
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of the served file")
+    parser.add_argument("--requests", type=int, default=4, help="Requests per mode")
+    parser.add_argument("--range", action="store_true", help="Request the second half of the file (206)")
+    parser.add_argument("--mode", action="append", choices=list(MODES), help="Only run these modes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "document.pdf"
+        with open(path, "wb") as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                f.write(block)
+        size = path.stat().st_size
+        range_header = f"bytes={size // 2}-" if args.range else ""
+
+        print(f"{'mode':<14}{'GB':>8}{'CPU s':>10}{'CPU s/GB':>11}{'GB/s':>9}")
+        for mode in args.mode or list(MODES):
+            r = run_mode(mode, path, args.requests, range_header)
+            print(f"{r['mode']:<14}{r['gb']:>8.2f}{r['cpu_s']:>10.3f}{r['cpu_s_per_gb']:>11.3f}{r['gb_per_s']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
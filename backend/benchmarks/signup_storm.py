@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Database cost of a signup storm: connections and latency per registration.
+
+    legacy  look the email up on one connection, insert on another (the old create_user)
+    upsert  auth.create_user: INSERT ... ON CONFLICT (email) DO NOTHING RETURNING
+
+--concurrency threads register --signups users; --duplicates of them reuse an
+email another thread is registering at the same time, which the legacy path
+races on (both pass the existence check, one insert fails). Passwords are
+pre-hashed so bcrypt doesn't drown out the database work. Users are deleted
+afterwards.
+
+    cd backend && python benchmarks/signup_storm.py
+    python benchmarks/signup_storm.py --signups 2000 --concurrency 32 --duplicates 0.2
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from auth_service import auth, database  # noqa: E402
+
+_connections = 0
+_connections_lock = threading.Lock()
+_connect = database.get_db_connection
+
+
+def _counting_connect():
+    global _connections
+    with _connections_lock:
+        _connections += 1
+    return _connect()
+
+
+def legacy_create_user(email: str, password_hash: str) -> str:
+    if auth.get_user_by_email(email):
+        return "taken"
+    conn, cur = database.get_db_cursor()
+    try:
+        cur.execute(
+            "INSERT INTO app_user (id, email, password) VALUES (%s, %s, %s)",
+            (str(uuid.uuid4()), email, password_hash),
+        )
+        conn.commit()
+        return "created"
+    except Exception:
+        conn.rollback()
+        return "error"
+    finally:
+        cur.close()
+        conn.close()
+
+
+def upsert_create_user(email: str, password_hash: str) -> str:
+    return "created" if auth.create_user(email, "", password_hash=password_hash) else "taken"
+
+
+def run(create, emails, password_hash: str, concurrency: int) -> dict:
+    global _connections
+    _connections = 0
+    latencies = []
+    outcomes = {"created": 0, "taken": 0, "error": 0}
+    lock = threading.Lock()
+
+    def signup(email: str) -> None:
+        start = time.perf_counter()
+        outcome = create(email, password_hash)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(signup, emails))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rate": len(emails) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "connections": _connections / len(emails),
+        **outcomes,
+    }
+
+
+def cleanup(prefix: str) -> None:
+    conn, cur = database.get_db_cursor()
+    try:
+        cur.execute("DELETE FROM app_user WHERE email LIKE %s", (prefix + "%",))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Fraction of signups reusing an email")
+    parser.add_argument("--modes", default="legacy,upsert")
+    args = parser.parse_args()
+
+    database.get_db_connection = _counting_connect
+    password_hash = auth.hash_password("bench-password")
+    modes = {"legacy": legacy_create_user, "upsert": upsert_create_user}
+
+    print(f"{'mode':<8} {'signups/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'conn/signup':>12} "
+          f"{'created':>8} {'taken':>6} {'errors':>7}")
+    for mode in args.modes.split(","):
+        prefix = f"storm-{uuid.uuid4().hex[:8]}-"
+        unique = [f"{prefix}{i}@example.com" for i in range(args.signups)]
+        rng = random.Random(0)
+        emails = [
+            unique[i - 1] if i and rng.random() < args.duplicates else email
+            for i, email in enumerate(unique)
+        ]
+        try:
+            r = run(modes[mode], emails, password_hash, args.concurrency)
+        finally:
+            cleanup(prefix)
+        print(f"{mode:<8} {r['rate']:>10.0f} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['connections']:>12.2f} "
+              f"{r['created']:>8} {r['taken']:>6} {r['error']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Code shared by the backend services (import as common.<module>; run with backend/ on the path)
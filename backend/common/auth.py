@@ -0,0 +1,133 @@
+"""
+Local session verification for the note and document services.
+
+JWTAuthMiddleware reads the access_token cookie set by the auth service and
+verifies it with the same secret (auth_service.tokens), without calling the
+auth service. Decoded claims are cached (keyed by a hash of the token) until
+the token expires, so after the first request a session costs one dict lookup.
+The caller's id, the token's uid claim, is put in the request state
+(request.state.user_id, via caller_id()); tokens without one are anonymous.
+
+AUTH_MODE:
+    off       no verification
+    optional  verify when a cookie is sent; requests without a valid one pass
+              through anonymously (default, while clients move to cookies)
+    enforce   401 for requests without a valid session (except EXEMPT_PATHS
+              and CORS preflights)
+
+Isolation between users comes from the route handlers: resolve_owner() for
+listings and creates, ensure_owner() for rows fetched by id (404 for another
+user's row). Anonymous requests pass both, so only enforce isolates users.
+"""
+import hashlib
+import json
+import os
+import time
+from http.cookies import SimpleCookie
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from auth_service.tokens import COOKIE_NAME, JWT_EXP_MIN, parse_jwt, user_id_from_claims
+from common.cache import TTLCache
+
+AUTH_MODE = os.getenv("AUTH_MODE", "optional").lower()
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+
+EXEMPT_PATHS = ("/", "/health", "/ready", "/metrics", "/docs", "/openapi.json", "/redoc")
+
+
+def _cookie(scope, name: str) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == b"cookie":
+            cookie = SimpleCookie()
+            try:
+                cookie.load(value.decode("latin-1"))
+            except Exception:
+                continue
+            if name in cookie:
+                return cookie[name].value
+    return None
+
+
+class JWTAuthMiddleware:
+    def __init__(self, app, mode: str = AUTH_MODE, cookie_name: str = COOKIE_NAME,
+                 exempt_paths=EXEMPT_PATHS, cache: Optional[TTLCache] = None):
+        self.app = app
+        self.mode = mode
+        self.cookie_name = cookie_name
+        self.exempt_paths = set(exempt_paths)
+        # Each entry lives until its token's exp; the cache ttl only bounds that
+        self.cache = cache if cache is not None else TTLCache(maxsize=AUTH_CLAIMS_CACHE_SIZE, ttl=JWT_EXP_MIN * 60)
+
+    def claims_for(self, token: str) -> Optional[dict]:
+        key = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(key)
+        if claims is None:
+            claims = parse_jwt(token)
+            expires = claims.get("exp") if claims is not None else None
+            if isinstance(expires, (int, float)):
+                self.cache.set(key, claims, ttl=min(expires - time.time(), self.cache.ttl))
+        return claims
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        user_id = None
+        token = _cookie(scope, self.cookie_name)
+        if token:
+            claims = self.claims_for(token)
+            if claims is not None:
+                user_id = user_id_from_claims(claims)
+        state = scope.setdefault("state", {})
+        state["user_id"] = user_id
+
+        if (
+            user_id is None
+            and self.mode == "enforce"
+            and scope["method"] != "OPTIONS"
+            and scope["path"] not in self.exempt_paths
+        ):
+            body = json.dumps({"detail": "Not authenticated"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        await self.app(scope, receive, send)
+
+
+def caller_id(request: Request) -> Optional[str]:
+    """The authenticated caller's user id, or None for anonymous requests."""
+    return getattr(request.state, "user_id", None)
+
+
+def resolve_owner(request: Request, owner_id: Optional[str]) -> Optional[str]:
+    """
+    The owner to filter or create for: the caller's own id when the request is
+    authenticated (a different owner_id is 403), otherwise owner_id as given.
+    """
+    user_id = caller_id(request)
+    if user_id is None:
+        return owner_id
+    if owner_id and owner_id != user_id:
+        raise HTTPException(status_code=403, detail="owner_id does not match the signed-in user")
+    return user_id
+
+
+def ensure_owner(request: Request, owner_id, detail: str = "Not found") -> None:
+    """
+    404 (not 403, so ids of other users' rows aren't confirmed) when the request
+    is authenticated and owner_id is someone else's; anonymous requests pass.
+    """
+    user_id = caller_id(request)
+    if user_id is not None and str(owner_id) != user_id:
+        raise HTTPException(status_code=404, detail=detail)
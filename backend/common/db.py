@@ -0,0 +1,96 @@
+"""
+Instrumented psycopg2 connections for the services' get_db_connection().
+
+connect() opens an InstrumentedConnection, which
+  - counts itself in the db_connect*/db_connections* metrics (common.metrics)
+    and records a db.connect span (common.tracing);
+  - hands out tracing cursors, whatever cursor_factory the caller asks for
+    (plain and RealDictCursor are mapped to their tracing subclasses), so every
+    execute is a db.query span, counts towards the request's query total and
+    is checked against SLOW_QUERY_MS.
+"""
+import time
+
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+from common.metrics import DB_CONNECT_SECONDS, DB_CONNECTIONS_OPEN, DB_CONNECTIONS_OPENED
+from common.tracing import SPAN_KIND_CLIENT, end_span, record_query, span, start_span
+
+
+class _TracingMixin:
+    def execute(self, query, vars=None):
+        s = start_span("db.query", SPAN_KIND_CLIENT)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, started, self.rowcount, s)
+
+    def executemany(self, query, vars_list):
+        s = start_span("db.query", SPAN_KIND_CLIENT)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, started, self.rowcount, s)
+
+    def fetchall(self):
+        s = start_span("db.fetch")
+        try:
+            rows = super().fetchall()
+            if s is not None:
+                s.attributes["db.rows"] = len(rows)
+            return rows
+        finally:
+            end_span(s)
+
+    def fetchmany(self, size=None):
+        s = start_span("db.fetch")
+        try:
+            rows = super().fetchmany(size) if size is not None else super().fetchmany()
+            if s is not None:
+                s.attributes["db.rows"] = len(rows)
+            return rows
+        finally:
+            end_span(s)
+
+
+class TracingCursor(_TracingMixin, psycopg2.extensions.cursor):
+    pass
+
+
+class TracingRealDictCursor(_TracingMixin, RealDictCursor):
+    pass
+
+
+_TRACING_FACTORIES = {
+    None: TracingCursor,
+    psycopg2.extensions.cursor: TracingCursor,
+    RealDictCursor: TracingRealDictCursor,
+}
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counted = True
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECTIONS_OPEN.inc()
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory
+        kwargs["cursor_factory"] = _TRACING_FACTORIES.get(factory, factory)
+        return super().cursor(*args, **kwargs)
+
+    def close(self):
+        if self._counted:
+            self._counted = False
+            DB_CONNECTIONS_OPEN.dec()
+        super().close()
+
+
+def connect(**config):
+    """psycopg2.connect returning an InstrumentedConnection."""
+    with DB_CONNECT_SECONDS.time(), span("db.connect"):
+        return psycopg2.connect(connection_factory=InstrumentedConnection, **config)
@@ -0,0 +1,364 @@
+"""
+Prometheus-style metrics for the backend services, without a client library.
+
+Counters, gauges and histograms write to per-thread shards (a plain list per
+thread, no lock on the hot path), summed when /metrics is scraped. A thread's
+shard is folded into the totals when the thread exits, so threadpool churn
+doesn't grow them. Label children are created once and cached.
+
+Each service wires up:
+    MetricsMiddleware   http_request_duration_seconds{method,route,status}
+                        (route is the matched template, e.g. /notes/{note_id})
+                        and http_requests_in_flight
+    instrument_dao      db_query_duration_seconds{dao,method} and
+                        db_query_errors_total for every public DAO method
+    common.db.connect   db_connect_duration_seconds, db_connections_opened_total,
+                        db_connections_open
+    common.watchdog     event_loop_lag_seconds: how late the watchdog's heartbeat ran
+    metrics_response()  the text exposition format for GET /metrics
+"""
+import bisect
+import functools
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.responses import Response
+
+from common.tracing import span
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Retire:
+    """Lives in a thread's threading.local; its finalizer runs when the thread exits."""
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """A fixed-width vector of floats, summed across threads."""
+
+    def __init__(self, width: int):
+        self._width = width
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._retired = [0.0] * width
+        self._lock = threading.Lock()
+
+    def _shard(self) -> List[float]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0.0] * self._width
+            marker = _Retire()
+            weakref.finalize(marker, self._retire, shard)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            self._local.marker = marker
+            return shard
+
+    def _retire(self, shard: List[float]) -> None:
+        with self._lock:
+            for i, value in enumerate(shard):
+                self._retired[i] += value
+            # By identity: list.remove() would match any shard with equal values
+            self._shards = [s for s in self._shards if s is not shard]
+
+    def _totals(self) -> List[float]:
+        with self._lock:
+            totals = list(self._retired)
+            for shard in self._shards:
+                for i, value in enumerate(shard):
+                    totals[i] += value
+        return totals
+
+
+class CounterChild(_Sharded):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shard()[0] += amount
+
+    def samples(self, name: str, labels: str):
+        yield name, labels, self._totals()[0]
+
+
+class GaugeChild(_Sharded):
+    """inc/dec are sharded like counters; set() and set_function() replace the sum."""
+
+    def __init__(self):
+        super().__init__(1)
+        self._value: Optional[float] = None
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shard()[0] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._shard()[0] -= amount
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def samples(self, name: str, labels: str):
+        if self._function is not None:
+            value = self._function()
+        elif self._value is not None:
+            value = self._value
+        else:
+            value = self._totals()[0]
+        yield name, labels, value
+
+
+class HistogramChild(_Sharded):
+    """Shard layout: one count per bucket (+Inf last), then sum."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = tuple(buckets)
+        super().__init__(len(self._buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        shard = self._shard()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-1] += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def samples(self, name: str, labels: str):
+        totals = self._totals()
+        cumulative = 0.0
+        sep = "," if labels else ""
+        for bound, count in zip(self._buckets, totals):
+            cumulative += count
+            yield name + "_bucket", f'{labels}{sep}le="{bound}"', cumulative
+        cumulative += totals[len(self._buckets)]
+        yield name + "_bucket", f'{labels}{sep}le="+Inf"', cumulative
+        yield name + "_sum", labels, totals[-1]
+        yield name + "_count", labels, cumulative
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: HistogramChild):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, _Sharded] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> _Sharded:
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values))
+            for name, sample_labels, value in child.samples(self.name, labels):
+                lines.append(f"{name}{{{sample_labels}}} {value:g}" if sample_labels else f"{name} {value:g}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests being served")
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Time spent in DAO methods (queries, including connecting)", ("dao", "method")
+)
+DB_QUERY_ERRORS = REGISTRY.counter("db_query_errors_total", "DAO method calls that raised", ("dao", "method"))
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    "db_connect_duration_seconds", "Time to open a database connection",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+DB_CONNECTIONS_OPENED = REGISTRY.counter("db_connections_opened_total", "Database connections opened")
+DB_CONNECTIONS_OPEN = REGISTRY.gauge("db_connections_open", "Database connections currently open")
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran the watchdog heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+LOOP_LAG_LAST = REGISTRY.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+def metrics_response() -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels()
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            # The router sets scope["route"]; unmatched paths share one label to bound cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, status).observe(elapsed)
+
+
+def timed_db(dao: str, method: Optional[str] = None):
+    """Decorator recording a DAO call's duration (and whether it raised), and tracing it as <dao>.<method>."""
+
+    def decorate(fn):
+        name = method or fn.__name__
+        span_name = f"{dao}.{name}"
+        histogram = DB_QUERY_SECONDS.labels(dao, name)
+        errors = DB_QUERY_ERRORS.labels(dao, name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with span(span_name):
+                    return fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def instrument_dao(cls):
+    """Class decorator applying timed_db to every public method (static methods included)."""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_"):
+            continue
+        if isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(timed_db(cls.__name__, name)(attr.__func__)))
+        elif callable(attr):
+            setattr(cls, name, timed_db(cls.__name__, name)(attr))
+    return cls
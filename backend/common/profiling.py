@@ -0,0 +1,221 @@
+"""
+Opt-in profiling of single requests in a running service.
+
+ProfilingMiddleware profiles a request when
+  - it sends `X-Profile: <PROFILE_TOKEN>` (ignored unless PROFILE_TOKEN is set), or
+  - it is picked by PROFILE_SAMPLE_RATE (default 0: never).
+The profile is written to PROFILE_DIR, which keeps only the newest
+PROFILE_KEEP files / PROFILE_DIR_MAX_MB, and token-requested responses get an
+X-Profile-Path header with the file's path on the server.
+
+Two profilers (`X-Profile-Mode`, default sample):
+    sample    a thread snapshots every thread's stack each PROFILE_INTERVAL_MS
+              (wall clock: time blocked in a query counts) and writes a
+              speedscope file (https://www.speedscope.app), one profile per
+              thread. Sees sync endpoints running on the threadpool; other
+              requests in flight at the same time show up too.
+    cprofile  cProfile on the event loop thread, written as pstats (.prof:
+              `python -m pstats`, snakeviz). Covers async endpoints and code
+              they run inline; not threadpool work.
+
+One request is profiled at a time; others go through unprofiled.
+"""
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "edunote-profiles")))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_DIR_MAX_MB = float(os.getenv("PROFILE_DIR_MAX_MB", "200"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Innermost frames of threads that are just waiting for work (idle pool workers, the loop in select)
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+class StackSampler:
+    """Collects stacks of all other threads at a fixed interval, for a speedscope 'sampled' profile."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._frames: Dict[Tuple[str, str, int], int] = {}
+        self._frame_list: List[Dict] = []
+        self._samples: Dict[int, List[Tuple[List[int], float]]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frame_list)
+            self._frame_list.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _sample(self, weight: float) -> None:
+        me = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self._samples.setdefault(thread_id, []).append((stack, weight))
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name: str) -> Dict:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": names.get(thread_id, f"thread {thread_id}"),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weight for _, weight in samples),
+                "samples": [stack for stack, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "common.profiling",
+            "shared": {"frames": self._frame_list},
+            "profiles": profiles,
+        }
+
+
+class ProfileStore:
+    """A directory keeping only the newest `keep` files and at most max_bytes."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, keep: int = PROFILE_KEEP,
+                 max_bytes: int = int(PROFILE_DIR_MAX_MB * 1024 * 1024)):
+        self.directory = Path(directory)
+        self.keep = keep
+        self.max_bytes = max_bytes
+
+    def path_for(self, service: str, method: str, path: str, suffix: str) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:60] or "root"
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        return self.directory / f"{stamp}-{service}-{method.lower()}-{slug}-{os.urandom(3).hex()}{suffix}"
+
+    def save(self, path: Path, write) -> None:
+        """Call write(str(path)), then drop the oldest files over the limits. Errors are only logged."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write(str(path))
+        except Exception as e:
+            logger.warning("Could not write profile %s: %s", path, e)
+        self.trim()
+
+    def trim(self) -> None:
+        try:
+            files = sorted(
+                (p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.iterdir() if p.is_file()
+            )
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.keep or total > self.max_bytes):
+            _, size, oldest = files.pop(0)
+            try:
+                oldest.unlink()
+            except OSError:
+                pass
+            total -= size
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, service_name: str, token: Optional[str] = PROFILE_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, store: Optional[ProfileStore] = None,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.service_name = service_name
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.store = store or ProfileStore()
+        self.interval = interval_ms / 1000
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> Tuple[bool, str]:
+        """(requested with a valid token, mode)"""
+        token = mode = None
+        for key, value in scope.get("headers", ()):
+            if key == b"x-profile":
+                token = value
+            elif key == b"x-profile-mode":
+                mode = value.decode("latin-1").strip().lower()
+        authorized = bool(self.token and token and hmac.compare_digest(token, self.token))
+        return authorized, mode if mode in ("sample", "cprofile") else "sample"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.token is None and self.sample_rate <= 0):
+            await self.app(scope, receive, send)
+            return
+        requested, mode = self._requested(scope)
+        if not requested and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            suffix = ".prof" if mode == "cprofile" else ".speedscope.json"
+            path = self.store.path_for(self.service_name, scope["method"], scope["path"], suffix)
+
+            async def send_with_path(message):
+                if message["type"] == "http.response.start" and requested:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-path", str(path).encode())]
+                await send(message)
+
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_path)
+                finally:
+                    profiler.disable()
+                    await run_in_threadpool(self.store.save, path, profiler.dump_stats)
+            else:
+                sampler = StackSampler(self.interval)
+                sampler.start()
+                try:
+                    await self.app(scope, receive, send_with_path)
+                finally:
+                    sampler.stop()
+                    profile = sampler.speedscope(f"{scope['method']} {scope['path']}")
+                    await run_in_threadpool(self.store.save, path, lambda p: Path(p).write_text(json.dumps(profile)))
+        finally:
+            self._busy.release()
@@ -0,0 +1,53 @@
+"""
+pytest plugin: fail tests whose requests block the event loop.
+
+    cd backend && python -m pytest -p common.pytest_watchdog --loop-block-ms 50
+
+Sets the shared watchdog's threshold to --loop-block-ms (or LOOP_BLOCK_FAIL_MS)
+and fails every test during which a request served through
+LoopWatchdogMiddleware blocked its loop for longer (in setup or the test
+body), with the route and the stack that was blocking. The test itself is
+reported as failed, not as an error. Works with TestClient, in or out of a
+`with` block.
+"""
+import os
+import time
+
+import pytest
+
+from common.watchdog import loop_watchdog
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--loop-block-ms", type=float, default=float(os.getenv("LOOP_BLOCK_FAIL_MS", "0")) or None,
+        help="Fail tests in which a request blocks the event loop for longer than this (default: LOOP_BLOCK_FAIL_MS)",
+    )
+
+
+def pytest_configure(config):
+    limit = config.getoption("--loop-block-ms")
+    if limit:
+        loop_watchdog.enabled = True
+        loop_watchdog.threshold = limit / 1000
+        loop_watchdog.interval = min(loop_watchdog.interval, loop_watchdog.threshold / 4)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    loop_watchdog.stalls.clear()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    if call.when != "call" or not report.passed or not item.config.getoption("--loop-block-ms"):
+        return
+    # Let the watchdog see the end of a stall the test's last request caused
+    time.sleep(loop_watchdog.interval * 2)
+    loop_watchdog.check()
+    if loop_watchdog.stalls:
+        # Reported as the test's own failure, not as an error in teardown
+        report.outcome = "failed"
+        report.longrepr = "\n\n".join(stall.describe() for stall in loop_watchdog.stalls)
@@ -0,0 +1,263 @@
+"""
+Per-user rate limiting and per-route concurrency caps for expensive endpoints.
+
+RateLimitMiddleware only looks at requests matching one of its RouteLimit
+rules (method + path template). Each matching request:
+
+  1. takes a slot from the route's concurrency cap (429 if all are in use),
+  2. takes `cost` tokens from the caller's bucket (429 + Retry-After when the
+     bucket can't cover it); buckets hold RATE_LIMIT_BURST tokens and refill
+     at RATE_LIMIT_PER_MINUTE / 60 tokens per second.
+
+The caller is request.state.user_id (set by common.auth.JWTAuthMiddleware, so
+add this middleware before that one) or the client address for anonymous
+requests. Behind a reverse proxy every anonymous request comes from the proxy's
+address; list it in RATE_LIMIT_TRUSTED_PROXIES (addresses or CIDR ranges) and
+the client is taken from X-Forwarded-For instead: the rightmost entry not
+itself a trusted proxy.
+
+Two backends:
+    MemoryBackend  per process; O(1) checks on the event loop (no locks), at
+                   most RATE_LIMIT_MAX_KEYS buckets, least recently used evicted
+    RedisBackend   RATE_LIMIT_REDIS_URL set: buckets and concurrency slots live
+                   in Redis (one script call each), so limits hold across
+                   workers. Needs the `redis` package; if Redis is unreachable
+                   requests are let through rather than failed.
+"""
+import ipaddress
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))  # bucket size, in cost units
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))  # refill, cost units per minute
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+RATE_LIMIT_LEASE = int(os.getenv("RATE_LIMIT_LEASE", "600"))  # seconds before a Redis slot of a dead worker expires
+RATE_LIMIT_TRUSTED_PROXIES = [
+    p.strip() for p in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    method: str
+    path: str  # route template, e.g. "/notes/{note_id}/summary"
+    cost: float = 1.0
+    concurrency: Optional[int] = None  # in-flight requests allowed on this route (all users)
+
+    def compile(self) -> Pattern[str]:
+        return re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(self.path)) + "$")
+
+
+class MemoryBackend:
+    """Token buckets and slot counters in this process. Only touched from the event loop."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._in_flight: Dict[str, int] = {}
+
+    async def take(self, key: str, cost: float, burst: float, rate: float) -> float:
+        """Take cost tokens; returns 0 if allowed, else seconds until they would be available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # Least recently seen; it has usually refilled anyway
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def acquire(self, route: str, limit: int) -> Optional[str]:
+        count = self._in_flight.get(route, 0)
+        if count >= limit:
+            return None
+        self._in_flight[route] = count + 1
+        return route
+
+    async def release(self, route: str, slot: str) -> None:
+        self._in_flight[route] -= 1
+
+
+_TAKE_SCRIPT = """
+local burst, rate, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+_ACQUIRE_SCRIPT = """
+local limit, lease, slot = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+local now = tonumber(redis.call('TIME')[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= limit then return 0 end
+redis.call('ZADD', KEYS[1], now, slot)
+redis.call('EXPIRE', KEYS[1], lease)
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared by all workers. Concurrency slots are leased, so slots held by a crashed worker expire."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:", lease: int = RATE_LIMIT_LEASE, client=None):
+        if client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError(f"redis is required for RATE_LIMIT_REDIS_URL: {e}")
+            client = aioredis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.lease = lease
+        self._take = client.register_script(_TAKE_SCRIPT)
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, cost: float, burst: float, rate: float) -> float:
+        try:
+            return float(await self._take(keys=[self.prefix + "bucket:" + key], args=[burst, rate, cost]))
+        except Exception as e:
+            logger.warning("Rate limit check failed, allowing request: %s", e)
+            return 0.0
+
+    async def acquire(self, route: str, limit: int) -> Optional[str]:
+        slot = uuid.uuid4().hex
+        try:
+            acquired = await self._acquire(keys=[self.prefix + "slots:" + route], args=[limit, self.lease, slot])
+        except Exception as e:
+            logger.warning("Concurrency check failed, allowing request: %s", e)
+            return ""
+        return slot if acquired else None
+
+    async def release(self, route: str, slot: str) -> None:
+        if not slot:
+            return
+        try:
+            await self.client.zrem(self.prefix + "slots:" + route, slot)
+        except Exception as e:
+            logger.warning("Could not release concurrency slot (expires in %ss): %s", self.lease, e)
+
+
+def default_backend():
+    if RATE_LIMIT_REDIS_URL:
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+
+def _is_trusted(address: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def _caller(scope, proxies=()) -> str:
+    user_id = scope.get("state", {}).get("user_id")
+    if user_id:
+        return "user:" + str(user_id)
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if proxies and _is_trusted(address, proxies):
+        forwarded: List[str] = []
+        for key, value in scope.get("headers", ()):
+            if key == b"x-forwarded-for":
+                forwarded.extend(a.strip() for a in value.decode("latin-1").split(","))
+        # Entries left of the first untrusted hop can be set by the client itself
+        for hop in reversed(forwarded):
+            if hop:
+                address = hop
+                if not _is_trusted(hop, proxies):
+                    break
+    return "ip:" + address
+
+
+async def _too_many(send, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        limits: Iterable[RouteLimit],
+        burst: float = RATE_LIMIT_BURST,
+        per_minute: float = RATE_LIMIT_PER_MINUTE,
+        backend=None,
+        enabled: bool = RATE_LIMIT_ENABLED,
+        trusted_proxies: Iterable[str] = RATE_LIMIT_TRUSTED_PROXIES,
+    ):
+        self.app = app
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.enabled = enabled and per_minute > 0
+        self.backend = backend if backend is not None else (default_backend() if self.enabled else None)
+        self.trusted_proxies = [ipaddress.ip_network(p, strict=False) for p in trusted_proxies]
+        self._limits: Dict[str, List[Tuple[Pattern[str], RouteLimit]]] = {}
+        for limit in limits:
+            if limit.cost > burst:
+                raise ValueError(f"{limit.method} {limit.path}: cost {limit.cost} exceeds the bucket size {burst}")
+            self._limits.setdefault(limit.method.upper(), []).append((limit.compile(), limit))
+
+    def _match(self, scope) -> Optional[RouteLimit]:
+        for pattern, limit in self._limits.get(scope["method"], ()):
+            if pattern.match(scope["path"]):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self._match(scope) if self.enabled and scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{limit.method} {limit.path}"
+        slot = None
+        if limit.concurrency is not None:
+            slot = await self.backend.acquire(route, limit.concurrency)
+            if slot is None:
+                await _too_many(send, "Too many requests in progress for this endpoint, try again shortly", 1)
+                return
+        try:
+            wait = await self.backend.take(_caller(scope, self.trusted_proxies), limit.cost, self.burst, self.rate)
+            if wait > 0:
+                await _too_many(send, "Rate limit exceeded, try again later", wait)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            if slot is not None:
+                await self.backend.release(route, slot)
@@ -0,0 +1,359 @@
+"""
+Lightweight per-request tracing, a slow request/query log and an OTLP exporter.
+
+TracingMiddleware starts a trace per request; code below it opens child spans
+with `with span("name", key=value):` (a no-op outside a traced request). The
+current trace and span live in context variables, so spans opened in
+threadpool functions (run_in_threadpool copies the context) attach to the
+right request. Spans recorded for every request:
+
+    http.request      root: method, route, status, db.queries
+    <Dao>.<method>    every instrument_dao / timed_db DAO call (common.metrics)
+    db.connect        opening a connection (common.db)
+    db.query          each statement: normalized SQL, row count (common.db)
+    db.fetch          fetchall/fetchmany building the result rows
+    response.encode   JSON rendering (TracedJSONResponse)
+plus a few mapping spans in the DAOs and services (e.g. note.map_rows).
+
+At the end of a request the trace is:
+  - written to the "slowlog" logger as one JSON line when it took more than
+    SLOW_REQUEST_MS, or made TRACE_QUERY_WARN or more queries (N+1 patterns);
+  - exported in OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_ENDPOINT (e.g. a local
+    OpenTelemetry collector on http://localhost:4318) when that is set.
+Statements slower than SLOW_QUERY_MS are logged on their own, traced or not.
+Responses carry X-Trace-Id for finding the request in the log or collector.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))  # per request; later spans are counted, not kept
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+TRACE_QUERY_WARN = int(os.getenv("TRACE_QUERY_WARN", "25"))
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_EXPORT_BATCH = int(os.getenv("OTEL_EXPORT_BATCH", "512"))  # spans per POST
+OTEL_EXPORT_INTERVAL = float(os.getenv("OTEL_EXPORT_INTERVAL", "2"))  # seconds
+OTEL_EXPORT_QUEUE = int(os.getenv("OTEL_EXPORT_QUEUE", "2048"))  # traces waiting; more are dropped
+
+slow_log = logging.getLogger("slowlog")
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "kind", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "ms": round(self.duration_ms, 3), **self.attributes}
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "queries", "dropped")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.queries = 0
+        self.dropped = 0
+
+    def add(self, s: Span) -> None:
+        # list.append is atomic, so spans can finish on threadpool threads
+        if len(self.spans) < TRACE_MAX_SPANS:
+            self.spans.append(s)
+        else:
+            self.dropped += 1
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """A span to finish with end_span(); None outside a traced request. For hot paths (no generator)."""
+    if _trace.get() is None:
+        return None
+    parent = _span.get()
+    return Span(name, parent.span_id if parent else None, kind, attributes)
+
+
+def end_span(s: Optional[Span]) -> None:
+    if s is None:
+        return
+    s.end()
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(s)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span; yields the Span (None when not tracing)."""
+    s = start_span(name, **attributes)
+    if s is None:
+        yield None
+        return
+    token = _span.set(s)
+    try:
+        yield s
+    finally:
+        _span.reset(token)
+        end_span(s)
+
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_SQL_SPACE = re.compile(r"\s+")
+_SQL_VALUE_LISTS = re.compile(r"(\([?, ]*\))(?:\s*,\s*\([?, ]*\))+")
+
+
+def normalize_sql(sql) -> str:
+    """Statement text with literals replaced by ? and repeated VALUES tuples collapsed (for grouping)."""
+    if isinstance(sql, bytes):
+        sql = sql[:4000].decode("utf-8", "replace")
+    else:
+        sql = str(sql)[:4000]
+    sql = _SQL_STRING.sub("?", sql)
+    sql = _SQL_NUMBER.sub("?", sql)
+    sql = _SQL_SPACE.sub(" ", sql).strip()
+    sql = _SQL_VALUE_LISTS.sub(r"\1, ...", sql)
+    return sql[:1000]
+
+
+def record_query(statement, started: float, rowcount: int, s: Optional[Span]) -> None:
+    """Called by the tracing cursors after each statement (common.db)."""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    trace = _trace.get()
+    if trace is not None:
+        trace.queries += 1
+    if s is not None:
+        s.attributes["db.statement"] = normalize_sql(statement)
+        s.attributes["db.rows"] = rowcount
+        end_span(s)
+    if SLOW_QUERY_MS and elapsed_ms >= SLOW_QUERY_MS:
+        slow_log.warning(json.dumps({
+            "type": "slow_query",
+            "trace_id": trace.trace_id if trace else None,
+            "ms": round(elapsed_ms, 3),
+            "rows": rowcount,
+            "statement": s.attributes["db.statement"] if s is not None else normalize_sql(statement),
+        }))
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse recording the render (json.dumps) as a response.encode span."""
+
+    def render(self, content: Any) -> bytes:
+        with span("response.encode") as s:
+            body = super().render(content)
+            if s is not None:
+                s.attributes["bytes"] = len(body)
+            return body
+
+
+def _otlp_value(value) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace_id: str, s: Span) -> Dict[str, Any]:
+    out = {
+        "traceId": trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": s.kind,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+    }
+    if s.parent_id:
+        out["parentSpanId"] = s.parent_id
+    return out
+
+
+class OTLPJsonExporter:
+    """
+    Batches finished traces and POSTs them to <endpoint>/v1/traces as OTLP/HTTP
+    JSON from a background thread. Never blocks a request: when the queue is
+    full traces are dropped (and counted).
+    """
+
+    def __init__(self, endpoint: str, service_name: str, batch_size: int = OTEL_EXPORT_BATCH,
+                 interval: float = OTEL_EXPORT_INTERVAL, queue_size: int = OTEL_EXPORT_QUEUE):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Trace] = []
+            spans = 0
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while spans < self.batch_size:
+                try:
+                    trace = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if trace is None:
+                    stop = True
+                    break
+                batch.append(trace)
+                spans += len(trace.spans)
+            if batch:
+                self.export(batch)
+            if stop:
+                return
+
+    def payload(self, traces: List[Trace]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "common.tracing"},
+                    "spans": [_otlp_span(t.trace_id, s) for t in traces for s in t.spans],
+                }],
+            }]
+        }
+
+    def export(self, traces: List[Trace]) -> None:
+        body = json.dumps(self.payload(traces)).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except Exception as e:
+            logger.warning("Trace export to %s failed (%d traces dropped): %s", self.url, len(traces), e)
+
+    def shutdown(self) -> None:
+        """Flush what is queued and stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+def exporter_from_env(service_name: str) -> Optional[OTLPJsonExporter]:
+    """An exporter to OTEL_EXPORTER_OTLP_ENDPOINT, or None when it isn't set."""
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return None
+    return OTLPJsonExporter(OTEL_EXPORTER_OTLP_ENDPOINT, os.getenv("OTEL_SERVICE_NAME", service_name))
+
+
+class TracingMiddleware:
+    def __init__(self, app, service_name: str, exporter: Optional[OTLPJsonExporter] = None,
+                 enabled: bool = TRACING_ENABLED, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.app = app
+        self.service_name = service_name
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.enabled
+            or (self.sample_rate < 1.0 and random.random() >= self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        root = Span("http.request", None, SPAN_KIND_SERVER, {"http.method": scope["method"]})
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace.trace_id.encode())]
+            await send(message)
+
+        trace_token = _trace.set(trace)
+        span_token = _span.set(root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            root.end()
+            root.attributes["http.route"] = getattr(scope.get("route"), "path", "unmatched")
+            root.attributes["http.status_code"] = status
+            root.attributes["db.queries"] = trace.queries
+            trace.spans.append(root)
+            self.finish(trace, root)
+
+    def finish(self, trace: Trace, root: Span) -> None:
+        slow = SLOW_REQUEST_MS and root.duration_ms >= SLOW_REQUEST_MS
+        chatty = TRACE_QUERY_WARN and trace.queries >= TRACE_QUERY_WARN
+        if slow or chatty:
+            slow_log.warning(json.dumps({
+                "type": "slow_request" if slow else "many_queries",
+                "service": self.service_name,
+                "trace_id": trace.trace_id,
+                "method": root.attributes["http.method"],
+                "route": root.attributes["http.route"],
+                "status": root.attributes["http.status_code"],
+                "ms": round(root.duration_ms, 3),
+                "queries": trace.queries,
+                "dropped_spans": trace.dropped,
+                "spans": [s.to_dict() for s in sorted(trace.spans, key=lambda s: s.start_ns) if s is not root],
+            }, default=str))
+        if self.exporter is not None:
+            self.exporter.submit(trace)
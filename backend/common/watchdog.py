@@ -0,0 +1,207 @@
+"""
+Event-loop blocking detector.
+
+A heartbeat callback on the event loop records when it last ran, and how late
+(event_loop_lag_seconds / event_loop_lag_last_seconds); a watchdog thread checks
+it every LOOP_WATCHDOG_INTERVAL_MS. Once the loop is more than
+LOOP_BLOCK_THRESHOLD_MS late the watchdog grabs the loop thread's stack (what
+is blocking it) and the task running on the loop, which LoopWatchdogMiddleware
+maps to the request's route. When the loop comes back the stall is:
+
+  - counted in event_loop_blocked_total{route} / event_loop_block_seconds{route}
+  - logged to the "slowlog" logger as a JSON line with the stack
+  - kept in LoopWatchdog.stalls (the last 100), which common.pytest_watchdog
+    uses to fail tests whose requests block the loop.
+
+The middleware attaches the watchdog to whichever loop serves requests, so it
+also follows TestClient's per-client loops. Production-safe: the heartbeat is
+one timer callback per interval and the thread only reads shared state.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from common.metrics import LOOP_LAG_LAST, LOOP_LAG_SECONDS, REGISTRY
+from common.tracing import slow_log
+
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "1") != "0"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_WATCHDOG_INTERVAL_MS = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "20"))
+
+LOOP_BLOCKED = REGISTRY.counter(
+    "event_loop_blocked_total", "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD_MS", ("route",)
+)
+LOOP_BLOCK_SECONDS = REGISTRY.histogram(
+    "event_loop_block_seconds", "Duration of event loop stalls over the threshold", ("route",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+logger = logging.getLogger(__name__)
+
+NO_REQUEST = "(no request)"
+
+
+@dataclass
+class Stall:
+    route: str  # route template, "unmatched", or NO_REQUEST
+    path: Optional[str]  # the request path, if a request was running
+    started: float  # time.monotonic() when the blocked heartbeat was due
+    stack: List[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    def describe(self) -> str:
+        where = f"{self.route} ({self.path})" if self.path else self.route
+        return f"event loop blocked {self.duration * 1000:.0f}ms in {where}:\n" + "".join(self.stack)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS, interval_ms: float = LOOP_WATCHDOG_INTERVAL_MS,
+                 enabled: bool = LOOP_WATCHDOG_ENABLED):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.enabled = enabled
+        self.stalls: Deque[Stall] = deque(maxlen=100)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._lag = LOOP_LAG_SECONDS.labels()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._current: Optional[Stall] = None
+        self._scopes: Dict[asyncio.Task, dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- on the event loop ---
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Watch `loop` (called from it); a no-op if it is already watched."""
+        if not self.enabled or loop is self._loop:
+            return
+        with self._lock:
+            self._finish(time.monotonic())
+            if self._timer is not None:
+                self._timer.cancel()
+            self._loop = loop
+            self._loop_thread = threading.get_ident()
+            self._last_beat = time.monotonic()
+            self._timer = loop.call_later(self.interval, self._beat)
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def start(self) -> None:
+        """App startup: watch the serving loop before the first request arrives."""
+        self.attach(asyncio.get_running_loop())
+
+    def _beat(self) -> None:
+        now = time.monotonic()
+        lag = max(0.0, now - self._last_beat - self.interval)
+        self._lag.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+        self._last_beat = now
+        if self._loop is not None and not self._loop.is_closed():
+            self._timer = self._loop.call_later(self.interval, self._beat)
+
+    def track(self, task: Optional[asyncio.Task], scope: dict) -> None:
+        if task is not None:
+            self._scopes[task] = scope
+
+    def untrack(self, task: Optional[asyncio.Task]) -> None:
+        if task is not None:
+            self._scopes.pop(task, None)
+
+    async def stop(self) -> None:
+        """App shutdown: stop the heartbeat and the thread."""
+        self._stop.set()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._loop = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    # --- on the watchdog thread (or a test waiting for results) ---
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning("Loop watchdog check failed: %s", e)
+
+    def check(self) -> None:
+        with self._lock:
+            loop = self._loop
+            now = time.monotonic()
+            if loop is None or not loop.is_running():
+                self._finish(now)
+                return
+            due = self._last_beat + self.interval
+            if now - due >= self.threshold:
+                if self._current is None:
+                    self._current = self._capture(loop, due)
+            elif self._current is not None:
+                # The heartbeat ran again: the stall ended when it did
+                self._finish(self._last_beat)
+
+    def _capture(self, loop: asyncio.AbstractEventLoop, due: float) -> Stall:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        task = asyncio.current_task(loop)
+        scope = self._scopes.get(task) if task is not None else None
+        if scope is None:
+            return Stall(NO_REQUEST, None, due, stack)
+        # The router sets scope["route"] before calling the endpoint
+        route = getattr(scope.get("route"), "path", "unmatched")
+        return Stall(route, scope.get("path"), due, stack)
+
+    def _finish(self, ended: float) -> None:
+        stall, self._current = self._current, None
+        if stall is None:
+            return
+        stall.duration = max(ended - stall.started, self.threshold)
+        self.stalls.append(stall)
+        LOOP_BLOCKED.labels(stall.route).inc()
+        LOOP_BLOCK_SECONDS.labels(stall.route).observe(stall.duration)
+        slow_log.warning(json.dumps({
+            "type": "loop_blocked",
+            "route": stall.route,
+            "path": stall.path,
+            "ms": round(stall.duration * 1000, 3),
+            "stack": [line.rstrip() for line in stall.stack[-12:]],
+        }))
+
+
+loop_watchdog = LoopWatchdog()
+
+
+class LoopWatchdogMiddleware:
+    """Attaches the watchdog to the serving loop and records which task serves which request."""
+
+    def __init__(self, app, watchdog: LoopWatchdog = loop_watchdog):
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.watchdog.enabled:
+            await self.app(scope, receive, send)
+            return
+        self.watchdog.attach(asyncio.get_running_loop())
+        task = asyncio.current_task()
+        self.watchdog.track(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.watchdog.untrack(task)
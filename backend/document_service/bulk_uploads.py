@@ -0,0 +1,189 @@
+import asyncio
+import os
+import threading
+import uuid
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from document_service.compression import compress_upload
+from document_service.storage import remove_file
+from document_service.uploads import (
+    ALLOWED_TYPES,
+    MAX_UPLOAD_BYTES,
+    StoredUpload,
+    UploadTooLargeError,
+    _copy_and_hash,
+    receive_upload,
+    resolve_content_type,
+)
+
+# Files received/extracted (and saved to storage) at the same time per request
+BULK_UPLOAD_CONCURRENCY = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "4"))
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "200"))
+# Whole request body, and total uncompressed size of a ZIP archive
+MAX_BULK_UPLOAD_BYTES = int(os.getenv("MAX_BULK_UPLOAD_BYTES", str(500 * 1024 * 1024)))  # 500MB
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+class BulkUploadError(Exception):
+    """The request as a whole can't be processed (bad archive, too many files)."""
+
+
+@dataclass
+class IngestedFile:
+    """One file of a bulk upload: either stored to a temp file or rejected with an error."""
+    filename: str
+    content_type: Optional[str] = None
+    stored: Optional[StoredUpload] = None
+    error: Optional[str] = None
+
+
+def is_zip(upload: UploadFile) -> bool:
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+
+def _unsupported(filename: str) -> IngestedFile:
+    return IngestedFile(
+        filename,
+        error=f"File type not supported. Allowed types: {', '.join(ALLOWED_TYPES.values())}",
+    )
+
+
+async def _gather_bounded(jobs: List[Callable[[], Awaitable[IngestedFile]]], concurrency: int) -> List[IngestedFile]:
+    """Run jobs with at most `concurrency` in flight; on failure/cancellation, drop stored temp files."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(job):
+        async with semaphore:
+            return await job()
+
+    tasks = [asyncio.ensure_future(run(job)) for job in jobs]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None and task.result().stored:
+                await run_in_threadpool(remove_file, task.result().stored.path)
+        raise
+
+
+async def ingest_uploads(
+    files: List[UploadFile],
+    dest_dir: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    concurrency: int = BULK_UPLOAD_CONCURRENCY,
+) -> List[IngestedFile]:
+    """
+    Validate and stream each multipart file to a hashed temp file (compressed
+    if its type is compressible), several at a time.
+    """
+    if len(files) > BULK_MAX_FILES:
+        raise BulkUploadError(f"Too many files. Maximum is {BULK_MAX_FILES} per request")
+
+    def job(upload: UploadFile):
+        async def ingest() -> IngestedFile:
+            filename = upload.filename or "unknown"
+            content_type = resolve_content_type(filename, upload.content_type)
+            if content_type is None:
+                return _unsupported(filename)
+            try:
+                stored = await receive_upload(upload, dest_dir, max_bytes=max_bytes)
+                stored = await run_in_threadpool(compress_upload, stored, content_type)
+            except Exception as e:
+                return IngestedFile(filename, content_type, error=str(e))
+            return IngestedFile(filename, content_type, stored)
+        return ingest
+
+    return await _gather_bounded([job(upload) for upload in files], concurrency)
+
+
+class _ByteBudget:
+    """Total uncompressed bytes an archive may expand to."""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        with self._lock:
+            if size > self.remaining:
+                return False
+            self.remaining -= size
+            return True
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, dest_dir: Path, limit: int) -> StoredUpload:
+    """Stream one archive member to a hashed temp file. Runs in a worker thread."""
+    tmp_path = dest_dir / f".{uuid.uuid4().hex}.part"
+    try:
+        with archive.open(info) as src:
+            size, sha256 = _copy_and_hash(src, tmp_path, limit)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+    return StoredUpload(path=tmp_path, size=size, sha256=sha256)
+
+
+async def ingest_zip(
+    upload: UploadFile,
+    dest_dir: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_total_bytes: int = MAX_BULK_UPLOAD_BYTES,
+    concurrency: int = BULK_UPLOAD_CONCURRENCY,
+) -> List[IngestedFile]:
+    """
+    Extract the documents in a ZIP archive to hashed (and, for compressible
+    types, compressed) temp files, several at a time.
+
+    Directories and hidden entries (e.g. __MACOSX/) are skipped. Each entry is
+    limited to min(max_bytes, its declared size) and declared sizes count against
+    max_total_bytes, so a malicious archive can't expand past either limit.
+    """
+    try:
+        archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+    except zipfile.BadZipFile:
+        raise BulkUploadError("Not a valid ZIP archive")
+
+    with archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not any(part.startswith((".", "__MACOSX")) for part in PurePosixPath(info.filename).parts)
+        ]
+        if len(entries) > BULK_MAX_FILES:
+            raise BulkUploadError(f"Too many files. Maximum is {BULK_MAX_FILES} per request")
+        budget = _ByteBudget(max_total_bytes)
+
+        def job(info: zipfile.ZipInfo):
+            async def ingest() -> IngestedFile:
+                filename = PurePosixPath(info.filename).name
+                content_type = resolve_content_type(filename, None)
+                if content_type is None:
+                    return _unsupported(filename)
+                if info.file_size > max_bytes:
+                    return IngestedFile(filename, content_type, error=str(UploadTooLargeError(max_bytes)))
+                if not budget.reserve(info.file_size):
+                    return IngestedFile(
+                        filename, content_type,
+                        error=f"Archive too large. Maximum total size is {max_total_bytes} bytes",
+                    )
+                try:
+                    # ZipFile serializes reads of the archive itself; decompression runs in parallel
+                    stored = await run_in_threadpool(_extract_entry, archive, info, dest_dir, info.file_size)
+                    stored = await run_in_threadpool(compress_upload, stored, content_type)
+                except UploadTooLargeError:
+                    return IngestedFile(filename, content_type, error="Archive entry is larger than its declared size")
+                except Exception as e:
+                    return IngestedFile(filename, content_type, error=str(e))
+                return IngestedFile(filename, content_type, stored)
+            return ingest
+
+        return await _gather_bounded([job(info) for info in entries], concurrency)
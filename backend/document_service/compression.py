@@ -0,0 +1,109 @@
+import gzip
+import os
+import shutil
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from document_service.storage import StorageBackend, remove_file
+from document_service.uploads import StoredUpload
+
+# Blob encodings: NULL/None = stored as uploaded and not evaluated yet,
+# "identity" = evaluated and not worth compressing, "gzip" = stored gzip-compressed.
+GZIP = "gzip"
+IDENTITY = "identity"
+
+# Types compressed when they are written; everything else only when it goes cold
+COMPRESSIBLE_TYPES = {
+    "text/plain",
+    "text/markdown",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+COMPRESS_ON_WRITE = os.getenv("COMPRESS_ON_WRITE", "1").lower() not in ("0", "false", "no", "off")
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+# Keep the compressed copy only if it is at least this much smaller
+COMPRESSION_MIN_SAVING = float(os.getenv("COMPRESSION_MIN_SAVING", "0.1"))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_gzip(encoding: Optional[str]) -> bool:
+    return encoding == GZIP
+
+
+def gzip_file(src: BinaryIO, dest_dir: Path) -> Tuple[Path, int]:
+    """Compress a stream into a new temp file in dest_dir; returns (path, compressed size)."""
+    tmp_path = dest_dir / f".{uuid.uuid4().hex}.gz.part"
+    try:
+        with open(tmp_path, "wb") as raw:
+            # mtime=0 keeps the output deterministic for identical content
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESSION_LEVEL, mtime=0) as out:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+    return tmp_path, tmp_path.stat().st_size
+
+
+def worth_keeping(original_size: int, compressed_size: int) -> bool:
+    return compressed_size <= original_size * (1 - COMPRESSION_MIN_SAVING)
+
+
+def compress_upload(stored: StoredUpload, content_type: str) -> StoredUpload:
+    """
+    Compress a received upload before it is stored, for compressible types.
+    Runs in a worker thread. Consumes whichever temp file isn't returned.
+    """
+    if not COMPRESS_ON_WRITE or content_type not in COMPRESSIBLE_TYPES:
+        return replace(stored, stored_size=stored.size)
+
+    try:
+        with open(stored.path, "rb") as src:
+            gz_path, gz_size = gzip_file(src, stored.path.parent)
+    except BaseException:
+        remove_file(stored.path)
+        raise
+    if not worth_keeping(stored.size, gz_size):
+        remove_file(gz_path)
+        return replace(stored, encoding=IDENTITY, stored_size=stored.size)
+
+    remove_file(stored.path)
+    return replace(stored, path=gz_path, encoding=GZIP, stored_size=gz_size)
+
+
+class _GzipReader(gzip.GzipFile):
+    """GzipFile that also closes the underlying storage reader."""
+
+    def __init__(self, raw: BinaryIO):
+        super().__init__(fileobj=raw, mode="rb")
+        self._raw = raw
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+def open_decoded(backend: StorageBackend, key: str, encoding: Optional[str]) -> BinaryIO:
+    """A reader over the original bytes of a stored object (decompressing as it reads)."""
+    reader = backend.open(key)
+    if is_gzip(encoding):
+        return _GzipReader(reader)
+    return reader
+
+
+def fetch_decoded(backend: StorageBackend, key: str, encoding: Optional[str], tmp_dir: Path) -> Tuple[str, bool]:
+    """Like StorageBackend.fetch, but always yields a file with the original bytes."""
+    if not is_gzip(encoding):
+        return backend.fetch(key, tmp_dir)
+    tmp_path = tmp_dir / f".{uuid.uuid4().hex}.part"
+    try:
+        with open_decoded(backend, key, encoding) as src, open(tmp_path, "wb") as out:
+            shutil.copyfileobj(src, out, CHUNK_SIZE)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+    return str(tmp_path), True
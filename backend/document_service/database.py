@@ -1,7 +1,8 @@
-import psycopg2
 import os
 from typing import Optional
 
+from common.db import connect as instrumented_connect
+
 # Database configuration  
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -12,9 +13,9 @@ DB_CONFIG = {
 }
 
 def get_db_connection():
-    """Get a database connection"""
+    """Get a database connection (metrics and tracing: see common/db.py)"""
     try:
-        return psycopg2.connect(**DB_CONFIG)
+        return instrumented_connect(**DB_CONFIG)
     except Exception as e:
         raise Exception(f"Failed to connect to database: {str(e)}")
 
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
+from document_service.services.document_service import DocumentService
+from document_service.compression import fetch_decoded
+from document_service.storage import UPLOAD_DIR, remove_file, resolve
+from document_service.text_extraction import UnsupportedDocumentError, extract_pages
+
+# Parsing is CPU-bound, so it runs in worker processes; DB writes run on a small thread pool.
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Documents left pending by a previous run are re-queued on startup, at most this many
+EXTRACTION_RESUME_LIMIT = int(os.getenv("EXTRACTION_RESUME_LIMIT", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionWorker:
+    """Background text extraction for uploaded documents."""
+
+    def __init__(self, document_service: DocumentService, workers: int = EXTRACTION_WORKERS):
+        self.document_service = document_service
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._io = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extraction-io")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the service doesn't fork workers
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.workers)
+            return self._processes
+
+    def schedule(
+        self,
+        document_id: str,
+        content_type: str,
+        sha256: Optional[str] = None,
+        file_path: Optional[str] = None,
+        encoding: Optional[str] = None,
+    ) -> None:
+        """Queue a document for extraction. Returns immediately; file_path is looked up if not given."""
+        self._io.submit(self._start, document_id, content_type, sha256, file_path, encoding)
+
+    def resume_pending(self, limit: int = EXTRACTION_RESUME_LIMIT) -> None:
+        """Re-queue documents whose extraction never finished (e.g. after a restart)."""
+        def _resume():
+            for doc in self.document_service.get_pending_extractions(limit):
+                self._start(doc["id"], doc["content_type"], doc["blob_sha256"], doc["file_path"], doc["encoding"])
+        self._io.submit(_resume)
+
+    def shutdown(self) -> None:
+        self._io.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._processes = None
+
+    # ---- internal ----
+    def _start(
+        self,
+        document_id: str,
+        content_type: str,
+        sha256: Optional[str],
+        file_path: Optional[str],
+        encoding: Optional[str] = None,
+    ) -> None:
+        local_path, temporary = None, False
+        try:
+            # Identical content was already extracted for another document: copy its pages
+            if sha256 and self.document_service.copy_pages_from_blob(document_id, sha256):
+                return
+            if file_path is None:
+                document = self.document_service.get_document(document_id)
+                file_path, encoding = document.file_path, document.encoding
+            self.document_service.set_extraction_status(document_id, "processing")
+            # Parsers need a real file; remote or compressed blobs are copied to a temp file
+            backend, key = resolve(file_path)
+            local_path, temporary = fetch_decoded(backend, key, encoding, UPLOAD_DIR)
+            future = self._pool().submit(extract_pages, local_path, content_type)
+        except Exception as e:
+            logger.warning("Text extraction for %s could not start: %s", document_id, e)
+            if temporary:
+                remove_file(local_path)
+            self._safe_status(document_id, "failed")
+            return
+        cleanup = local_path if temporary else None
+        future.add_done_callback(lambda f: self._on_done(document_id, f, cleanup))
+
+    def _on_done(self, document_id: str, future: Future, cleanup: Optional[str]) -> None:
+        try:
+            self._io.submit(self._finish, document_id, future, cleanup)
+        except RuntimeError:
+            # Shutting down: the document stays pending/processing and is resumed on next startup
+            if cleanup is not None:
+                remove_file(cleanup)
+
+    def _finish(self, document_id: str, future: Future, cleanup: Optional[str] = None) -> None:
+        if cleanup is not None:
+            remove_file(cleanup)
+        try:
+            pages: List[str] = future.result()
+        except UnsupportedDocumentError:
+            self._safe_status(document_id, "unsupported")
+            return
+        except Exception as e:
+            logger.warning("Text extraction for %s failed: %s", document_id, e)
+            self._safe_status(document_id, "failed")
+            return
+
+        try:
+            self.document_service.save_pages(document_id, pages)
+        except Exception:
+            logger.exception("Saving extracted text for %s failed", document_id)
+            self._safe_status(document_id, "failed")
+
+    def _safe_status(self, document_id: str, status: str) -> None:
+        try:
+            self.document_service.set_extraction_status(document_id, status)
+        except Exception as e:
+            logger.warning("Could not set extraction status for %s: %s", document_id, e)
@@ -0,0 +1,371 @@
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from document_service.compression import is_gzip, open_decoded
+from document_service.storage import ObjectInfo, StorageBackend
+
+# Ranges beyond this count are ignored and the whole file is served instead
+MAX_RANGES = 16
+# Content-addressed blobs never change, so clients may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+# Hand local files to the server (sendfile) when it supports an ASGI zero-copy extension
+ZERO_COPY = os.getenv("DOCUMENT_ZERO_COPY", "1").lower() not in ("0", "false", "no", "off")
+
+PATHSEND = "http.response.pathsend"
+ZEROCOPYSEND = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(value: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a `Range: bytes=...` header into sorted, merged (start, end) pairs
+    with an exclusive end. Returns None if the header should be ignored
+    (unknown unit, bad syntax, too many ranges); raises RangeNotSatisfiable if
+    no range overlaps the file.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    parts = [p.strip() for p in spec.split(",") if p.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    for part in parts:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size))
+                continue
+            start = int(first)
+            end = int(last) + 1 if last else size
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        if end <= start:
+            return None
+        ranges.append((start, min(end, size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    """Compare an If-None-Match / If-Range value against our ETag."""
+    if header.strip() == "*":
+        return True
+    ours = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        elif not weak and etag.startswith("W/"):
+            continue
+        if candidate == ours:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows a gzip-encoded response."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def content_disposition(disposition: str, filename: Optional[str]) -> str:
+    if not filename:
+        return disposition
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+class DocumentFileResponse(Response):
+    """
+    Serves a stored document with HTTP caching and byte-range support.
+
+    The file is read through its storage backend, so local files and objects in
+    a bucket are served the same way.
+
+    - ETag is the content hash when known (strong, never changes), otherwise a
+      weak tag derived from mtime and size.
+    - If-None-Match / If-Modified-Since answer 304.
+    - Range answers 206 (multipart/byteranges for several ranges), 416 when
+      unsatisfiable; If-Range falls back to the full file when stale.
+    - Local files are sent by the server itself when it offers the ASGI
+      `http.response.pathsend` (whole file) or `http.response.zerocopysend`
+      (any range) extension; otherwise bytes are read and sent in chunks.
+    - Blobs stored gzip-compressed go out as-is with `Content-Encoding: gzip`
+      when the client accepts it, otherwise decompressed as they stream. Their
+      Range headers are ignored (`Accept-Ranges: none`): reaching an offset
+      means inflating everything before it, so a reader fetching many ranges
+      would decompress the file over and over.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        backend: StorageBackend,
+        key: str,
+        media_type: str,
+        sha256: Optional[str] = None,
+        filename: Optional[str] = None,
+        disposition: str = "inline",
+        info: Optional[ObjectInfo] = None,
+        encoding: Optional[str] = None,
+        size: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.key = key
+        self.info = info
+        self.encoding = encoding
+        self.decoded_size = size  # original size, required when the stored bytes are compressed
+        self.decode = False
+        self.media_type = media_type
+        self.sha256 = sha256
+        self.background = None
+        self.status_code = 200
+        self.init_headers({
+            "accept-ranges": "bytes",
+            "content-disposition": content_disposition(disposition, filename),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if sha256 else REVALIDATE_CACHE_CONTROL,
+        })
+
+    def _validators(self, info: ObjectInfo, variant: str = "") -> Tuple[str, str]:
+        last_modified = formatdate(info.mtime, usegmt=True)
+        if self.sha256:
+            etag = f'"{self.sha256}{variant}"'
+        else:
+            etag = f'W/"{int(info.mtime):x}-{info.size:x}{variant}"'
+        return etag, last_modified
+
+    def _not_modified(self, request_headers: Headers, etag: str, info: ObjectInfo) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag, weak=True)
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(info.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range_applies(self, request_headers: Headers, etag: str, last_modified: str) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return _etag_matches(if_range, etag, weak=False)
+        return if_range == last_modified
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        info = self.info
+        if info is None:
+            try:
+                info = await anyio.to_thread.run_sync(self.backend.stat, self.key)
+            except FileNotFoundError:
+                raise RuntimeError(f"Stored file {self.key} does not exist.")
+
+        request_headers = Headers(scope=scope)
+        header_only = scope["method"].upper() == "HEAD"
+        size = info.size
+        variant = ""
+        ranged = True
+        if is_gzip(self.encoding):
+            self.headers["vary"] = "Accept-Encoding"
+            self.headers["accept-ranges"] = "none"
+            ranged = False
+            if accepts_gzip(request_headers.get("accept-encoding", "")):
+                self.headers["content-encoding"] = "gzip"
+                variant = "-gzip"
+            else:
+                self.decode = True
+                size = self.decoded_size
+        etag, last_modified = self._validators(info, variant)
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = last_modified
+
+        if self._not_modified(request_headers, etag, info):
+            await self._send_start(send, 304, drop=("content-disposition", "content-type", "content-encoding"))
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if ranged and range_header and self._range_applies(request_headers, etag, last_modified):
+            try:
+                ranges = parse_range_header(range_header, size)
+            except RangeNotSatisfiable:
+                self.headers["content-range"] = f"bytes */{size}"
+                self.headers["content-length"] = "0"
+                await self._send_start(send, 416)
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if not ranges:
+            self.headers["content-length"] = str(size)
+            await self._send_start(send, 200)
+            if header_only:
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await self._send_body(scope, send, [(0, size)], whole_file=True)
+            return
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            self.headers["content-length"] = str(end - start)
+            await self._send_start(send, 206)
+            if header_only:
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await self._send_body(scope, send, ranges)
+            return
+
+        boundary = secrets.token_hex(16)
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {self.media_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode("latin-1")
+        length = sum(len(h) + (end - start) + 2 for h, (start, end) in zip(part_headers, ranges)) + len(closing)
+
+        self.headers["content-length"] = str(length)
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        await self._send_start(send, 206)
+        if header_only:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_body(scope, send, ranges, part_headers=part_headers, closing=closing)
+
+    async def _send_start(self, send: Send, status: int, drop: Tuple[str, ...] = ()) -> None:
+        headers = [(k, v) for k, v in self.raw_headers if k.decode("latin-1") not in drop]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+
+    async def _send_body(
+        self,
+        scope: Scope,
+        send: Send,
+        ranges: List[Tuple[int, int]],
+        part_headers: Optional[List[bytes]] = None,
+        closing: bytes = b"",
+        whole_file: bool = False,
+    ) -> None:
+        path = self.backend.local_path(self.key) if ZERO_COPY and not self.decode else None
+        extensions = scope.get("extensions") or {}
+        if path is not None:
+            if whole_file and PATHSEND in extensions:
+                await send({"type": PATHSEND, "path": os.path.abspath(path)})
+                return
+            if ZEROCOPYSEND in extensions:
+                await self._send_zero_copy(send, path, ranges, part_headers, closing)
+                return
+        await self._send_file_ranges(send, ranges, part_headers=part_headers, closing=closing)
+
+    async def _send_zero_copy(
+        self,
+        send: Send,
+        path: str,
+        ranges: List[Tuple[int, int]],
+        part_headers: Optional[List[bytes]],
+        closing: bytes,
+    ) -> None:
+        f = await anyio.to_thread.run_sync(open, path, "rb")
+        try:
+            for i, (start, end) in enumerate(ranges):
+                if part_headers is not None:
+                    await send({"type": "http.response.body", "body": part_headers[i], "more_body": True})
+                await send({
+                    "type": ZEROCOPYSEND,
+                    "file": f,
+                    "offset": start,
+                    "count": end - start,
+                    "more_body": True,
+                })
+                if part_headers is not None:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+            await send({"type": "http.response.body", "body": closing, "more_body": False})
+        finally:
+            f.close()
+
+    async def _send_file_ranges(
+        self,
+        send: Send,
+        ranges: List[Tuple[int, int]],
+        part_headers: Optional[List[bytes]] = None,
+        closing: bytes = b"",
+    ) -> None:
+        encoding = self.encoding if self.decode else None
+        reader = await anyio.to_thread.run_sync(open_decoded, self.backend, self.key, encoding)
+        async with anyio.wrap_file(reader) as f:
+            for i, (start, end) in enumerate(ranges):
+                if part_headers is not None:
+                    await send({"type": "http.response.body", "body": part_headers[i], "more_body": True})
+                await f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                if part_headers is not None:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
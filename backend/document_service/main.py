@@ -1,38 +1,105 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import uvicorn
 import argparse
-import os
-import uuid
-import shutil
-from pathlib import Path
-import mimetypes
-from datetime import datetime
-import json
 
-from document_service.models import DocumentResponse, DocumentCreate
-from document_service.services.document_service import DocumentService
+from document_service.models import BulkUploadResponse, BulkUploadResult, DocumentCreate, DocumentRecord, DocumentResponse, StorageStats
+from document_service.services.document_service import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    DocumentNotFoundError,
+    DocumentService,
+    InvalidCursorError,
+)
+from document_service.storage import UPLOAD_DIR, blob_key, get_storage, resolve
+from document_service.extraction_worker import ExtractionWorker
+from document_service.compression import compress_upload
+from document_service.tiering import AccessTracker, ColdTierSweeper
+from document_service.bulk_uploads import (
+    BULK_UPLOAD_CONCURRENCY,
+    MAX_BULK_UPLOAD_BYTES,
+    BulkUploadError,
+    ingest_uploads,
+    ingest_zip,
+    is_zip,
+)
+from document_service.file_responses import DocumentFileResponse
+from common.auth import JWTAuthMiddleware, caller_id, ensure_owner, resolve_owner
+from common.ratelimit import RateLimitMiddleware, RouteLimit
+from common.metrics import REGISTRY, MetricsMiddleware, metrics_response
+from common.tracing import TracedJSONResponse, TracingMiddleware, exporter_from_env
+from common.profiling import ProfilingMiddleware
+from common.watchdog import LoopWatchdogMiddleware, loop_watchdog
+from document_service.uploads import (
+    ALLOWED_TYPES,
+    MAX_UPLOAD_BYTES,
+    UploadSizeLimitMiddleware,
+    UploadTooLargeError,
+    receive_upload,
+)
 
-app = FastAPI(title="Document Service", version="1.0.0")
+app = FastAPI(title="Document Service", version="1.0.0", default_response_class=TracedJSONResponse)
 
 # Initialize service
 document_service = DocumentService()
+extraction_worker = ExtractionWorker(document_service)
+access_tracker = AccessTracker()
+cold_sweeper = ColdTierSweeper(access_tracker)
 
 FRONTEND_ORIGIN = "http://localhost:5173"
 
+# Uploads hash, compress and extract text: per-user budget and a cap on in-flight uploads
+app.add_middleware(
+    RateLimitMiddleware,
+    limits=[
+        RouteLimit("POST", "/documents/upload", cost=2, concurrency=16),
+        RouteLimit("POST", "/documents/bulk-upload", cost=10, concurrency=2),
+    ],
+)
+# Added after the rate limiter (so it runs first, setting the user id) and before CORS
+# (so it runs inside it: preflights and 401/429s still get CORS headers)
+app.add_middleware(JWTAuthMiddleware)
+# Reject oversized uploads before the multipart parser spools them; added before CORS
+# so CORS wraps them and the browser can read the 413
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
+app.add_middleware(UploadSizeLimitMiddleware, path_prefix="/documents/bulk-upload", max_bytes=MAX_BULK_UPLOAD_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[FRONTEND_ORIGIN],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Outermost, so latency covers every middleware and rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+# Spans, slow-request log and (with OTEL_EXPORTER_OTLP_ENDPOINT) OTLP export
+trace_exporter = exporter_from_env("document_service")
+app.add_middleware(TracingMiddleware, service_name="document_service", exporter=trace_exporter)
+if trace_exporter:
+    app.add_event_handler("shutdown", trace_exporter.shutdown)
+# Opt-in profiles of single requests (X-Profile: $PROFILE_TOKEN, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware, service_name="document_service")
+# Warns (slowlog + event_loop_blocked_total) when a handler blocks the event loop
+app.add_middleware(LoopWatchdogMiddleware)
+
+UPLOAD_BYTES = REGISTRY.counter("upload_bytes_total", "Bytes received in accepted uploads", ("endpoint",))
+UPLOAD_STORED_BYTES = REGISTRY.counter("upload_stored_bytes_total", "Bytes of accepted uploads after compression", ("endpoint",))
 
 # Create uploads directory if it doesn't exist
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Pick up extractions interrupted by a restart; stop the worker pools on shutdown
+app.add_event_handler("startup", extraction_worker.resume_pending)
+app.add_event_handler("shutdown", extraction_worker.shutdown)
+# Record access times and compress blobs that went cold
+app.add_event_handler("startup", cold_sweeper.start)
+app.add_event_handler("shutdown", cold_sweeper.stop)
+# The watchdog's heartbeat also records event_loop_lag_seconds
+app.add_event_handler("startup", loop_watchdog.start)
+app.add_event_handler("shutdown", loop_watchdog.stop)
 
 @app.get("/")
 async def root():
@@ -42,114 +109,287 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format: request latency, DAO timings, connections, upload bytes, event loop lag"""
+    return metrics_response()
+
+def _upload_owner(request: Request, owner_id: Optional[str]) -> str:
+    """Uploads belong to the signed-in caller; anonymous uploads must name an owner"""
+    owner_id = resolve_owner(request, owner_id)
+    if not owner_id:
+        raise HTTPException(status_code=422, detail="owner_id is required")
+    return owner_id
+
 @app.post("/documents/upload", response_model=DocumentResponse)
 async def upload_document(
+    request: Request,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
-    owner_id: str = Form(...),
+    owner_id: Optional[str] = Form(None),
     description: Optional[str] = Form(None)
 ):
     """Upload a document file and create a database record"""
+    owner_id = _upload_owner(request, owner_id)
     try:
         # Validate file type
-        allowed_types = {
-            'application/pdf': '.pdf',
-            'text/plain': '.txt',
-            'application/msword': '.doc',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
-            'text/markdown': '.md'
-        }
-        
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_TYPES:
             raise HTTPException(
                 status_code=400, 
-                detail=f"File type not supported. Allowed types: {', '.join(allowed_types.values())}"
+                detail=f"File type not supported. Allowed types: {', '.join(ALLOWED_TYPES.values())}"
             )
         
-        # Generate unique filename
-        file_extension = allowed_types[file.content_type]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        # Stream file to a temp file off the event loop (size-checked and hashed in one pass)
+        stored = await receive_upload(file, UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES)
+        stored = await run_in_threadpool(compress_upload, stored, file.content_type)
+        UPLOAD_BYTES.labels("upload").inc(stored.size)
+        UPLOAD_STORED_BYTES.labels("upload").inc(stored.stored_size)
         
-        # Create document record
+        # Create document record; the temp file becomes (or is deduplicated into) the blob
         document_data = DocumentCreate(
             title=title or file.filename or "Untitled Document",
             filename=file.filename or "unknown",
-            file_path=str(file_path),
-            file_size=file_size,
+            file_path=get_storage().ref(blob_key(stored.sha256, stored.encoding)),
+            file_size=stored.size,
             content_type=file.content_type,
             owner_id=owner_id,
-            description=description
+            description=description,
+            sha256=stored.sha256,
+            encoding=stored.encoding,
+            stored_size=stored.stored_size
         )
         
-        return document_service.create_document(document_data)
+        document = await run_in_threadpool(document_service.create_document, document_data, stored.path)
         
+        # Extract text in the background; the response doesn't wait for it
+        extraction_worker.schedule(document.id, file.content_type, stored.sha256)
+        return document
+        
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up file if database operation fails
-        if 'file_path' in locals() and file_path.exists():
-            file_path.unlink()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/documents/bulk-upload", response_model=BulkUploadResponse)
+async def bulk_upload_documents(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    owner_id: Optional[str] = Form(None),
+    description: Optional[str] = Form(None)
+):
+    """
+    Upload many documents at once: several multipart files, or a single ZIP
+    archive whose entries become documents. Files are received/extracted in
+    parallel and all documents are inserted together; the response has a
+    result per file (unsupported or oversized files don't fail the others).
+    """
+    owner_id = _upload_owner(request, owner_id)
+    try:
+        if len(files) == 1 and is_zip(files[0]):
+            ingested = await ingest_zip(files[0], UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES)
+        else:
+            ingested = await ingest_uploads(files, UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES)
+    except BulkUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    accepted = [f for f in ingested if f.stored is not None]
+    for f in accepted:
+        UPLOAD_BYTES.labels("bulk-upload").inc(f.stored.size)
+        UPLOAD_STORED_BYTES.labels("bulk-upload").inc(f.stored.stored_size)
+    storage = get_storage()
+    documents: List[DocumentResponse] = []
+    if accepted:
+        items = [
+            (
+                DocumentCreate(
+                    title=f.filename,
+                    filename=f.filename,
+                    file_path=storage.ref(blob_key(f.stored.sha256, f.stored.encoding)),
+                    file_size=f.stored.size,
+                    content_type=f.content_type,
+                    owner_id=owner_id,
+                    description=description,
+                    sha256=f.stored.sha256,
+                    encoding=f.stored.encoding,
+                    stored_size=f.stored.stored_size
+                ),
+                f.stored.path
+            )
+            for f in accepted
+        ]
+        try:
+            documents = await run_in_threadpool(
+                document_service.create_documents, items, BULK_UPLOAD_CONCURRENCY
+            )
+        except Exception as e:
+            for f in accepted:
+                f.stored = None
+                f.error = str(e)
+    
+    created = iter(documents)
+    results = []
+    for f in ingested:
+        if f.stored is not None:
+            document = next(created)
+            extraction_worker.schedule(document.id, document.content_type, f.stored.sha256)
+            results.append(BulkUploadResult(filename=f.filename, status="created", document=document))
+        else:
+            results.append(BulkUploadResult(filename=f.filename, status="error", error=f.error))
+    
+    return BulkUploadResponse(created=len(documents), failed=len(results) - len(documents), results=results)
+
 @app.get("/documents", response_model=List[DocumentResponse])
-async def get_documents(owner_id: Optional[str] = None):
-    """Get documents with optional filtering by owner"""
-    return document_service.get_documents(owner_id=owner_id)
+async def get_documents(
+    request: Request,
+    response: Response,
+    owner_id: Optional[str] = None,
+    content_type: Optional[str] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    all_owners: bool = False
+):
+    """
+    Get one page of documents, newest first. The cursor for the next page is
+    returned in the X-Next-Cursor header. Signed-in callers only see their
+    own documents; otherwise listing every user's documents requires
+    all_owners=true.
+    """
+    if caller_id(request) is not None:
+        owner_id = resolve_owner(request, owner_id)
+    elif not owner_id and not all_owners:
+        raise HTTPException(
+            status_code=400,
+            detail="owner_id is required (pass all_owners=true to list all users' documents)"
+        )
+    
+    try:
+        documents, next_cursor = await run_in_threadpool(
+            document_service.get_documents,
+            owner_id=owner_id,
+            content_type=content_type,
+            min_size=min_size,
+            max_size=max_size,
+            limit=limit,
+            cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return documents
+
+async def _owned_document(request: Request, document_id: str) -> DocumentRecord:
+    """The document, or 404 when it doesn't exist or a signed-in caller asks for another user's"""
+    try:
+        document = await run_in_threadpool(document_service.get_document, document_id)
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    ensure_owner(request, document.owner_id, "Document not found")
+    return document
 
 @app.get("/documents/{document_id}", response_model=DocumentResponse)
-async def get_document(document_id: str):
+async def get_document(document_id: str, request: Request):
     """Get a specific document by ID"""
-    return document_service.get_document(document_id)
+    return await _owned_document(request, document_id)
 
-@app.get("/documents/{document_id}/download")
-async def download_document(document_id: str):
-    """Download a document file"""
-    document = document_service.get_document(document_id)
+@app.api_route("/documents/{document_id}/download", methods=["GET", "HEAD"])
+async def download_document(document_id: str, request: Request):
+    """Download a document file (supports Range and conditional requests)"""
+    document = await _owned_document(request, document_id)
+    backend, key = resolve(document.file_path)
     
-    if not os.path.exists(document.file_path):
-        raise HTTPException(status_code=404, detail="File not found on disk")
+    try:
+        info = await run_in_threadpool(backend.stat, key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found in storage")
     
-    return FileResponse(
-        path=document.file_path,
+    access_tracker.touch(document.blob_sha256, ranged="range" in request.headers)
+    return DocumentFileResponse(
+        backend,
+        key,
+        info=info,
+        media_type=document.content_type,
+        sha256=document.blob_sha256,
         filename=document.filename,
-        media_type=document.content_type
+        disposition="attachment",
+        encoding=document.encoding,
+        size=document.file_size
     )
 
-@app.get("/documents/{document_id}/view")
-async def view_document(document_id: str):
-    """View a document file in browser (for PDFs, images, etc.)"""
-    document = document_service.get_document(document_id)
+@app.api_route("/documents/{document_id}/view", methods=["GET", "HEAD"])
+async def view_document(document_id: str, request: Request):
+    """View a document file in browser (for PDFs, images, etc.); PDF.js can fetch byte ranges"""
+    document = await _owned_document(request, document_id)
+    backend, key = resolve(document.file_path)
     
-    if not os.path.exists(document.file_path):
-        raise HTTPException(status_code=404, detail="File not found on disk")
+    try:
+        info = await run_in_threadpool(backend.stat, key)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found in storage")
     
-    return FileResponse(
-        path=document.file_path,
+    access_tracker.touch(document.blob_sha256, ranged="range" in request.headers)
+    return DocumentFileResponse(
+        backend,
+        key,
+        info=info,
         media_type=document.content_type,
-        headers={"Content-Disposition": "inline"}
+        sha256=document.blob_sha256,
+        disposition="inline",
+        encoding=document.encoding,
+        size=document.file_size
     )
 
+@app.get("/documents/{document_id}/pages/{page_number}/text")
+async def get_page_text(document_id: str, page_number: int, request: Request):
+    """Get the extracted text of one page (1-based)"""
+    document = await _owned_document(request, document_id)
+    
+    if document.extraction_status != "done":
+        raise HTTPException(
+            status_code=409,
+            detail=f"Text is not available yet (extraction status: {document.extraction_status})"
+        )
+    
+    text = await run_in_threadpool(document_service.get_page_text, document_id, page_number)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    
+    return {
+        "document_id": document_id,
+        "page_number": page_number,
+        "page_count": document.page_count,
+        "text": text
+    }
+
+@app.get("/storage/stats", response_model=StorageStats)
+async def get_storage_stats():
+    """Blob storage usage: bytes saved by compression and by deduplication"""
+    return await run_in_threadpool(document_service.get_storage_stats)
+
 @app.put("/documents/{document_id}", response_model=DocumentResponse)
-async def update_document(document_id: str, title: Optional[str] = None, description: Optional[str] = None):
+async def update_document(
+    document_id: str, request: Request, title: Optional[str] = None, description: Optional[str] = None
+):
     """Update document metadata"""
-    return document_service.update_document(document_id, title=title, description=description)
+    await _owned_document(request, document_id)
+    try:
+        return await run_in_threadpool(document_service.update_document, document_id, title=title, description=description)
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
 
 @app.delete("/documents/{document_id}")
-async def delete_document(document_id: str):
-    """Delete a document and its file"""
-    document = document_service.get_document(document_id)
-    
-    # Delete file from disk
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
-    
-    return document_service.delete_document(document_id)
+async def delete_document(document_id: str, request: Request):
+    """Delete a document (its file is removed once no other document references it)"""
+    await _owned_document(request, document_id)
+    try:
+        return await run_in_threadpool(document_service.delete_document, document_id)
+    except DocumentNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Document Service")
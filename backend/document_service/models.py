@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from dataclasses import dataclass
 import uuid
 from datetime import datetime
 
@@ -11,6 +12,9 @@ class DocumentCreate(BaseModel):
     content_type: str
     owner_id: str
     description: Optional[str] = None
+    sha256: str
+    encoding: Optional[str] = None  # how the blob is stored: None / "identity" / "gzip"
+    stored_size: Optional[int] = None
 
 class DocumentUpdate(BaseModel):
     title: Optional[str] = None
@@ -26,6 +30,46 @@ class DocumentResponse(BaseModel):
     description: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    extraction_status: Optional[str] = None  # pending | processing | done | failed | unsupported
+    page_count: Optional[int] = None
     
     class Config:
         from_attributes = True
+
+class BulkUploadResult(BaseModel):
+    filename: str
+    status: str  # created | error
+    document: Optional[DocumentResponse] = None
+    error: Optional[str] = None
+
+class BulkUploadResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkUploadResult]
+
+@dataclass(frozen=True, slots=True)
+class DocumentRecord:
+    """A document row for internal use (includes storage fields not exposed by the API)."""
+    id: str
+    title: str
+    filename: str
+    file_path: str
+    file_size: int
+    content_type: str
+    owner_id: str
+    description: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    blob_sha256: Optional[str]  # For ETags / caching
+    extraction_status: Optional[str]
+    page_count: Optional[int]
+    encoding: Optional[str]  # blob encoding; "gzip" means the stored bytes are compressed
+
+class StorageStats(BaseModel):
+    blobs: int
+    documents: int
+    original_bytes: int  # sum of blob sizes as uploaded
+    stored_bytes: int  # sum of bytes actually in storage
+    compressed_blobs: int
+    compression_bytes_saved: int
+    dedup_bytes_saved: int  # bytes not stored because documents share a blob
@@ -1,124 +1,331 @@
+import base64
+import json
+import logging
+import os
 import uuid
-from typing import List, Optional
-from document_service.models import DocumentCreate, DocumentResponse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from document_service.models import DocumentCreate, DocumentRecord, DocumentResponse
 from document_service.database import get_db_connection
+from common.cache import TTLCache
+from document_service.compression import is_gzip
+from document_service.storage import remove_file, resolve
+from document_service.storage.reconcile import delete_orphan
+from common.metrics import instrument_dao
+from common.tracing import span
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# Per-process metadata cache for get_document (view/download hit it on every range request)
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", "10"))  # seconds; 0 disables
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", "1024"))
+
+# Page size bounds for get_documents
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Columns backing DocumentRecord, in field order
+# (d = document, b = its blob)
+_RECORD_COLUMNS = (
+    "d.id, d.title, d.filename, d.file_path, d.file_size, d.content_type, d.owner_id, d.description, "
+    "d.created_at, d.updated_at, d.blob_sha256, d.extraction_status, d.page_count, b.encoding"
+)
+
+# Columns backing DocumentResponse, in _row_to_response order
+_RESPONSE_COLUMNS = (
+    "id, title, filename, file_size, content_type, owner_id, description, created_at, updated_at, "
+    "extraction_status, page_count"
+)
+
+def _row_to_response(row) -> DocumentResponse:
+    return DocumentResponse(
+        id=row[0],
+        title=row[1],
+        filename=row[2],
+        file_size=row[3],
+        content_type=row[4],
+        owner_id=row[5],
+        description=row[6],
+        created_at=row[7],
+        updated_at=row[8],
+        extraction_status=row[9],
+        page_count=row[10]
+    )
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+class DocumentNotFoundError(LookupError):
+    """Raised when no document has the requested id."""
+
+
+def encode_cursor(created_at: datetime, document_id: str) -> str:
+    """Opaque keyset cursor for the row (created_at, id)."""
+    raw = json.dumps([created_at.isoformat(), str(document_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, document_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(uuid.UUID(document_id))
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+@instrument_dao
 class DocumentService:
-    def create_document(self, document: DocumentCreate) -> DocumentResponse:
-        """Create a new document record"""
+    def __init__(self):
+        self._cache: TTLCache[DocumentRecord] = TTLCache(maxsize=DOCUMENT_CACHE_SIZE, ttl=DOCUMENT_CACHE_TTL)
+
+    def create_document(self, document: DocumentCreate, tmp_path: Optional[Path] = None) -> DocumentResponse:
+        """
+        Create a new document record pointing at the blob for its content hash.
+
+        The blob row is upserted (ref_count + 1) first; its row lock is held while
+        the uploaded temp file is saved to the blob's storage backend, so a
+        concurrent delete of the last reference can't remove the file underneath us.
+        """
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                document_id = str(uuid.uuid4())
                 cursor.execute("""
-                    INSERT INTO document (id, title, filename, file_path, file_size, content_type, owner_id, description)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id, title, filename, file_size, content_type, owner_id, description, created_at, updated_at
+                    INSERT INTO blob (sha256, file_path, size, ref_count, encoding, stored_size)
+                    VALUES (%s, %s, %s, 1, %s, %s)
+                    ON CONFLICT (sha256) DO UPDATE SET ref_count = blob.ref_count + 1
+                    RETURNING file_path, encoding
+                """, (document.sha256, document.file_path, document.file_size, document.encoding, document.stored_size))
+                blob_file_path, blob_encoding = cursor.fetchone()
+
+                # An existing blob may be stored in another encoding; then our temp file isn't needed
+                if tmp_path is not None and is_gzip(blob_encoding) == is_gzip(document.encoding):
+                    backend, key = resolve(blob_file_path)
+                    backend.save(key, tmp_path)
+
+                document_id = str(uuid.uuid4())
+                cursor.execute(f"""
+                    INSERT INTO document (id, title, filename, file_path, file_size, content_type, owner_id, description, blob_sha256)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING {_RESPONSE_COLUMNS}
                 """, (
                     document_id,
                     document.title,
                     document.filename,
-                    document.file_path,
+                    blob_file_path,
                     document.file_size,
                     document.content_type,
                     document.owner_id,
-                    document.description
+                    document.description,
+                    document.sha256
                 ))
                 
                 result = cursor.fetchone()
                 conn.commit()
                 
-                return DocumentResponse(
-                    id=result[0],
-                    title=result[1],
-                    filename=result[2],
-                    file_size=result[3],
-                    content_type=result[4],
-                    owner_id=result[5],
-                    description=result[6],
-                    created_at=result[7],
-                    updated_at=result[8]
-                )
+                return _row_to_response(result)
         except Exception as e:
             conn.rollback()
             raise Exception(f"Failed to create document: {str(e)}")
         finally:
             conn.close()
+            if tmp_path is not None:
+                remove_file(tmp_path)
+
+    def create_documents(
+        self,
+        items: List[Tuple[DocumentCreate, Path]],
+        concurrency: int = 4,
+    ) -> List[DocumentResponse]:
+        """
+        Create many documents in one transaction; returns them in input order.
 
-    def get_documents(self, owner_id: Optional[str] = None) -> List[DocumentResponse]:
-        """Get all documents, optionally filtered by owner"""
+        Same locking as create_document, batched: one multi-row blob upsert (in
+        sha256 order, so concurrent batches lock blob rows in the same order), the
+        temp files saved to storage in parallel while those locks are held, and one
+        multi-row document insert. The temp files are always removed.
+        """
+        if not items:
+            return []
+        
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                if owner_id:
-                    cursor.execute("""
-                        SELECT id, title, filename, file_size, content_type, owner_id, description, created_at, updated_at
-                        FROM document 
-                        WHERE owner_id = %s
-                        ORDER BY created_at DESC
-                    """, (owner_id,))
-                else:
-                    cursor.execute("""
-                        SELECT id, title, filename, file_size, content_type, owner_id, description, created_at, updated_at
-                        FROM document 
-                        ORDER BY created_at DESC
-                    """)
+                # Per distinct blob: the first document carrying it, its new references, its temp file
+                blobs: Dict[str, list] = {}
+                for document, tmp_path in items:
+                    entry = blobs.setdefault(document.sha256, [document, 0, tmp_path])
+                    entry[1] += 1
+                
+                blob_rows = sorted(
+                    (sha256, d.file_path, d.file_size, refs, d.encoding, d.stored_size)
+                    for sha256, (d, refs, _) in blobs.items()
+                )
+                returned = execute_values(cursor, """
+                    INSERT INTO blob (sha256, file_path, size, ref_count, encoding, stored_size)
+                    VALUES %s
+                    ON CONFLICT (sha256) DO UPDATE SET ref_count = blob.ref_count + EXCLUDED.ref_count
+                    RETURNING sha256, file_path, encoding
+                """, blob_rows, page_size=len(blob_rows), fetch=True)
+                blob_paths = {row[0]: row[1] for row in returned}
+                blob_encodings = {row[0]: row[2] for row in returned}
                 
-                results = cursor.fetchall()
+                def save(sha256: str) -> None:
+                    document, _, tmp_path = blobs[sha256]
+                    if is_gzip(blob_encodings[sha256]) != is_gzip(document.encoding):
+                        return
+                    backend, key = resolve(blob_paths[sha256])
+                    backend.save(key, tmp_path)
                 
-                return [
-                    DocumentResponse(
-                        id=row[0],
-                        title=row[1],
-                        filename=row[2],
-                        file_size=row[3],
-                        content_type=row[4],
-                        owner_id=row[5],
-                        description=row[6],
-                        created_at=row[7],
-                        updated_at=row[8]
+                with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                    list(pool.map(save, blob_paths))
+                
+                document_ids = [str(uuid.uuid4()) for _ in items]
+                document_rows = [
+                    (
+                        document_id,
+                        document.title,
+                        document.filename,
+                        blob_paths[document.sha256],
+                        document.file_size,
+                        document.content_type,
+                        document.owner_id,
+                        document.description,
+                        document.sha256
                     )
-                    for row in results
+                    for document_id, (document, _) in zip(document_ids, items)
                 ]
+                inserted = execute_values(cursor, f"""
+                    INSERT INTO document (id, title, filename, file_path, file_size, content_type, owner_id, description, blob_sha256)
+                    VALUES %s
+                    RETURNING {_RESPONSE_COLUMNS}
+                """, document_rows, page_size=len(document_rows), fetch=True)
+                
+                conn.commit()
+                
+                by_id = {str(row[0]): _row_to_response(row) for row in inserted}
+                return [by_id[document_id] for document_id in document_ids]
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Failed to create documents: {str(e)}")
+        finally:
+            conn.close()
+            for _, tmp_path in items:
+                remove_file(tmp_path)
+
+    def get_documents(
+        self,
+        owner_id: Optional[str] = None,
+        content_type: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[DocumentResponse], Optional[str]]:
+        """
+        Get one page of documents, newest first, ordered by (created_at, id).
+
+        Returns the page and the cursor for the next one (None on the last page).
+        Raises InvalidCursorError for a malformed cursor.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions = []
+        params: List[Any] = []
+        
+        if owner_id:
+            conditions.append("owner_id = %s")
+            params.append(owner_id)
+        
+        if content_type:
+            conditions.append("content_type = %s")
+            params.append(content_type)
+        
+        if min_size is not None:
+            conditions.append("file_size >= %s")
+            params.append(min_size)
+        
+        if max_size is not None:
+            conditions.append("file_size <= %s")
+            params.append(max_size)
+        
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            conditions.append("(created_at, id) < (%s, %s::uuid)")
+            params.extend([created_at, last_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as db_cursor:
+                db_cursor.execute(f"""
+                    SELECT {_RESPONSE_COLUMNS}
+                    FROM document 
+                    {where}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """, params)
+                
+                results = db_cursor.fetchall()
+                
+                with span("document.map_rows", rows=len(results)):
+                    documents = [
+                        _row_to_response(row)
+                        for row in results[:limit]
+                    ]
+                next_cursor = None
+                if len(results) > limit:
+                    last = documents[-1]
+                    next_cursor = encode_cursor(last.created_at, last.id)
+                return documents, next_cursor
         except Exception as e:
             raise Exception(f"Failed to get documents: {str(e)}")
         finally:
             conn.close()
 
-    def get_document(self, document_id: str) -> DocumentResponse:
-        """Get a specific document by ID"""
+    def get_document(self, document_id: str) -> DocumentRecord:
+        """Get a specific document by ID (cached for DOCUMENT_CACHE_TTL seconds)"""
+        cached = self._cache.get(document_id)
+        if cached is not None:
+            return cached
+        try:
+            uuid.UUID(document_id)
+        except ValueError:
+            raise DocumentNotFoundError(document_id)
+        
+        token = self._cache.token()
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT id, title, filename, file_path, file_size, content_type, owner_id, description, created_at, updated_at
-                    FROM document 
-                    WHERE id = %s
+                cursor.execute(f"""
+                    SELECT {_RECORD_COLUMNS}
+                    FROM document d
+                    LEFT JOIN blob b ON b.sha256 = d.blob_sha256
+                    WHERE d.id = %s
                 """, (document_id,))
                 
                 result = cursor.fetchone()
                 if not result:
-                    raise Exception("Document not found")
-                
-                # Store file_path for internal use but don't expose in response
-                return type('DocumentWithPath', (), {
-                    'id': result[0],
-                    'title': result[1],
-                    'filename': result[2],
-                    'file_path': result[3],  # For internal use
-                    'file_size': result[4],
-                    'content_type': result[5],
-                    'owner_id': result[6],
-                    'description': result[7],
-                    'created_at': result[8],
-                    'updated_at': result[9]
-                })()
+                    raise DocumentNotFoundError(document_id)
+                
+                # Includes file_path for internal use; the API only exposes DocumentResponse fields
+                record = DocumentRecord(*result)
+        except DocumentNotFoundError:
+            raise
         except Exception as e:
             raise Exception(f"Failed to get document: {str(e)}")
         finally:
             conn.close()
+        
+        self._cache.set(document_id, record, token)
+        return record
 
     def update_document(self, document_id: str, title: Optional[str] = None, description: Optional[str] = None) -> DocumentResponse:
         """Update document metadata"""
@@ -149,28 +356,22 @@ class DocumentService:
                     UPDATE document 
                     SET {', '.join(updates)}
                     WHERE id = %s
-                    RETURNING id, title, filename, file_size, content_type, owner_id, description, created_at, updated_at
+                    RETURNING {_RESPONSE_COLUMNS}
                 """
                 
                 cursor.execute(query, params)
                 result = cursor.fetchone()
                 
                 if not result:
-                    raise Exception("Document not found")
+                    raise DocumentNotFoundError(document_id)
                 
                 conn.commit()
+                self._cache.invalidate(document_id)
                 
-                return DocumentResponse(
-                    id=result[0],
-                    title=result[1],
-                    filename=result[2],
-                    file_size=result[3],
-                    content_type=result[4],
-                    owner_id=result[5],
-                    description=result[6],
-                    created_at=result[7],
-                    updated_at=result[8]
-                )
+                return _row_to_response(result)
+        except DocumentNotFoundError:
+            conn.rollback()
+            raise
         except Exception as e:
             conn.rollback()
             raise Exception(f"Failed to update document: {str(e)}")
@@ -178,19 +379,205 @@ class DocumentService:
             conn.close()
 
     def delete_document(self, document_id: str) -> dict:
-        """Delete a document"""
+        """
+        Delete a document and drop its reference to the blob.
+
+        The blob file is only unlinked when the last reference goes away, and only
+        after the delete has committed: a failed unlink is logged and leaves an
+        orphaned file for storage.reconcile, never a row without its file.
+        Documents created before content addressing (no blob_sha256) own their
+        file directly.
+        """
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("DELETE FROM document WHERE id = %s", (document_id,))
-                
-                if cursor.rowcount == 0:
-                    raise Exception("Document not found")
-                
+                cursor.execute(
+                    "DELETE FROM document WHERE id = %s RETURNING file_path, blob_sha256",
+                    (document_id,),
+                )
+                row = cursor.fetchone()
+                if not row:
+                    raise DocumentNotFoundError(document_id)
+                file_path, sha256 = row
+
+                unreferenced = None
+                if sha256 is None:
+                    unreferenced = file_path
+                else:
+                    # Row lock on the blob serializes this with concurrent uploads of the same content
+                    cursor.execute("""
+                        UPDATE blob SET ref_count = ref_count - 1
+                        WHERE sha256 = %s
+                        RETURNING ref_count, file_path
+                    """, (sha256,))
+                    blob = cursor.fetchone()
+                    if blob and blob[0] <= 0:
+                        cursor.execute("DELETE FROM blob WHERE sha256 = %s", (sha256,))
+                        unreferenced = blob[1]
+
                 conn.commit()
-                return {"message": "Document deleted successfully"}
+        except DocumentNotFoundError:
+            conn.rollback()
+            conn.close()
+            raise
         except Exception as e:
             conn.rollback()
+            conn.close()
             raise Exception(f"Failed to delete document: {str(e)}")
+        finally:
+            self._cache.invalidate(document_id)
+
+        try:
+            if unreferenced is not None:
+                backend, key = resolve(unreferenced)
+                if sha256 is None:
+                    backend.delete(key)
+                else:
+                    # Same placeholder-row lock as the reconciler, in case the content was re-uploaded since the commit
+                    delete_orphan(conn, backend, key, sha256)
+        except Exception:
+            conn.rollback()
+            logger.exception("Failed to delete file %s of document %s; left for reconcile", unreferenced, document_id)
+        finally:
+            conn.close()
+        return {"message": "Document deleted successfully"}
+
+    # ---- extracted text ----
+    def set_extraction_status(self, document_id: str, status: str) -> None:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE document SET extraction_status = %s WHERE id = %s",
+                    (status, document_id),
+                )
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Failed to set extraction status: {str(e)}")
+        finally:
+            conn.close()
+            self._cache.invalidate(document_id)
+
+    def save_pages(self, document_id: str, pages: List[str]) -> None:
+        """Replace a document's page text and mark extraction done, in one transaction."""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM document_page WHERE document_id = %s", (document_id,))
+                if pages:
+                    # Postgres TEXT can't hold NUL characters
+                    execute_values(
+                        cursor,
+                        "INSERT INTO document_page (document_id, page_number, text) VALUES %s",
+                        [(document_id, i + 1, text.replace("\x00", "")) for i, text in enumerate(pages)],
+                    )
+                cursor.execute(
+                    "UPDATE document SET extraction_status = 'done', page_count = %s WHERE id = %s",
+                    (len(pages), document_id),
+                )
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Failed to save pages: {str(e)}")
+        finally:
+            conn.close()
+            self._cache.invalidate(document_id)
+
+    def copy_pages_from_blob(self, document_id: str, sha256: str) -> bool:
+        """
+        Reuse the text of another document with the same content, if one was
+        already extracted. Returns True if pages were copied.
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, page_count FROM document
+                    WHERE blob_sha256 = %s AND extraction_status = 'done' AND id <> %s
+                    LIMIT 1
+                """, (sha256, document_id))
+                source = cursor.fetchone()
+                if not source:
+                    return False
+                cursor.execute("""
+                    INSERT INTO document_page (document_id, page_number, text)
+                    SELECT %s, page_number, text FROM document_page WHERE document_id = %s
+                    ON CONFLICT DO NOTHING
+                """, (document_id, source[0]))
+                cursor.execute(
+                    "UPDATE document SET extraction_status = 'done', page_count = %s WHERE id = %s",
+                    (source[1], document_id),
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"Failed to copy pages: {str(e)}")
+        finally:
+            conn.close()
+            self._cache.invalidate(document_id)
+
+    def get_pending_extractions(self, limit: int) -> List[Dict[str, Any]]:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT d.id, d.file_path, d.content_type, d.blob_sha256, b.encoding
+                    FROM document d
+                    LEFT JOIN blob b ON b.sha256 = d.blob_sha256
+                    WHERE d.extraction_status IN ('pending', 'processing')
+                    ORDER BY d.created_at
+                    LIMIT %s
+                """, (limit,))
+                return [
+                    {"id": row[0], "file_path": row[1], "content_type": row[2], "blob_sha256": row[3], "encoding": row[4]}
+                    for row in cursor.fetchall()
+                ]
+        finally:
+            conn.close()
+
+    def get_page_text(self, document_id: str, page_number: int) -> Optional[str]:
+        """Text of one page, or None if it doesn't exist (yet)."""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT text FROM document_page WHERE document_id = %s AND page_number = %s",
+                    (document_id, page_number),
+                )
+                row = cursor.fetchone()
+                return row[0] if row else None
+        finally:
+            conn.close()
+
+    # ---- storage ----
+    def get_storage_stats(self) -> Dict[str, int]:
+        """Bytes saved by compression at rest and by deduplication."""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT count(*),
+                           COALESCE(sum(ref_count), 0),
+                           COALESCE(sum(size), 0),
+                           COALESCE(sum(COALESCE(stored_size, size)), 0),
+                           count(*) FILTER (WHERE encoding = 'gzip'),
+                           COALESCE(sum(size - stored_size) FILTER (WHERE encoding = 'gzip'), 0),
+                           COALESCE(sum(size * GREATEST(ref_count - 1, 0)), 0)
+                    FROM blob
+                """)
+                row = cursor.fetchone()
+                return {
+                    "blobs": row[0],
+                    "documents": row[1],
+                    "original_bytes": row[2],
+                    "stored_bytes": row[3],
+                    "compressed_blobs": row[4],
+                    "compression_bytes_saved": row[5],
+                    "dedup_bytes_saved": row[6],
+                }
+        except Exception as e:
+            raise Exception(f"Failed to get storage stats: {str(e)}")
         finally:
             conn.close()
@@ -0,0 +1,83 @@
+"""
+Pluggable file storage for the document service.
+
+DOCUMENT_STORAGE_BACKEND selects where new uploads go:
+    local  files under UPLOAD_DIR, fanned out as ab/cd/<sha256> (default)
+    s3     an S3-compatible bucket (S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+
+document.file_path / blob.file_path hold "<scheme>:<key>" references; values
+without a known scheme are paths written before storage backends existed and
+are resolved on the local filesystem (relative to the backend directory).
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from document_service.storage.base import ObjectInfo, StorageBackend, blob_key, remove_file
+from document_service.storage.local import LocalStorage
+from document_service.storage.s3 import S3Storage, StorageConfigError
+
+# The backend/ directory; services are started from here, so legacy relative paths are relative to it
+BASE_DIR = Path(__file__).resolve().parents[2]
+# Local blob root, and the staging directory for in-flight uploads whatever the backend
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", str(BASE_DIR / "uploads")))
+STORAGE_BACKEND = os.getenv("DOCUMENT_STORAGE_BACKEND", "local")
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+_legacy = LocalStorage(BASE_DIR, scheme="")
+
+
+def _create_backend(scheme: str) -> StorageBackend:
+    if scheme == "local":
+        return LocalStorage(UPLOAD_DIR)
+    if scheme == "s3":
+        return S3Storage(
+            bucket=os.getenv("S3_BUCKET", ""),
+            prefix=os.getenv("S3_PREFIX", ""),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            region=os.getenv("S3_REGION") or None,
+        )
+    raise StorageConfigError(f"Unknown storage backend: {scheme!r}")
+
+
+def get_backend(scheme: str) -> StorageBackend:
+    """The (cached) backend for a scheme."""
+    backend = _backends.get(scheme)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(scheme)
+            if backend is None:
+                backend = _backends[scheme] = _create_backend(scheme)
+    return backend
+
+
+def get_storage() -> StorageBackend:
+    """The backend new files are written to."""
+    return get_backend(STORAGE_BACKEND)
+
+
+def resolve(file_path: str) -> Tuple[StorageBackend, str]:
+    """Backend and key for a stored file_path value."""
+    scheme, sep, key = file_path.partition(":")
+    if sep and scheme in ("local", "s3"):
+        return get_backend(scheme), key
+    return _legacy, file_path
+
+
+__all__ = [
+    "BASE_DIR",
+    "UPLOAD_DIR",
+    "STORAGE_BACKEND",
+    "ObjectInfo",
+    "StorageBackend",
+    "LocalStorage",
+    "S3Storage",
+    "StorageConfigError",
+    "blob_key",
+    "get_backend",
+    "get_storage",
+    "remove_file",
+    "resolve",
+]
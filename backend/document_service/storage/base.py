@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    mtime: float
+
+
+def blob_key(sha256: str, encoding: Optional[str] = None) -> str:
+    """
+    Storage key of a content-addressed blob: two levels of hash-prefix fan-out,
+    with a ".gz" suffix for blobs stored gzip-compressed.
+    """
+    key = f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    return key + ".gz" if encoding == "gzip" else key
+
+
+def remove_file(path) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StorageBackend(ABC):
+    """
+    Where document files live. Objects are addressed by a key ("ab/cd/<sha256>");
+    the database stores a reference "<scheme>:<key>" (see ref()) so rows written
+    under one backend keep resolving while files are migrated to another.
+    """
+
+    scheme: str = ""
+
+    def ref(self, key: str) -> str:
+        """The file_path value stored in the database for key."""
+        return f"{self.scheme}:{key}" if self.scheme else key
+
+    @abstractmethod
+    def save(self, key: str, src: Path) -> bool:
+        """
+        Store the local file src under key, consuming src. If key already exists
+        (same content stored before) src is discarded and False is returned.
+        """
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """A seekable binary reader; raises FileNotFoundError if key is missing."""
+
+    @abstractmethod
+    def stat(self, key: str) -> ObjectInfo:
+        """Size and modification time; raises FileNotFoundError if key is missing."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key. Missing keys are ignored."""
+
+    @abstractmethod
+    def iter_keys(self) -> Iterator[str]:
+        """All stored keys, in lexicographic order."""
+
+    def iter_temp_keys(self) -> Iterator[str]:
+        """Temp files left behind by writes that never finished (none for most backends)."""
+        return iter(())
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.stat(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of key, for backends that have one."""
+        return None
+
+    def fetch(self, key: str, tmp_dir: Path) -> Tuple[str, bool]:
+        """
+        A local path holding key's content, for code that needs a real file.
+        Returns (path, is_temporary); temporary copies are the caller's to remove.
+        """
+        path = self.local_path(key)
+        if path is not None:
+            return path, False
+        return str(self.copy_to_temp(key, tmp_dir)), True
+
+    def copy_to_temp(self, key: str, tmp_dir: Path) -> Path:
+        """Copy key into a new temp file in tmp_dir (which save() may then consume)."""
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir, prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out, self.open(key) as src:
+                shutil.copyfileobj(src, out, COPY_CHUNK_SIZE)
+        except BaseException:
+            remove_file(tmp)
+            raise
+        return Path(tmp)
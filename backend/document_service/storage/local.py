@@ -0,0 +1,85 @@
+import os
+import shutil
+import stat
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from document_service.storage.base import ObjectInfo, StorageBackend, remove_file
+
+
+class LocalStorage(StorageBackend):
+    """Files under a root directory; keys are relative paths (e.g. "ab/cd/<sha256>")."""
+
+    scheme = "local"
+
+    def __init__(self, root: Path, scheme: str = "local"):
+        self.root = Path(root)
+        self.scheme = scheme
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def local_path(self, key: str) -> Optional[str]:
+        return str(self.path(key))
+
+    def save(self, key: str, src: Path) -> bool:
+        dest = self.path(key)
+        if dest.exists():
+            remove_file(src)
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(src, dest)
+        except OSError:
+            # src is on another filesystem: copy next to dest, then rename atomically
+            staging = dest.with_name(f".{dest.name}.part")
+            shutil.copyfile(src, staging)
+            os.replace(staging, dest)
+            remove_file(src)
+        return True
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def stat(self, key: str) -> ObjectInfo:
+        st = os.stat(self.path(key))
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(key)
+        return ObjectInfo(size=st.st_size, mtime=st.st_mtime)
+
+    def delete(self, key: str) -> None:
+        path = self.path(key)
+        remove_file(path)
+        # Drop fan-out directories that became empty
+        parent = path.parent
+        while parent != self.root and self.root in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def iter_keys(self) -> Iterator[str]:
+        yield from self._walk(self.root, "")
+
+    def iter_temp_keys(self) -> Iterator[str]:
+        # Uploads, compression and cross-filesystem saves stage ".<name>.part" files here
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in sorted(filenames):
+                if name.startswith(".") and name.endswith(".part"):
+                    yield Path(dirpath, name).relative_to(self.root).as_posix()
+
+    def _walk(self, directory: Path, prefix: str) -> Iterator[str]:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+        # Sort directories as "name/" so keys come out in global lexicographic order
+        entries.sort(key=lambda e: e.name + "/" if e.is_dir(follow_symlinks=False) else e.name)
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue  # in-flight uploads (.part files), see iter_temp_keys
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(Path(entry.path), f"{prefix}{entry.name}/")
+            elif entry.is_file(follow_symlinks=False):
+                yield prefix + entry.name
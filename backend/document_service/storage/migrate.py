@@ -0,0 +1,153 @@
+"""
+Move stored document files to another storage backend (or into the local
+fan-out layout) while the service keeps running.
+
+Each blob is copied to the target first, then its blob/document rows are
+repointed in one transaction (under the blob's row lock, which uploads and
+deletes also take), and the old copy is deleted only after a grace period so
+requests that resolved the old location just before the switch can finish.
+Keep the grace period above the service's DOCUMENT_CACHE_TTL, since cached
+metadata may point at the old location until it expires.
+Safe to interrupt and re-run: already-migrated blobs are skipped.
+
+Documents without a content hash must be backfilled first
+(database/scripts/backfill_blob_hashes.py).
+
+Usage (from backend/):
+    python -m document_service.storage.migrate --to local [--dry-run]
+    DOCUMENT_STORAGE_BACKEND=s3 S3_BUCKET=documents python -m document_service.storage.migrate --to s3
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from document_service.database import get_db_connection
+from document_service.storage import UPLOAD_DIR, StorageBackend, blob_key, get_backend, remove_file, resolve
+
+
+def _same_file(a: StorageBackend, a_key: str, b: StorageBackend, b_key: str) -> bool:
+    a_path, b_path = a.local_path(a_key), b.local_path(b_key)
+    if a_path is None or b_path is None:
+        return a is b and a_key == b_key
+    try:
+        return os.path.samefile(a_path, b_path)
+    except FileNotFoundError:
+        return False
+
+
+def _migrate_blob(
+    conn, target: StorageBackend, sha256: str, file_path: str, encoding: Optional[str]
+) -> Tuple[str, List[str]]:
+    """Returns (outcome, file_paths to delete after the grace period)."""
+    source, source_key = resolve(file_path)
+    # Bytes are copied as stored; compressed blobs stay compressed
+    dest_key = blob_key(sha256, encoding)
+    new_ref = target.ref(dest_key)
+
+    if not target.exists(dest_key):
+        try:
+            tmp = source.copy_to_temp(source_key, UPLOAD_DIR)
+        except FileNotFoundError:
+            return "missing", []
+        try:
+            target.save(dest_key, tmp)
+        finally:
+            remove_file(tmp)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT file_path FROM blob WHERE sha256 = %s FOR UPDATE", (sha256,))
+        row = cursor.fetchone()
+        if row is None:
+            # Last reference was deleted while we copied
+            conn.rollback()
+            target.delete(dest_key)
+            return "deleted", []
+        if row[0] != file_path:
+            conn.rollback()
+            return "changed", []
+        cursor.execute("UPDATE blob SET file_path = %s WHERE sha256 = %s", (new_ref, sha256))
+        cursor.execute("UPDATE document SET file_path = %s WHERE blob_sha256 = %s", (new_ref, sha256))
+        conn.commit()
+
+    if _same_file(source, source_key, target, dest_key):
+        return "moved", []
+    return "moved", [file_path]
+
+
+def migrate(target: StorageBackend, batch_size: int = 100, grace: float = 30.0, dry_run: bool = False) -> Dict[str, int]:
+    conn = get_db_connection()
+    stats = {"moved": 0, "missing": 0, "skipped": 0, "failed": 0}
+    last_sha = ""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM document WHERE blob_sha256 IS NULL")
+            unhashed = cursor.fetchone()[0]
+        conn.commit()
+        if unhashed:
+            print(f"⚠️  {unhashed} documents have no content hash; run scripts/backfill_blob_hashes.py first")
+
+        while True:
+            # Keyset over sha256 so failed rows don't make the loop spin
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT sha256, file_path, encoding FROM blob
+                    WHERE sha256 > %s AND file_path NOT LIKE %s
+                    ORDER BY sha256
+                    LIMIT %s
+                """, (last_sha, target.ref("") + "%", batch_size))
+                rows = cursor.fetchall()
+            conn.commit()
+            if not rows:
+                break
+            last_sha = rows[-1][0]
+
+            stale: List[str] = []
+            for sha256, file_path, encoding in rows:
+                if dry_run:
+                    print(f"{file_path} -> {target.ref(blob_key(sha256, encoding))}")
+                    stats["moved"] += 1
+                    continue
+                try:
+                    outcome, old = _migrate_blob(conn, target, sha256, file_path, encoding)
+                except Exception as e:
+                    conn.rollback()
+                    print(f"❌ {sha256}: {e}")
+                    stats["failed"] += 1
+                    continue
+                if outcome == "missing":
+                    print(f"⚠️  {sha256}: file missing ({file_path}), skipping")
+                    stats["missing"] += 1
+                elif outcome == "moved":
+                    stats["moved"] += 1
+                else:
+                    stats["skipped"] += 1
+                stale.extend(old)
+
+            if stale:
+                time.sleep(grace)
+                for file_path in stale:
+                    backend, key = resolve(file_path)
+                    try:
+                        backend.delete(key)
+                    except Exception as e:
+                        print(f"⚠️  could not delete old copy {file_path}: {e}")
+
+        print(f"✅ Migrated {stats['moved']} blobs to {target.scheme} "
+              f"({stats['missing']} missing, {stats['skipped']} skipped, {stats['failed']} failed)")
+    finally:
+        conn.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate document files to a storage backend")
+    parser.add_argument("--to", required=True, choices=["local", "s3"], help="Target storage backend")
+    parser.add_argument("--batch-size", type=int, default=100, help="Blobs per batch")
+    parser.add_argument("--grace", type=float, default=30.0,
+                        help="Seconds to keep old copies after repointing a batch (default: 30)")
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would move")
+    args = parser.parse_args()
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    migrate(get_backend(args.to), batch_size=args.batch_size, grace=args.grace, dry_run=args.dry_run)
@@ -0,0 +1,362 @@
+"""
+Find (and optionally repair) drift between the document tables and the file store:
+
+- orphaned files: objects in a storage backend that no blob row points at, left
+  behind when a process dies between saving a file and committing its row
+- dangling rows: blob rows, and documents from before content addressing, whose
+  file is missing, so /view and /download return 404
+- stale temp files: ".<name>.part" files of uploads or copies that crashed
+  before renaming them into place
+
+Neither side is loaded into memory. Blob rows come from a server-side cursor
+ordered by sha256 and storage keys ("ab/cd/<sha256>[.gz]") are listed in
+lexicographic order, which is the same order, so the two streams are
+merge-joined. Storage operations are rate-limited (--rate per second).
+
+Every finding is re-checked under the blob's row lock before it is repaired.
+Files younger than --min-age are never treated as orphans: uploads, migrations
+and the cold tier write a file shortly before the row that points at it.
+
+--repair deletes orphaned files and stale temp files and relinks rows whose file exists under another
+key or backend (e.g. after an interrupted migration). Rows whose file is really
+gone are only deleted with --prune-dangling.
+
+Usage (from backend/):
+    python -m document_service.storage.reconcile [--backend local --backend s3]
+    python -m document_service.storage.reconcile --repair [--prune-dangling]
+    python -m document_service.storage.reconcile --repair --every 86400    # as a scheduled job
+"""
+import argparse
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from document_service.compression import GZIP, is_gzip
+from document_service.database import get_db_connection
+from document_service.storage import STORAGE_BACKEND, StorageBackend, blob_key, get_backend, resolve
+
+# Keys written by the service; anything else in a backend is reported but never touched
+_BLOB_KEY = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(\.gz)?$")
+
+CURSOR_ITERSIZE = 1000
+
+
+class _RateLimiter:
+    """Spaces calls out to at most `rate` per second (0 = unlimited)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self.interval
+
+
+def _blob_sha(key: str) -> Optional[str]:
+    match = _BLOB_KEY.match(key)
+    return match.group(3) if match else None
+
+
+def _blob_rows(conn, backend: StorageBackend) -> Iterator[Tuple[str, str, str, Optional[str]]]:
+    """(key, sha256, file_path, encoding) of the blobs stored in backend, by sha256."""
+    prefix = backend.ref("")
+    with conn.cursor(name=f"reconcile_{backend.scheme}") as cursor:
+        cursor.itersize = CURSOR_ITERSIZE
+        cursor.execute("""
+            SELECT sha256, file_path, encoding FROM blob
+            WHERE file_path LIKE %s
+            ORDER BY sha256
+        """, (prefix + "%",))
+        for sha256, file_path, encoding in cursor:
+            yield file_path[len(prefix):], sha256, file_path, encoding
+
+
+def delete_orphan(conn, backend: StorageBackend, key: str, sha256: str) -> bool:
+    """Delete a blob file no row references; False if the content was re-uploaded meanwhile."""
+    ref = backend.ref(key)
+    with conn.cursor() as cursor:
+        # A placeholder row holds the blob's row lock, so a concurrent upload of the same
+        # content waits for us instead of deduplicating against the file being deleted
+        cursor.execute("""
+            INSERT INTO blob (sha256, file_path, size, ref_count) VALUES (%s, %s, 0, 0)
+            ON CONFLICT (sha256) DO NOTHING
+        """, (sha256, ref))
+        placeholder = cursor.rowcount == 1
+        if not placeholder:
+            cursor.execute("SELECT file_path FROM blob WHERE sha256 = %s FOR UPDATE", (sha256,))
+            row = cursor.fetchone()
+            if row is not None and row[0] == ref:
+                # Referenced since the listing started
+                conn.rollback()
+                return False
+        backend.delete(key)
+        if placeholder:
+            cursor.execute("DELETE FROM blob WHERE sha256 = %s", (sha256,))
+        conn.commit()
+    return True
+
+
+def _find_copy(backends: List[StorageBackend], sha256: str) -> Optional[Tuple[StorageBackend, str]]:
+    for backend in backends:
+        for encoding in (None, GZIP):
+            key = blob_key(sha256, encoding)
+            if backend.exists(key):
+                return backend, key
+    return None
+
+
+def _check_dangling(
+    conn, backends: List[StorageBackend], sha256: str, file_path: str, repair: bool, prune: bool
+) -> str:
+    """Re-check a blob row whose file wasn't listed. Returns the outcome."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT file_path, encoding FROM blob WHERE sha256 = %s FOR UPDATE", (sha256,))
+        row = cursor.fetchone()
+        if row is None or row[0] != file_path:
+            conn.rollback()
+            return "changed"
+        backend, key = resolve(file_path)
+        if backend.exists(key):
+            conn.rollback()
+            return "ok"
+        if not repair:
+            conn.rollback()
+            return "dangling"
+
+        found = _find_copy(backends, sha256)
+        if found is not None:
+            new_backend, new_key = found
+            encoding = GZIP if new_key.endswith(".gz") else (None if is_gzip(row[1]) else row[1])
+            new_ref = new_backend.ref(new_key)
+            cursor.execute(
+                "UPDATE blob SET file_path = %s, encoding = %s, stored_size = %s WHERE sha256 = %s",
+                (new_ref, encoding, new_backend.stat(new_key).size, sha256),
+            )
+            cursor.execute("UPDATE document SET file_path = %s WHERE blob_sha256 = %s", (new_ref, sha256))
+            conn.commit()
+            return "relinked"
+        if prune:
+            cursor.execute("DELETE FROM document WHERE blob_sha256 = %s", (sha256,))
+            cursor.execute("DELETE FROM blob WHERE sha256 = %s", (sha256,))
+            conn.commit()
+            return "pruned"
+        conn.rollback()
+        return "dangling"
+
+
+def _sweep_temp_files(
+    backend: StorageBackend, stats: Dict[str, int], repair: bool, min_age: float, limiter: _RateLimiter
+) -> None:
+    """Report (and with repair, delete) temp files older than min_age; younger ones may be in flight."""
+    for key in backend.iter_temp_keys():
+        limiter.wait()
+        try:
+            age = time.time() - backend.stat(key).mtime
+        except FileNotFoundError:
+            continue  # finished or cleaned up meanwhile
+        if age < min_age:
+            continue
+        stats["stale_temp"] += 1
+        print(f"stale temp file: {backend.ref(key)}")
+        if repair:
+            limiter.wait()
+            try:
+                backend.delete(key)
+                stats["temp_deleted"] += 1
+            except Exception as e:
+                print(f"❌ {key}: {e}")
+                stats["failed"] += 1
+
+
+def reconcile_backend(
+    backend: StorageBackend,
+    search: List[StorageBackend],
+    repair: bool = False,
+    prune: bool = False,
+    min_age: float = 3600.0,
+    limiter: Optional[_RateLimiter] = None,
+) -> Dict[str, int]:
+    """Merge-join one backend's keys with the blob rows pointing into it."""
+    limiter = limiter or _RateLimiter(0)
+    stats = {"ok": 0, "orphaned": 0, "dangling": 0, "relinked": 0, "pruned": 0,
+             "deleted": 0, "young": 0, "unrecognized": 0, "stale_temp": 0, "temp_deleted": 0, "failed": 0}
+    read_conn = get_db_connection()
+    write_conn = get_db_connection()
+
+    def orphan(key: str, sha256: str) -> None:
+        limiter.wait()
+        try:
+            age = time.time() - backend.stat(key).mtime
+        except FileNotFoundError:
+            return
+        if age < min_age:
+            stats["young"] += 1
+            return
+        stats["orphaned"] += 1
+        print(f"orphaned file: {backend.ref(key)}")
+        if repair:
+            limiter.wait()
+            if delete_orphan(write_conn, backend, key, sha256):
+                stats["deleted"] += 1
+
+    def dangling(sha256: str, file_path: str) -> None:
+        limiter.wait()
+        outcome = _check_dangling(write_conn, search, sha256, file_path, repair, prune)
+        if outcome in ("ok", "changed"):
+            stats["ok"] += 1
+            return
+        stats["dangling"] += 1
+        if outcome != "dangling":
+            stats[outcome] += 1
+        print(f"dangling blob {sha256}: {file_path} is missing" + ("" if outcome == "dangling" else f" ({outcome})"))
+
+    try:
+        _sweep_temp_files(backend, stats, repair, min_age, limiter)
+        rows = _blob_rows(read_conn, backend)
+        keys = iter(backend.iter_keys())
+        row = next(rows, None)
+        key = next(keys, None)
+        last_row_key = ""
+        while row is not None or key is not None:
+            try:
+                if row is not None and _blob_sha(row[0]) != row[1]:
+                    # Not a standard key: check it on its own
+                    limiter.wait()
+                    if backend.exists(row[0]):
+                        stats["ok"] += 1
+                    else:
+                        dangling(row[1], row[2])
+                    row = next(rows, None)
+                    continue
+                if key is not None and _blob_sha(key) is None:
+                    stats["unrecognized"] += 1
+                    key = next(keys, None)
+                    continue
+                if row is not None:
+                    if row[0] < last_row_key:
+                        raise RuntimeError("blob rows are not in key order (database collation?); aborting")
+                    last_row_key = row[0]
+
+                if key is None or (row is not None and row[0] < key):
+                    dangling(row[1], row[2])
+                    row = next(rows, None)
+                elif row is None or key < row[0]:
+                    orphan(key, _blob_sha(key))
+                    key = next(keys, None)
+                else:
+                    stats["ok"] += 1
+                    row = next(rows, None)
+                    key = next(keys, None)
+                limiter.wait()
+            except RuntimeError:
+                raise
+            except Exception as e:
+                write_conn.rollback()
+                print(f"❌ {e}")
+                stats["failed"] += 1
+                # Skip whichever side was being looked at
+                if key is not None and (row is None or key <= row[0]):
+                    key = next(keys, None)
+                else:
+                    row = next(rows, None)
+        read_conn.commit()
+    finally:
+        read_conn.close()
+        write_conn.close()
+    return stats
+
+
+def reconcile_legacy(repair: bool = False, prune: bool = False, limiter: Optional[_RateLimiter] = None) -> Dict[str, int]:
+    """Documents from before content addressing own their file: check each one exists."""
+    limiter = limiter or _RateLimiter(0)
+    stats = {"ok": 0, "dangling": 0, "pruned": 0, "failed": 0}
+    read_conn = get_db_connection()
+    write_conn = get_db_connection()
+    try:
+        with read_conn.cursor(name="reconcile_legacy") as cursor:
+            cursor.itersize = CURSOR_ITERSIZE
+            cursor.execute("SELECT id, file_path FROM document WHERE blob_sha256 IS NULL ORDER BY id")
+            for document_id, file_path in cursor:
+                limiter.wait()
+                try:
+                    backend, key = resolve(file_path)
+                    if backend.exists(key):
+                        stats["ok"] += 1
+                        continue
+                    stats["dangling"] += 1
+                    print(f"dangling document {document_id}: {file_path} is missing")
+                    if repair and prune:
+                        with write_conn.cursor() as delete_cursor:
+                            delete_cursor.execute(
+                                "DELETE FROM document WHERE id = %s AND file_path = %s AND blob_sha256 IS NULL",
+                                (document_id, file_path),
+                            )
+                            stats["pruned"] += delete_cursor.rowcount
+                        write_conn.commit()
+                except Exception as e:
+                    write_conn.rollback()
+                    print(f"❌ {document_id}: {e}")
+                    stats["failed"] += 1
+        read_conn.commit()
+    finally:
+        read_conn.close()
+        write_conn.close()
+    return stats
+
+
+def reconcile(
+    schemes: List[str],
+    repair: bool = False,
+    prune: bool = False,
+    min_age: float = 3600.0,
+    rate: float = 0.0,
+) -> Dict[str, Dict[str, int]]:
+    limiter = _RateLimiter(rate)
+    backends = [get_backend(scheme) for scheme in schemes]
+    results = {}
+    for backend in backends:
+        stats = reconcile_backend(backend, backends, repair=repair, prune=prune, min_age=min_age, limiter=limiter)
+        results[backend.scheme] = stats
+        print(f"✅ {backend.scheme}: {stats['ok']} ok, {stats['orphaned']} orphaned files "
+              f"({stats['deleted']} deleted), {stats['dangling']} dangling blobs ({stats['relinked']} relinked, "
+              f"{stats['pruned']} pruned), {stats['unrecognized']} unrecognized keys, {stats['stale_temp']} stale temp files "
+              f"({stats['temp_deleted']} deleted), {stats['failed']} failed")
+    stats = reconcile_legacy(repair=repair, prune=prune, limiter=limiter)
+    results["legacy"] = stats
+    print(f"✅ legacy documents: {stats['ok']} ok, {stats['dangling']} dangling ({stats['pruned']} pruned)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile stored document files with the database")
+    parser.add_argument("--backend", action="append", choices=["local", "s3"],
+                        help=f"Backend to check; repeat for several (default: {STORAGE_BACKEND})")
+    parser.add_argument("--repair", action="store_true", help="Delete orphaned files and stale temp files, relink moved ones")
+    parser.add_argument("--prune-dangling", action="store_true",
+                        help="With --repair, delete documents whose file is gone")
+    parser.add_argument("--min-age", type=float, default=3600.0,
+                        help="Seconds before an unreferenced or temp file counts as left over (default: 3600)")
+    parser.add_argument("--rate", type=float, default=200.0,
+                        help="Storage operations per second, 0 for unlimited (default: 200)")
+    parser.add_argument("--every", type=float, default=0.0,
+                        help="Keep running, reconciling every this many seconds")
+    args = parser.parse_args()
+    if args.prune_dangling and not args.repair:
+        parser.error("--prune-dangling requires --repair")
+
+    while True:
+        reconcile(
+            args.backend or [STORAGE_BACKEND],
+            repair=args.repair,
+            prune=args.prune_dangling,
+            min_age=args.min_age,
+            rate=args.rate,
+        )
+        if not args.every:
+            break
+        time.sleep(args.every)
@@ -0,0 +1,139 @@
+import io
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from document_service.storage.base import ObjectInfo, StorageBackend, remove_file
+
+# Bytes fetched per ranged GET when reading an object
+RANGE_READ_SIZE = 1024 * 1024
+
+_MISSING_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+class StorageConfigError(RuntimeError):
+    """Raised when a storage backend can't be constructed from the environment."""
+
+
+def _is_missing(e: Exception) -> bool:
+    code = getattr(e, "response", {}).get("Error", {}).get("Code")
+    return code in _MISSING_CODES
+
+
+class S3Storage(StorageBackend):
+    """
+    Objects in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    boto3 is an optional dependency, imported only when this backend is used.
+    Credentials come from the usual AWS environment variables / config files.
+    """
+
+    scheme = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        client=None,
+    ):
+        if not bucket:
+            raise StorageConfigError("S3_BUCKET must be set for the s3 storage backend")
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise StorageConfigError(f"boto3 is required for the s3 storage backend: {e}")
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def save(self, key: str, src: Path) -> bool:
+        try:
+            if self.exists(key):
+                return False
+            self.client.upload_file(str(src), self.bucket, self._object_key(key))
+            return True
+        finally:
+            remove_file(src)
+
+    def open(self, key: str) -> BinaryIO:
+        info = self.stat(key)
+        return io.BufferedReader(_RangeReader(self, key, info.size), buffer_size=RANGE_READ_SIZE)
+
+    def stat(self, key: str) -> ObjectInfo:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if _is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        return ObjectInfo(size=head["ContentLength"], mtime=head["LastModified"].timestamp())
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def iter_keys(self) -> Iterator[str]:
+        # ListObjectsV2 returns keys in UTF-8 binary order
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        """Bytes [start, end) of key."""
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket,
+                Key=self._object_key(key),
+                Range=f"bytes={start}-{end - 1}",
+            )
+        except Exception as e:
+            if _is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+        with resp["Body"] as body:
+            return body.read()
+
+
+class _RangeReader(io.RawIOBase):
+    """Seekable raw reader over an S3 object, one ranged GET per read."""
+
+    def __init__(self, storage: S3Storage, key: str, size: int):
+        self.storage = storage
+        self.key = key
+        self.size = size
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.pos = offset
+        return self.pos
+
+    def readinto(self, buffer) -> int:
+        if self.pos >= self.size or len(buffer) == 0:
+            return 0
+        end = min(self.pos + len(buffer), self.size)
+        data = self.storage.read_range(self.key, self.pos, end)
+        n = len(data)
+        buffer[:n] = data
+        self.pos += n
+        return n
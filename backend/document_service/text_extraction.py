@@ -0,0 +1,118 @@
+"""
+Pure-Python text extraction for uploaded documents, one string per page.
+
+Runs inside worker processes (see extraction_worker), so everything here is
+plain functions over a file path with no database access. PDFs are parsed
+with pypdf. Compressed content (DOCX parts, PDF Flate streams) is bounded by
+EXTRACTION_MAX_INFLATED_BYTES so a small upload cannot expand without limit.
+"""
+import os
+import zipfile
+from typing import List
+from xml.etree import ElementTree
+
+import pypdf
+from pypdf import PdfReader
+
+
+class UnsupportedDocumentError(Exception):
+    """The content type has no text extractor."""
+
+
+# Plain-text documents are split into pseudo-pages of about this many characters
+TEXT_PAGE_CHARS = 4000
+# Largest decompressed size accepted for one DOCX part or PDF stream
+EXTRACTION_MAX_INFLATED_BYTES = int(os.getenv("EXTRACTION_MAX_INFLATED_BYTES", str(64 * 1024 * 1024)))
+
+
+def extract_pages(path: str, content_type: str) -> List[str]:
+    """Return the text of each page of the document at path."""
+    if content_type == "application/pdf":
+        return _extract_pdf(path)
+    if content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        return _extract_docx(path)
+    if content_type in ("text/plain", "text/markdown"):
+        return _extract_text(path)
+    raise UnsupportedDocumentError(content_type)
+
+
+# --------------------------
+# Plain text / Markdown
+# --------------------------
+
+def _extract_text(path: str) -> List[str]:
+    with open(path, "rb") as f:
+        text = f.read().decode("utf-8", errors="replace")
+
+    if "\f" in text:
+        return [page.strip("\n") for page in text.split("\f")]
+
+    pages: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        if current and size + len(line) > TEXT_PAGE_CHARS:
+            pages.append("".join(current).rstrip("\n"))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current or not pages:
+        pages.append("".join(current).rstrip("\n"))
+    return pages
+
+
+# --------------------------
+# DOCX
+# --------------------------
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _extract_docx(path: str) -> List[str]:
+    with zipfile.ZipFile(path) as z:
+        info = z.getinfo("word/document.xml")
+        if info.file_size > EXTRACTION_MAX_INFLATED_BYTES:
+            raise ValueError(f"word/document.xml inflates to {info.file_size} bytes")
+        with z.open(info) as f:
+            # file_size comes from the archive itself, so never read past the limit either way
+            data = f.read(EXTRACTION_MAX_INFLATED_BYTES + 1)
+        if len(data) > EXTRACTION_MAX_INFLATED_BYTES:
+            raise ValueError("word/document.xml exceeds the decompression limit")
+        root = ElementTree.fromstring(data)
+
+    pages: List[List[str]] = [[]]
+    body = root.find(f"{_W}body")
+    if body is None:
+        return [""]
+
+    for para in body.iter(f"{_W}p"):
+        parts: List[str] = []
+        for el in para.iter():
+            if el.tag == f"{_W}t" and el.text:
+                parts.append(el.text)
+            elif el.tag == f"{_W}tab":
+                parts.append("\t")
+            elif el.tag == f"{_W}br" and el.get(f"{_W}type") == "page":
+                pages[-1].append("".join(parts))
+                parts = []
+                pages.append([])
+            elif el.tag == f"{_W}lastRenderedPageBreak" and (parts or pages[-1]):
+                pages[-1].append("".join(parts))
+                parts = []
+                pages.append([])
+        pages[-1].append("".join(parts))
+
+    return ["\n".join(lines).strip("\n") for lines in pages]
+
+
+# --------------------------
+# PDF
+# --------------------------
+
+# pypdf raises LimitReachedError when a Flate stream would inflate past this
+pypdf.filters.ZLIB_MAX_OUTPUT_LENGTH = EXTRACTION_MAX_INFLATED_BYTES
+
+
+def _extract_pdf(path: str) -> List[str]:
+    reader = PdfReader(path)
+    return [(page.extract_text() or "") for page in reader.pages]
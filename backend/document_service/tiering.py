@@ -0,0 +1,264 @@
+"""
+Cold tier for document blobs.
+
+Blobs nobody has opened for COLD_TIER_AFTER_DAYS are rewritten gzip-compressed
+(to COLD_TIER_BACKEND, by default the main storage backend) by a background
+sweeper, if that saves at least COMPRESSION_MIN_SAVING. Blobs of a document
+type in COLD_TIER_SKIP_TYPES stay uncompressed while they have been read by
+byte range (as PDF.js does) within COLD_TIER_RANGE_READ_DAYS: a range of a
+gzip blob can only be reached by inflating everything before it, so it is
+served whole. Access and range-read times are batched in memory by
+AccessTracker and flushed periodically, so serving a file doesn't cost a
+database write.
+
+Repointing works like storage.migrate: write the compressed copy, update the
+blob/document rows under the blob's row lock, delete the old copy after a
+grace period (keep it above DOCUMENT_CACHE_TTL).
+
+    python -m document_service.tiering --after-days 90    # one sweep from the command line
+"""
+import argparse
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from document_service.compression import GZIP, IDENTITY, gzip_file, worth_keeping
+from document_service.database import get_db_connection
+from document_service.storage import (
+    UPLOAD_DIR,
+    StorageBackend,
+    blob_key,
+    get_backend,
+    get_storage,
+    remove_file,
+    resolve,
+)
+
+COLD_TIER_AFTER_DAYS = float(os.getenv("COLD_TIER_AFTER_DAYS", "90"))  # 0 disables the sweeper
+COLD_SWEEP_INTERVAL = float(os.getenv("COLD_SWEEP_INTERVAL", "3600"))  # seconds
+COLD_SWEEP_BATCH = int(os.getenv("COLD_SWEEP_BATCH", "100"))
+COLD_TIER_BACKEND = os.getenv("COLD_TIER_BACKEND") or None
+COLD_TIER_GRACE = float(os.getenv("COLD_TIER_GRACE", "30"))  # seconds
+ACCESS_FLUSH_INTERVAL = float(os.getenv("ACCESS_FLUSH_INTERVAL", "60"))  # seconds
+COLD_TIER_SKIP_TYPES = [
+    t.strip() for t in os.getenv("COLD_TIER_SKIP_TYPES", "application/pdf").split(",") if t.strip()
+]
+COLD_TIER_RANGE_READ_DAYS = float(os.getenv("COLD_TIER_RANGE_READ_DAYS", "365"))
+
+
+class AccessTracker:
+    """
+    Collects accessed blob hashes; flush() writes them to blob.last_accessed_at
+    (and blob.last_range_read_at for ranged reads) in one UPDATE.
+    """
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._ranged: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def touch(self, sha256: Optional[str], ranged: bool = False) -> None:
+        if sha256:
+            with self._lock:
+                self._pending.add(sha256)
+                if ranged:
+                    self._ranged.add(sha256)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            ranged, self._ranged = self._ranged, set()
+        if not pending:
+            return 0
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE blob SET last_accessed_at = now(),
+                        last_range_read_at = CASE WHEN sha256 = ANY(%s) THEN now() ELSE last_range_read_at END
+                    WHERE sha256 = ANY(%s)
+                """, (sorted(ranged), sorted(pending)))
+                conn.commit()
+            return len(pending)
+        except Exception as e:
+            conn.rollback()
+            print(f"Could not record blob access times: {e}")
+            return 0
+        finally:
+            conn.close()
+
+
+def _compress_blob(
+    conn, target: StorageBackend, sha256: str, file_path: str, size: int
+) -> Tuple[str, int, List[str]]:
+    """Returns (outcome, bytes saved, file_paths to delete after the grace period)."""
+    source, source_key = resolve(file_path)
+    try:
+        with source.open(source_key) as src:
+            gz_path, gz_size = gzip_file(src, UPLOAD_DIR)
+    except FileNotFoundError:
+        return "missing", 0, []
+
+    if not worth_keeping(size, gz_size):
+        remove_file(gz_path)
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE blob SET encoding = %s, stored_size = size
+                WHERE sha256 = %s AND file_path = %s AND encoding IS NULL
+            """, (IDENTITY, sha256, file_path))
+        conn.commit()
+        return "incompressible", 0, []
+
+    dest_key = blob_key(sha256, GZIP)
+    try:
+        target.save(dest_key, gz_path)
+    finally:
+        remove_file(gz_path)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT file_path, encoding FROM blob WHERE sha256 = %s FOR UPDATE", (sha256,))
+        row = cursor.fetchone()
+        if row is None:
+            # Last reference was deleted meanwhile
+            conn.rollback()
+            target.delete(dest_key)
+            return "deleted", 0, []
+        if row[0] != file_path or row[1] is not None:
+            conn.rollback()
+            return "changed", 0, []
+        new_ref = target.ref(dest_key)
+        cursor.execute(
+            "UPDATE blob SET file_path = %s, encoding = %s, stored_size = %s WHERE sha256 = %s",
+            (new_ref, GZIP, gz_size, sha256),
+        )
+        cursor.execute("UPDATE document SET file_path = %s WHERE blob_sha256 = %s", (new_ref, sha256))
+        conn.commit()
+    return "compressed", size - gz_size, [file_path]
+
+
+class ColdTierSweeper:
+    """Background thread: flushes access times and periodically compresses idle blobs."""
+
+    def __init__(
+        self,
+        tracker: AccessTracker,
+        after_days: float = COLD_TIER_AFTER_DAYS,
+        interval: float = COLD_SWEEP_INTERVAL,
+        batch_size: int = COLD_SWEEP_BATCH,
+        grace: float = COLD_TIER_GRACE,
+        target: Optional[str] = COLD_TIER_BACKEND,
+        skip_types: Optional[List[str]] = None,
+        range_read_days: float = COLD_TIER_RANGE_READ_DAYS,
+    ):
+        self.tracker = tracker
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.grace = grace
+        self.target = target
+        self.skip_types = COLD_TIER_SKIP_TYPES if skip_types is None else skip_types
+        self.range_read_days = range_read_days
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cold-tier-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.tracker.flush()
+
+    def _run(self) -> None:
+        # First sweep one interval after startup, not while the service is warming up
+        next_sweep = self.interval
+        while not self._stop.wait(min(ACCESS_FLUSH_INTERVAL, next_sweep)):
+            self.tracker.flush()
+            next_sweep -= min(ACCESS_FLUSH_INTERVAL, next_sweep)
+            if next_sweep <= 0:
+                next_sweep = self.interval
+                if self.after_days > 0:
+                    try:
+                        self.sweep()
+                    except Exception as e:
+                        print(f"Cold tier sweep failed: {e}")
+
+    def sweep(self) -> Dict[str, int]:
+        """Compress blobs idle for more than after_days. Returns counts and bytes saved."""
+        target = get_backend(self.target) if self.target else get_storage()
+        stats = {"compressed": 0, "incompressible": 0, "skipped": 0, "failed": 0, "bytes_saved": 0}
+        self.tracker.flush()
+        conn = get_db_connection()
+        last_sha = ""
+        try:
+            while not self._stop.is_set():
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT sha256, file_path, size FROM blob
+                        WHERE encoding IS NULL
+                          AND sha256 > %s
+                          AND COALESCE(last_accessed_at, created_at) < now() - %s * interval '1 day'
+                          AND NOT EXISTS (
+                              SELECT 1 FROM document d
+                              WHERE d.blob_sha256 = blob.sha256 AND d.content_type = ANY(%s)
+                                AND blob.last_range_read_at > now() - %s * interval '1 day'
+                          )
+                        ORDER BY sha256
+                        LIMIT %s
+                    """, (last_sha, self.after_days, self.skip_types, self.range_read_days, self.batch_size))
+                    rows = cursor.fetchall()
+                conn.commit()
+                if not rows:
+                    break
+                last_sha = rows[-1][0]
+
+                stale: List[str] = []
+                for sha256, file_path, size in rows:
+                    try:
+                        outcome, saved, old = _compress_blob(conn, target, sha256, file_path, size)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Cold tier: {sha256} failed: {e}")
+                        stats["failed"] += 1
+                        continue
+                    if outcome in ("compressed", "incompressible"):
+                        stats[outcome] += 1
+                    else:
+                        stats["skipped"] += 1
+                    stats["bytes_saved"] += saved
+                    stale.extend(old)
+
+                if stale:
+                    if self._stop.wait(self.grace):
+                        # Stopped during the grace period: leave the old copies to storage.reconcile
+                        break
+                    for file_path in stale:
+                        backend, key = resolve(file_path)
+                        try:
+                            backend.delete(key)
+                        except Exception as e:
+                            print(f"Cold tier: could not delete old copy {file_path}: {e}")
+        finally:
+            conn.close()
+
+        if stats["compressed"] or stats["failed"]:
+            print(f"Cold tier: compressed {stats['compressed']} blobs, saved {stats['bytes_saved']} bytes "
+                  f"({stats['incompressible']} incompressible, {stats['failed']} failed)")
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one cold tier sweep (the service also runs it periodically)")
+    parser.add_argument("--after-days", type=float, default=COLD_TIER_AFTER_DAYS,
+                        help="Idle time before a blob is compressed")
+    parser.add_argument("--grace", type=float, default=COLD_TIER_GRACE,
+                        help="Seconds to keep old copies after repointing")
+    args = parser.parse_args()
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    sweeper = ColdTierSweeper(AccessTracker(), after_days=args.after_days, grace=args.grace)
+    print(sweeper.sweep())
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from document_service.storage import remove_file
+
+# Upload limits
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))  # 50MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Room for multipart boundaries and the other form fields on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Accepted document types and their extensions
+ALLOWED_TYPES = {
+    'application/pdf': '.pdf',
+    'text/plain': '.txt',
+    'application/msword': '.doc',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': '.docx',
+    'text/markdown': '.md'
+}
+_TYPES_BY_EXTENSION = {ext: content_type for content_type, ext in ALLOWED_TYPES.items()}
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File too large. Maximum size is {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    size: int  # original size
+    sha256: str  # of the original bytes
+    encoding: Optional[str] = None  # set once compression was considered (see compression.py)
+    stored_size: Optional[int] = None  # size of the file at path
+
+
+def resolve_content_type(filename: Optional[str], declared: Optional[str]) -> Optional[str]:
+    """The declared type if it's allowed, else one guessed from the extension; None if unsupported."""
+    if declared in ALLOWED_TYPES:
+        return declared
+    return _TYPES_BY_EXTENSION.get(Path(filename or "").suffix.lower())
+
+
+def _copy_and_hash(src: BinaryIO, dest: Path, max_bytes: int) -> Tuple[int, str]:
+    """Copy src to dest in chunks, hashing as we go. Runs in a worker thread."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest, "wb") as out:
+        while True:
+            chunk = src.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            digest.update(chunk)
+            out.write(chunk)
+    return size, digest.hexdigest()
+
+
+async def receive_upload(
+    upload: UploadFile,
+    dest_dir: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> StoredUpload:
+    """
+    Stream an upload to a temp file in dest_dir without blocking the event loop.
+
+    The size limit and SHA-256 are enforced/computed in the same pass. The temp
+    file lives next to the blob store so it can later be renamed into place
+    atomically (see StorageBackend.save); the caller owns its cleanup.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    tmp_path = dest_dir / f".{uuid.uuid4().hex}.part"
+    try:
+        size, sha256 = await run_in_threadpool(_copy_and_hash, upload.file, tmp_path, max_bytes)
+    except BaseException:
+        await run_in_threadpool(remove_file, tmp_path)
+        raise
+
+    return StoredUpload(path=tmp_path, size=size, sha256=sha256)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized upload bodies before they are spooled by the multipart parser.
+
+    Requests with a Content-Length over the limit get a 413 immediately; bodies
+    without one are counted as they stream and cut off once they pass it.
+    """
+
+    def __init__(self, app, path_prefix: str = "/documents/upload", max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_body = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > self.max_body:
+                        await self._send_413(send)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Replace whatever the app answers to the cut-off body with a 413
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._send_413(send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # The app may raise on the truncated body after the 413 went out
+            if not (exceeded and response_started):
+                raise
+
+    async def _send_413(self, send) -> None:
+        body = f'{{"detail":"File too large. Maximum size is {self.max_bytes} bytes"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
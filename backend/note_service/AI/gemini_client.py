@@ -5,17 +5,41 @@ Gemini JSON client used by SummarizeService.
 Usage:
     client = GeminiClient()  # GEMINI_API_KEY env must be set
     data = client.generate_json(prompt, schema_hint={...}, temperature=0.2)
+
+The google.generativeai SDK and the .env file are loaded on first client
+construction, not at import time, so importing this module stays cheap.
 """
 
 import os
 import json
 import re
+import importlib.util
+import threading
 from typing import Any, Dict, Optional
-import google.generativeai as genai
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when the Gemini client can't be constructed (missing key or SDK)."""
+
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+def _load_env() -> None:
+    """Load environment variables from .env once per process."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+def llm_configured() -> bool:
+    """Cheap check (no SDK import) that a client could be constructed."""
+    _load_env()
+    return bool(os.getenv("GEMINI_API_KEY")) and importlib.util.find_spec("google.generativeai") is not None
 
 # --------------------------
 # Robust JSON parsing helpers
@@ -92,6 +116,20 @@ def _parse_json_best_effort(raw: str) -> Dict[str, Any]:
     }
     return _coerce_schema(coarse)
 
+def _parse_json_object_best_effort(raw: str) -> Dict[str, Any]:
+    """Like _parse_json_best_effort but keeps the object's own keys. Returns {} on failure."""
+    if not isinstance(raw, str):
+        return {}
+    s = _strip_md_fences(raw)
+    s = _extract_json_window(s)
+    s = _repair_trailing_commas(s)
+    s = _balance_brackets(s)
+    try:
+        obj = json.loads(s)
+    except Exception:
+        return {}
+    return obj if isinstance(obj, dict) else {}
+
 
 # --------------------------
 # Gemini client
@@ -112,9 +150,15 @@ class GeminiClient:
             model:   Gemini model name
             system_instruction: optional system prompt
         """
+        _load_env()
         api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not api_key:
-            raise RuntimeError("GEMINI_API_KEY is not set in your environment.")
+            raise LLMUnavailableError("GEMINI_API_KEY is not set in your environment.")
+
+        try:
+            import google.generativeai as genai
+        except ImportError as e:
+            raise LLMUnavailableError(f"google-generativeai is not installed: {e}")
 
         genai.configure(api_key=api_key)
 
@@ -144,6 +188,14 @@ class GeminiClient:
         text = self._call_model(prompt, temperature=temperature)
         return _parse_json_best_effort(text or "")
 
+    def generate_json_object(self, prompt: str, temperature: float = 0.2) -> Dict[str, Any]:
+        """
+        Returns the model's JSON object as-is (no summary-schema coercion).
+        Used for keyed batch responses; returns {} if the output can't be parsed.
+        """
+        text = self._call_model(prompt, temperature=temperature)
+        return _parse_json_object_best_effort(text or "")
+
     # ---- internal ----
     def _call_model(self, prompt: str, temperature: float = 0.2) -> str:
         """
@@ -169,4 +221,4 @@ class GeminiClient:
             # Return empty JSON so upstream can still persist a valid shape
             return "{}"
 
-__all__ = ["GeminiClient"]
\ No newline at end of file
+__all__ = ["GeminiClient", "LLMUnavailableError", "llm_configured"]
\ No newline at end of file
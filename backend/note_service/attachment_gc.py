@@ -0,0 +1,82 @@
+"""
+Garbage collection for note attachments.
+
+Every note save rewrites the note's rows in note_attachment_ref (deleting a
+note cascades to them), so an attachment without rows there is linked from no
+note. A background sweeper deletes those once they have not been saved for
+ATTACHMENT_GC_GRACE seconds: attachments are stored just before the note that
+links to them is committed, and the grace period keeps them alive in between.
+
+    python -m note_service.attachment_gc --grace 3600    # one sweep from the command line
+"""
+import argparse
+import logging
+import os
+import threading
+from typing import Optional
+
+from note_service.daos.attachment_dao import AttachmentDAO
+
+ATTACHMENT_GC_INTERVAL = float(os.getenv("ATTACHMENT_GC_INTERVAL", "3600"))  # seconds, 0 disables the sweeper
+ATTACHMENT_GC_GRACE = float(os.getenv("ATTACHMENT_GC_GRACE", "3600"))  # seconds
+ATTACHMENT_GC_BATCH = int(os.getenv("ATTACHMENT_GC_BATCH", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentSweeper:
+    """Background thread: periodically deletes attachments no note links to."""
+
+    def __init__(
+        self,
+        dao: Optional[AttachmentDAO] = None,
+        interval: float = ATTACHMENT_GC_INTERVAL,
+        grace: float = ATTACHMENT_GC_GRACE,
+        batch_size: int = ATTACHMENT_GC_BATCH,
+    ):
+        self.dao = dao or AttachmentDAO()
+        self.interval = interval
+        self.grace = grace
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="attachment-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        # First sweep one interval after startup, not while the service is warming up
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Attachment sweep failed")
+
+    def sweep(self) -> int:
+        """Delete unreferenced attachments in batches. Returns how many were deleted."""
+        total = 0
+        while not self._stop.is_set():
+            deleted = self.dao.delete_unreferenced(self.grace, self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+        if total:
+            logger.info("Deleted %d unreferenced note attachments", total)
+        return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one attachment sweep (the service also runs it periodically)")
+    parser.add_argument("--grace", type=float, default=ATTACHMENT_GC_GRACE,
+                        help="Seconds since an attachment was last saved before it may be deleted")
+    args = parser.parse_args()
+
+    print(AttachmentSweeper(grace=args.grace).sweep())
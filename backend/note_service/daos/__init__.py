@@ -1,3 +1,4 @@
 from .note_dao import NoteDAO
+from .attachment_dao import AttachmentDAO
 
-__all__ = ["NoteDAO"]
\ No newline at end of file
+__all__ = ["NoteDAO", "AttachmentDAO"]
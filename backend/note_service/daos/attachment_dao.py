@@ -0,0 +1,98 @@
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from common.metrics import instrument_dao
+from note_service.database import get_db_cursor
+
+
+@instrument_dao
+class AttachmentDAO:
+    """Data Access Object for content-addressed note attachments"""
+
+    def save_many(self, attachments: List[Dict[str, Any]]) -> int:
+        """
+        Store attachments ({sha256, content_type, data}) that aren't stored yet.
+        Existing hashes are touched first (saved_at, which keeps them from the
+        sweeper until the note referencing them is committed) so repeated saves
+        of the same note don't resend the image bytes. Returns the number of new
+        attachments.
+        """
+        if not attachments:
+            return 0
+        conn, cur = get_db_cursor()
+        try:
+            cur.execute(
+                "UPDATE note_attachment SET saved_at = now() WHERE sha256 = ANY(%s) RETURNING sha256",
+                ([a["sha256"] for a in attachments],),
+            )
+            existing = {row["sha256"] for row in cur.fetchall()}
+            new = {a["sha256"]: a for a in attachments if a["sha256"] not in existing}
+            if new:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO note_attachment (sha256, content_type, size, data)
+                    VALUES %s
+                    ON CONFLICT (sha256) DO NOTHING
+                    """,
+                    [(a["sha256"], a["content_type"], len(a["data"]), a["data"]) for a in new.values()],
+                )
+            conn.commit()
+            return len(new)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def delete_unreferenced(self, grace_seconds: float, limit: int) -> int:
+        """Delete up to limit attachments no note links to and not saved within grace_seconds."""
+        conn, cur = get_db_cursor()
+        try:
+            cur.execute(
+                """
+                DELETE FROM note_attachment
+                WHERE sha256 IN (
+                    SELECT a.sha256 FROM note_attachment a
+                    WHERE a.saved_at < now() - %s * interval '1 second'
+                      AND NOT EXISTS (SELECT 1 FROM note_attachment_ref r WHERE r.sha256 = a.sha256)
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                """,
+                (grace_seconds, limit),
+            )
+            deleted = cur.rowcount
+            conn.commit()
+            return deleted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def get(self, sha256: str, owner_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The attachment, or None; with owner_id, only if one of that user's notes links to it."""
+        conn, cur = get_db_cursor()
+        try:
+            query = "SELECT a.sha256, a.content_type, a.data FROM note_attachment a WHERE a.sha256 = %s"
+            params: List[Any] = [sha256]
+            if owner_id is not None:
+                query += """
+                    AND EXISTS (
+                        SELECT 1 FROM note_attachment_ref r JOIN note n ON n.id = r.note_id
+                        WHERE r.sha256 = a.sha256 AND n.owner_id = %s
+                    )
+                """
+                params.append(owner_id)
+            cur.execute(query, params)
+            row = cur.fetchone()
+            if not row:
+                return None
+            return {"sha256": row["sha256"], "content_type": row["content_type"], "data": bytes(row["data"])}
+        finally:
+            cur.close()
+            conn.close()
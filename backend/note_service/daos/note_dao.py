@@ -1,10 +1,12 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from note_service.database import get_db_cursor
 from note_service.models.models import NoteCreate, NoteUpdate, NoteResponse
 import uuid
 from datetime import datetime
 import json
-from typing import Any, Dict, List
+from psycopg2.extras import execute_values
+from common.metrics import instrument_dao
+from common.tracing import span
 
 def _row_to_dict(cur, row) -> Dict[str, Any]:
     """
@@ -46,12 +48,42 @@ def _to_list(val) -> List[str]:
             return [val]
     return [str(val)]
 
+
+def _normalize_note_record(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize column types of a note row for NoteResponse."""
+    rec["quiz_ids"] = _to_list(rec.get("quiz_ids"))
+    rec["flashcard_ids"] = _to_list(rec.get("flashcard_ids"))
+
+    sj = rec.get("summary_json")
+    if isinstance(sj, str):
+        try:
+            rec["summary_json"] = json.loads(sj)
+        except Exception:
+            rec["summary_json"] = None
+
+    # Booleans might be ints in some setups
+    rec["is_archived"] = bool(rec.get("is_archived"))
+
+    return rec
+
+def _set_attachment_refs(cur, note_id: str, refs: List[str]) -> None:
+    """Replace the note's rows in note_attachment_ref with refs (attachment hashes its markdown links to)"""
+    cur.execute("DELETE FROM note_attachment_ref WHERE note_id = %s", (note_id,))
+    if refs:
+        execute_values(
+            cur,
+            "INSERT INTO note_attachment_ref (note_id, sha256) VALUES %s ON CONFLICT DO NOTHING",
+            [(note_id, sha256) for sha256 in refs],
+        )
+
+
+@instrument_dao
 class NoteDAO:
     """Data Access Object for note operations"""
     
     @staticmethod
-    def create(note: NoteCreate) -> NoteResponse:
-        """Create a new note"""
+    def create(note: NoteCreate, attachment_refs: Optional[List[str]] = None) -> NoteResponse:
+        """Create a new note; attachment_refs are the attachments its markdown links to"""
         conn, cur = get_db_cursor()
         try:
             note_id = str(uuid.uuid4())
@@ -63,6 +95,7 @@ class NoteDAO:
                   note.quiz_ids, note.flashcard_ids, note.chat_id, note.is_archived, note.font_size, note.font_family, note.line_height))
             
             result = cur.fetchone()
+            _set_attachment_refs(cur, note_id, attachment_refs or [])
             conn.commit()
             
             # Convert result to dict and parse JSON arrays
@@ -207,8 +240,16 @@ class NoteDAO:
             conn.close()
     
     @staticmethod
-    def update(note_id: str, note_update: NoteUpdate) -> Optional[NoteResponse]:
-        """Update a note"""
+    def update(
+        note_id: str,
+        note_update: NoteUpdate,
+        attachment_refs: Optional[List[str]] = None,
+        owner_id: Optional[str] = None,
+    ) -> Optional[NoteResponse]:
+        """
+        Update a note; attachment_refs (given with new markdown) replace its attachment
+        links. With owner_id, another owner's note is treated as missing.
+        """
         conn, cur = get_db_cursor()
         try:
             # Build dynamic update query
@@ -262,13 +303,13 @@ class NoteDAO:
             update_fields.append("updated_at = %s")
             params.append(datetime.now())
             
-            # Add note_id for WHERE clause
-            params.append(note_id)
+            # Add note_id and owner_id for WHERE clause
+            params.extend([note_id, owner_id, owner_id])
             
             query = f"""
                 UPDATE note 
                 SET {', '.join(update_fields)}
-                WHERE id = %s
+                WHERE id = %s AND (%s::uuid IS NULL OR owner_id = %s::uuid)
                 RETURNING id, owner_id, document_id, title, markdown, quiz_ids, flashcard_ids, chat_id, is_archived, created_at, updated_at, summary_json, summary_updated_at, font_size, font_family, line_height
             """
             
@@ -278,6 +319,8 @@ class NoteDAO:
             if not result:
                 return None
             
+            if attachment_refs is not None:
+                _set_attachment_refs(cur, note_id, attachment_refs)
             conn.commit()
             
             # Convert result to dict and handle arrays
@@ -345,11 +388,14 @@ class NoteDAO:
             conn.close()
     
     @staticmethod
-    def delete(note_id: str) -> bool:
-        """Delete a note"""
+    def delete(note_id: str, owner_id: Optional[str] = None) -> bool:
+        """Delete a note (with owner_id, only if that user owns it)"""
         conn, cur = get_db_cursor()
         try:
-            cur.execute("DELETE FROM note WHERE id = %s RETURNING id", (note_id,))
+            cur.execute(
+                "DELETE FROM note WHERE id = %s AND (%s::uuid IS NULL OR owner_id = %s::uuid) RETURNING id",
+                (note_id, owner_id, owner_id),
+            )
             result = cur.fetchone()
             
             if not result:
@@ -434,23 +480,7 @@ class NoteDAO:
             if not row:
                 return None
 
-            rec = _row_to_dict(cur, row)
-
-            # Normalize types
-            rec["quiz_ids"] = _to_list(rec.get("quiz_ids"))
-            rec["flashcard_ids"] = _to_list(rec.get("flashcard_ids"))
-
-            sj = rec.get("summary_json")
-            if isinstance(sj, str):
-                try:
-                    rec["summary_json"] = json.loads(sj)
-                except Exception:
-                    rec["summary_json"] = None
-
-            # Booleans might be ints in some setups
-            rec["is_archived"] = bool(rec.get("is_archived"))
-
-            return rec
+            return _normalize_note_record(_row_to_dict(cur, row))
         finally:
             cur.close()
             conn.close()
@@ -488,22 +518,9 @@ class NoteDAO:
             rows = cur.fetchall() or []
             out: List[Dict[str, Any]] = []
 
-            for r in rows:
-                rec = _row_to_dict(cur, r)
-
-                rec["quiz_ids"] = _to_list(rec.get("quiz_ids"))
-                rec["flashcard_ids"] = _to_list(rec.get("flashcard_ids"))
-
-                sj = rec.get("summary_json")
-                if isinstance(sj, str):
-                    try:
-                        rec["summary_json"] = json.loads(sj)
-                    except Exception:
-                        rec["summary_json"] = None
-
-                rec["is_archived"] = bool(rec.get("is_archived"))
-
-                out.append(rec)
+            with span("note.map_rows", rows=len(rows)):
+                for r in rows:
+                    out.append(_normalize_note_record(_row_to_dict(cur, r)))
 
             return out
         finally:
@@ -525,4 +542,55 @@ class NoteDAO:
             conn.commit()
         finally:
             cur.close()
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+    def get_notes_by_ids(self, note_ids: List[str], owner_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch several notes in one round trip (order not guaranteed), optionally only owner_id's."""
+        if not note_ids:
+            return []
+        conn, cur = get_db_cursor()
+        try:
+            cur.execute(
+                """
+                SELECT
+                    id, owner_id, title, markdown, document_id,
+                    quiz_ids, flashcard_ids, chat_id, is_archived,
+                    created_at, updated_at,
+                    summary_json, summary_updated_at,
+                    font_size, font_family, line_height
+                FROM note
+                WHERE id = ANY(%s::uuid[])
+                  AND (%s::uuid IS NULL OR owner_id = %s::uuid)
+                """,
+                (list(note_ids), owner_id, owner_id),
+            )
+            rows = cur.fetchall() or []
+            return [_normalize_note_record(_row_to_dict(cur, r)) for r in rows]
+        finally:
+            cur.close()
+            conn.close()
+
+    def update_summaries(self, summaries: Dict[str, Dict[str, Any]]) -> None:
+        """Persist several summaries with a single UPDATE ... FROM (VALUES ...)."""
+        if not summaries:
+            return
+        conn, cur = get_db_cursor()
+        try:
+            execute_values(
+                cur,
+                """
+                UPDATE note AS n
+                SET summary_json = v.summary_json::jsonb,
+                    summary_updated_at = NOW()
+                FROM (VALUES %s) AS v(id, summary_json)
+                WHERE n.id = v.id::uuid
+                """,
+                [(note_id, json.dumps(summary)) for note_id, summary in summaries.items()],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
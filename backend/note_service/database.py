@@ -1,7 +1,8 @@
-import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 
+from common.db import connect as instrumented_connect
+
 DATABASE_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
     'port': os.getenv('DB_PORT', 5432),
@@ -11,10 +12,24 @@ DATABASE_CONFIG = {
 }
 
 def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(**DATABASE_CONFIG)
+    """Get database connection (metrics and tracing: see common/db.py)"""
+    return instrumented_connect(**DATABASE_CONFIG)
 
 def get_db_cursor():
     """Get database cursor with dict-like access"""
     conn = get_db_connection()
-    return conn, conn.cursor(cursor_factory=RealDictCursor)
\ No newline at end of file
+    return conn, conn.cursor(cursor_factory=RealDictCursor)
+
+def test_connection() -> bool:
+    """Test database connection"""
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                return cursor.fetchone()[0] == 1
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Database connection test failed: {e}")
+        return False
@@ -1,24 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from note_service.services.note_service import NoteService
 from note_service.services.summarize_service import SummarizeService
-from note_service.models.models import NoteCreate, NoteUpdate, NoteResponse
+from note_service.services.attachments import is_attachment_id
+from note_service.attachment_gc import AttachmentSweeper
+from note_service.AI.gemini_client import LLMUnavailableError
+from note_service.database import test_connection
+from note_service.models.models import NoteCreate, NoteUpdate, NoteResponse, BulkSummarizeRequest
+from common.auth import JWTAuthMiddleware, caller_id, ensure_owner, resolve_owner
+from common.ratelimit import RateLimitMiddleware, RouteLimit
+from common.metrics import MetricsMiddleware, metrics_response
+from common.tracing import TracedJSONResponse, TracingMiddleware, exporter_from_env
+from common.profiling import ProfilingMiddleware
+from common.watchdog import LoopWatchdogMiddleware, loop_watchdog
 
 from typing import List, Optional
-from note_service.services.note_service import NoteService
-from note_service.models.models import NoteCreate, NoteUpdate, NoteResponse
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
-import os
 import argparse
-import json
 
-app = FastAPI(title="Notes Service", version="1.0.0")
+app = FastAPI(title="Notes Service", version="1.0.0", default_response_class=TracedJSONResponse)
 
 note_service = NoteService()
-summarize_service = SummarizeService()  # share DAO
+summarize_service = SummarizeService()  # Gemini client is created on first summarize call
+attachment_sweeper = AttachmentSweeper()
 
 FRONTEND_ORIGIN = "http://localhost:5173"
 
+# Summaries are model calls, far more expensive than CRUD: per-user budget and a cap on in-flight calls
+app.add_middleware(
+    RateLimitMiddleware,
+    limits=[
+        RouteLimit("POST", "/notes/{note_id}/summarize", cost=5, concurrency=8),
+        RouteLimit("PUT", "/notes/{note_id}/summary", cost=5, concurrency=8),
+        RouteLimit("POST", "/notes/summaries", cost=15, concurrency=2),
+    ],
+)
+# Added after the rate limiter (so it runs first, setting the user id) and before CORS
+# (so it runs inside it: preflights and 401/429s still get CORS headers)
+app.add_middleware(JWTAuthMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[FRONTEND_ORIGIN, "http://127.0.0.1:5173", "*"],
@@ -26,6 +46,24 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so latency covers every middleware and rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+# Spans, slow-request log and (with OTEL_EXPORTER_OTLP_ENDPOINT) OTLP export
+trace_exporter = exporter_from_env("note_service")
+app.add_middleware(TracingMiddleware, service_name="note_service", exporter=trace_exporter)
+if trace_exporter:
+    app.add_event_handler("shutdown", trace_exporter.shutdown)
+# Opt-in profiles of single requests (X-Profile: $PROFILE_TOKEN, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware, service_name="note_service")
+# Warns (slowlog + event_loop_blocked_total) when a handler blocks the event loop
+app.add_middleware(LoopWatchdogMiddleware)
+
+# The watchdog's heartbeat also records event_loop_lag_seconds
+app.add_event_handler("startup", loop_watchdog.start)
+app.add_event_handler("shutdown", loop_watchdog.stop)
+# Deletes attachments no note links to any more (ATTACHMENT_GC_INTERVAL)
+app.add_event_handler("startup", attachment_sweeper.start)
+app.add_event_handler("shutdown", attachment_sweeper.stop)
 
 # --------------------------------------------------------------------
 # Basic health endpoints
@@ -39,62 +77,113 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format: request latency, DAO timings, connections, event loop lag"""
+    return metrics_response()
+
+@app.get("/ready")
+def readiness_check():
+    """
+    CRUD readiness (database reachable) and LLM readiness (summarization can run)
+    are reported separately; only CRUD readiness gates the status code.
+    """
+    crud_ready = test_connection()
+    body = {
+        "status": "ready" if crud_ready else "not_ready",
+        "crud": crud_ready,
+        "llm": summarize_service.llm_ready(),
+        "llm_initialized": summarize_service.llm_initialized,
+    }
+    return JSONResponse(body, status_code=200 if crud_ready else 503)
+
+@app.exception_handler(LLMUnavailableError)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailableError):
+    return JSONResponse({"detail": f"Summarization unavailable: {exc}"}, status_code=503)
+
 # --------------------------------------------------------------------
 # CRUD for notes
 # --------------------------------------------------------------------
 
+# CRUD handlers are plain functions: they run on the threadpool, since attachment
+# extraction (base64 decoding, hashing) and the DAO calls would block the event loop
+
 @app.post("/notes", response_model=NoteResponse)
-async def create_note(request: Request):
-    """Create a new note"""
+def create_note(request: Request, note_data: dict = Body(...)):
+    """Create a new note; signed-in callers create it as themselves"""
+    note_data["owner_id"] = resolve_owner(request, note_data.get("owner_id"))
     try:
-        body = await request.body()
-        note_data = json.loads(body)
         note = NoteCreate(**note_data)
         return note_service.create_note(note)
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
 @app.get("/notes", response_model=List[NoteResponse])
-async def get_notes(owner_id: Optional[str] = None, is_archived: Optional[bool] = None):
-    """Get notes with optional filtering"""
+def get_notes(request: Request, owner_id: Optional[str] = None, is_archived: Optional[bool] = None):
+    """Get notes with optional filtering; signed-in callers only see their own"""
+    owner_id = resolve_owner(request, owner_id)
     return note_service.get_notes(owner_id=owner_id, is_archived=is_archived)
 
+@app.get("/notes/attachments/{sha256}")
+def get_attachment(sha256: str, request: Request):
+    """
+    Serve an image extracted from a note; content-addressed, so cacheable forever.
+    Signed-in callers only get attachments one of their own notes links to.
+    """
+    etag = f'"{sha256}"'
+    headers = {
+        # private: the response depends on the caller, so shared caches must not keep it
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "ETag": etag,
+        "X-Content-Type-Options": "nosniff",
+    }
+    if not is_attachment_id(sha256):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    attachment = note_service.get_attachment(sha256, owner_id=caller_id(request))
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=attachment["data"], media_type=attachment["content_type"], headers=headers)
+
 @app.get("/notes/{note_id}", response_model=NoteResponse)
-async def get_note(note_id: str):
-    """Get a specific note by ID"""
+def get_note(note_id: str, request: Request):
+    """Get a specific note by ID; signed-in callers only get their own"""
     note = note_service.get_note(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    ensure_owner(request, note.owner_id, "Note not found")
     return note
 
 @app.put("/notes/{note_id}", response_model=NoteResponse)
-async def update_note(note_id: str, note_update: NoteUpdate):
-    """Update a note"""
-    return note_service.update_note(note_id, note_update)
+def update_note(note_id: str, note_update: NoteUpdate, request: Request):
+    """Update a note; signed-in callers can only update their own"""
+    return note_service.update_note(note_id, note_update, owner_id=caller_id(request))
 
 @app.delete("/notes/{note_id}")
-async def delete_note(note_id: str):
-    """Delete a note"""
-    return note_service.delete_note(note_id)
+def delete_note(note_id: str, request: Request):
+    """Delete a note; signed-in callers can only delete their own"""
+    return note_service.delete_note(note_id, owner_id=caller_id(request))
 
 # --------------------------------------------------------------------
 # Summarization endpoints
 # --------------------------------------------------------------------
 
 @app.post("/notes/{note_id}/summarize")
-def summarize_note_endpoint(note_id: str):
+def summarize_note_endpoint(note_id: str, request: Request):
     """
     Return a structured summary (JSON only, not persisted).
     """
     note = note_service.get_note(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    ensure_owner(request, note.owner_id, "Note not found")
     summary = summarize_service.summarize_note(note)
     return summary
 
 
 @app.put("/notes/{note_id}/summary")
-def summarize_and_persist(note_id: str):
+def summarize_and_persist(note_id: str, request: Request):
     """
     Compute a Gemini summary and persist it to summary_json + summary_updated_at.
     Matches the frontend PUT /notes/{id}/summary call.
@@ -102,18 +191,35 @@ def summarize_and_persist(note_id: str):
     note = note_service.get_note(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    ensure_owner(request, note.owner_id, "Note not found")
     summary = summarize_service.summarize_and_persist(note_id)
     return {"note_id": note_id, "summary": summary}
 
 
+@app.post("/notes/summaries")
+def summarize_and_persist_bulk(payload: BulkSummarizeRequest, request: Request):
+    """
+    Summarize and persist many notes at once (e.g. an imported lecture set).
+    Small notes are packed into shared model calls. Signed-in callers can only
+    summarize their own notes; other ids are reported as missing.
+    """
+    note_ids = list(dict.fromkeys(str(note_id) for note_id in payload.note_ids))
+    summaries = summarize_service.summarize_and_persist_many(note_ids, owner_id=caller_id(request))
+    return {
+        "summaries": [{"note_id": note_id, "summary": summary} for note_id, summary in summaries.items()],
+        "missing": [note_id for note_id in note_ids if note_id not in summaries],
+    }
+
+
 @app.get("/notes/{note_id}/summary")
-def get_persisted_summary(note_id: str):
+def get_persisted_summary(note_id: str, request: Request):
     """
     Retrieve the stored summary (without recomputing).
     """
     note = note_service.get_note(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    ensure_owner(request, note.owner_id, "Note not found")
     return {
         "note_id": note_id,
         "summary": note.summary_json,
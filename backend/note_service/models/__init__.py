@@ -1,3 +1,3 @@
-from .models import NoteCreate, NoteUpdate, NoteResponse
+from .models import NoteCreate, NoteUpdate, NoteResponse, BulkSummarizeRequest
 
-__all__ = ["NoteCreate", "NoteUpdate", "NoteResponse"]
\ No newline at end of file
+__all__ = ["NoteCreate", "NoteUpdate", "NoteResponse", "BulkSummarizeRequest"]
\ No newline at end of file
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
+import os
 import uuid
 
 class NoteBase(BaseModel):
@@ -46,4 +47,10 @@ class NoteResponse(BaseModel):
     summary_updated_at: Optional[datetime] = None
     font_size: Optional[str] = None
     font_family: Optional[str] = None
-    line_height: Optional[str] = None
\ No newline at end of file
+    line_height: Optional[str] = None
+
+# Bounds the model calls one bulk request can make (it is rate limited at a flat cost)
+MAX_BULK_SUMMARIZE_NOTES = int(os.getenv("MAX_BULK_SUMMARIZE_NOTES", "50"))
+
+class BulkSummarizeRequest(BaseModel):
+    note_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=MAX_BULK_SUMMARIZE_NOTES)
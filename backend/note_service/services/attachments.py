@@ -0,0 +1,72 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+
+ATTACHMENT_URL_PREFIX = "/notes/attachments/"
+MAX_ATTACHMENT_BYTES = int(os.getenv("MAX_ATTACHMENT_BYTES", str(5 * 1024 * 1024)))  # 5MB per image
+
+# Raster image types only: SVG can carry script, so it stays inline
+_IMAGE_TYPES = {
+    "image/png": "image/png",
+    "image/jpeg": "image/jpeg",
+    "image/jpg": "image/jpeg",
+    "image/gif": "image/gif",
+    "image/webp": "image/webp",
+    "image/avif": "image/avif",
+}
+
+# The data URI alone, so it is replaced both in ![alt](...) and in <img src="...">
+_DATA_URI = re.compile(
+    r"data:(image/[a-z+.-]+);base64,([A-Za-z0-9+/]+={0,2})",
+    re.IGNORECASE,
+)
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_ATTACHMENT_REF = re.compile(re.escape(ATTACHMENT_URL_PREFIX) + r"([0-9a-f]{64})")
+
+
+def is_attachment_id(value: str) -> bool:
+    return bool(_SHA256.match(value))
+
+
+def attachment_refs(markdown: str) -> List[str]:
+    """Distinct attachment hashes a note's markdown links to."""
+    return sorted(set(_ATTACHMENT_REF.findall(markdown)))
+
+
+def extract_inline_images(markdown: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace base64 image data URIs in markdown with /notes/attachments/<sha256>
+    references. Returns the rewritten markdown and the attachments to store
+    ({sha256, content_type, data}), one per distinct image.
+    """
+    if "data:" not in markdown:
+        return markdown, []
+
+    attachments: Dict[str, Dict[str, Any]] = {}
+
+    def replace(match: "re.Match[str]") -> str:
+        content_type = _IMAGE_TYPES.get(match.group(1).lower())
+        if content_type is None:
+            return match.group(0)
+        encoded = match.group(2)
+        # Decoded size is known up front; reject before decoding
+        if len(encoded) // 4 * 3 > MAX_ATTACHMENT_BYTES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Image too large. Maximum size is {MAX_ATTACHMENT_BYTES} bytes",
+            )
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            return match.group(0)
+        sha256 = hashlib.sha256(data).hexdigest()
+        attachments.setdefault(sha256, {"sha256": sha256, "content_type": content_type, "data": data})
+        return ATTACHMENT_URL_PREFIX + sha256
+
+    rewritten = _DATA_URI.sub(replace, markdown)
+    return rewritten, list(attachments.values())
@@ -1,13 +1,26 @@
 from typing import List, Optional
 from note_service.daos.note_dao import NoteDAO
+from note_service.daos.attachment_dao import AttachmentDAO
+from note_service.services.attachments import attachment_refs, extract_inline_images
 from note_service.models.models import NoteCreate, NoteUpdate, NoteResponse
 from fastapi import HTTPException
+from common.tracing import span
 
 class NoteService:
     """Service layer for note business logic"""
     
     def __init__(self):
         self.dao = NoteDAO()
+        self.attachments = AttachmentDAO()
+    
+    def _extract_attachments(self, markdown: str) -> str:
+        """Move inline base64 images into the attachment store; returns the rewritten markdown"""
+        markdown, attachments = extract_inline_images(markdown)
+        self.attachments.save_many(attachments)
+        return markdown
+    
+    def get_attachment(self, sha256: str, owner_id: Optional[str] = None) -> Optional[dict]:
+        return self.attachments.get(sha256, owner_id)
     
     def create_note(self, note: NoteCreate) -> NoteResponse:
         """Create a new note with business logic validation"""
@@ -16,6 +29,9 @@ class NoteService:
             if not note.title.strip():
                 note.title = "Untitled Note"
             
+            # Pasted images would otherwise bloat every read/save of the note (and count against the limit)
+            note.markdown = self._extract_attachments(note.markdown)
+            
             if len(note.markdown) > 100000:  # 100KB limit
                 raise HTTPException(status_code=400, detail="Note content too large")
             
@@ -29,7 +45,7 @@ class NoteService:
             # if note.chat_id:
             #     self._validate_uuid(note.chat_id, "chat_id")
             
-            return self.dao.create(note)
+            return self.dao.create(note, attachment_refs(note.markdown))
         except Exception as e:
             if isinstance(e, HTTPException):
                 raise e
@@ -43,15 +59,19 @@ class NoteService:
 
     def get_notes(self, owner_id: str | None = None, is_archived: bool | None = None) -> list[NoteResponse]:
         rows = self.dao.get_notes(owner_id=owner_id, is_archived=is_archived)
-        return [NoteResponse(**row) for row in rows]
+        with span("note.validate", rows=len(rows)):
+            return [NoteResponse(**row) for row in rows]
     
-    def update_note(self, note_id: str, note_update: NoteUpdate) -> NoteResponse:
-        """Update a note with business logic validation"""
+    def update_note(self, note_id: str, note_update: NoteUpdate, owner_id: Optional[str] = None) -> NoteResponse:
+        """Update a note with business logic validation (with owner_id, only that user's note)"""
         try:
             # Add any business logic here
             if note_update.title is not None and not note_update.title.strip():
                 note_update.title = "Untitled Note"
             
+            if note_update.markdown is not None:
+                note_update.markdown = self._extract_attachments(note_update.markdown)
+            
             if note_update.markdown is not None and len(note_update.markdown) > 100000:
                 raise HTTPException(status_code=400, detail="Note content too large")
             
@@ -65,7 +85,8 @@ class NoteService:
             # if note_update.chat_id is not None:
             #     self._validate_uuid(note_update.chat_id, "chat_id")
             
-            updated_note = self.dao.update(note_id, note_update)
+            refs = attachment_refs(note_update.markdown) if note_update.markdown is not None else None
+            updated_note = self.dao.update(note_id, note_update, refs, owner_id=owner_id)
             if not updated_note:
                 raise HTTPException(status_code=404, detail="Note not found")
             return updated_note
@@ -74,10 +95,10 @@ class NoteService:
         except Exception as e:
             raise HTTPException(status_code=400, detail=str(e))
     
-    def delete_note(self, note_id: str) -> dict:
-        """Delete a note"""
+    def delete_note(self, note_id: str, owner_id: Optional[str] = None) -> dict:
+        """Delete a note (with owner_id, only that user's note)"""
         try:
-            success = self.dao.delete(note_id)
+            success = self.dao.delete(note_id, owner_id=owner_id)
             if not success:
                 raise HTTPException(status_code=404, detail="Note not found")
             return {"message": "Note deleted successfully"}
@@ -1,10 +1,15 @@
-from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
 
-from note_service.AI.gemini_client import GeminiClient
+from note_service.AI.gemini_client import GeminiClient, LLMUnavailableError, llm_configured
 from note_service.daos.note_dao import NoteDAO
 from note_service.services.typing_helpers import SummaryDict
 from note_service.models.models import NoteResponse
 
+logger = logging.getLogger(__name__)
+
 
 _JSON_SCHEMA_HINT: Dict[str, Any] = {
     "type": "object",
@@ -36,12 +41,146 @@ _JSON_SCHEMA_HINT: Dict[str, Any] = {
     "additionalProperties": False
 }
 
+# Micro-batching of small notes (see SummaryBatcher). A window of 0 disables the
+# windowed batcher; summarize_notes() still packs bulk jobs into shared prompts.
+SUMMARY_BATCH_WINDOW_MS = int(os.getenv("SUMMARY_BATCH_WINDOW_MS", "0"))
+SUMMARY_BATCH_MAX_NOTES = int(os.getenv("SUMMARY_BATCH_MAX_NOTES", "8"))
+SUMMARY_BATCH_MAX_CHARS = int(os.getenv("SUMMARY_BATCH_MAX_CHARS", "12000"))
+SUMMARY_SMALL_NOTE_CHARS = int(os.getenv("SUMMARY_SMALL_NOTE_CHARS", "2000"))
+
 
 class SummarizeService:
-    def __init__(self, gemini: Optional[GeminiClient] = None):
-        self.gemini = gemini or GeminiClient(model="gemini-2.5-flash")
+    def __init__(self, gemini: Optional[GeminiClient] = None, batch_window_ms: Optional[int] = None):
+        # The Gemini client (and its SDK import) is built on first use so that
+        # service startup and CRUD traffic never depend on the LLM stack.
+        self._gemini = gemini
+        self._gemini_lock = threading.Lock()
+
+        window_ms = SUMMARY_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms
+        self.batcher = None
+        if window_ms > 0:
+            from note_service.services.summary_batcher import SummaryBatcher
+            self.batcher = SummaryBatcher(
+                self.summarize_notes,
+                window_s=window_ms / 1000.0,
+                max_notes=SUMMARY_BATCH_MAX_NOTES,
+            )
+
+    @property
+    def gemini(self) -> GeminiClient:
+        if self._gemini is None:
+            with self._gemini_lock:
+                if self._gemini is None:
+                    self._gemini = GeminiClient(model="gemini-2.5-flash")
+        return self._gemini
+
+    @property
+    def llm_initialized(self) -> bool:
+        return self._gemini is not None
+
+    def llm_ready(self) -> bool:
+        """True if summarization can run (client built, or key and SDK available)."""
+        return self.llm_initialized or llm_configured()
 
     def summarize_note(self, note: NoteResponse) -> SummaryDict:
+        """
+        Summarize a single note. Small notes go through the batcher when it is
+        enabled so concurrent requests share one model call.
+        """
+        if self.batcher is not None and _is_small(note):
+            return self.batcher.submit(note)
+        return self._summarize_single(note)
+
+    def summarize_notes(self, notes: List[NoteResponse]) -> Dict[str, SummaryDict]:
+        """
+        Summarize many notes, keyed by note id. Small notes are packed into shared
+        prompts (bounded by SUMMARY_BATCH_MAX_NOTES / SUMMARY_BATCH_MAX_CHARS);
+        large notes and malformed batch entries fall back to one call per note.
+        """
+        results: Dict[str, SummaryDict] = {}
+        batch: List[NoteResponse] = []
+        batch_chars = 0
+
+        for note in notes:
+            if note.id in results:
+                continue
+            if not _is_small(note):
+                results[note.id] = self._summarize_single(note)
+                continue
+
+            size = _note_chars(note)
+            if batch and (len(batch) >= SUMMARY_BATCH_MAX_NOTES or batch_chars + size > SUMMARY_BATCH_MAX_CHARS):
+                results.update(self._summarize_batch(batch))
+                batch, batch_chars = [], 0
+            batch.append(note)
+            batch_chars += size
+
+        if batch:
+            results.update(self._summarize_batch(batch))
+        return results
+
+    def _summarize_batch(self, notes: List[NoteResponse]) -> Dict[str, SummaryDict]:
+        """One model call for several small notes; retries malformed entries one by one."""
+        # Deduplicate by id (the batcher may receive the same note twice in one window)
+        unique: Dict[str, NoteResponse] = {}
+        for note in notes:
+            unique.setdefault(note.id, note)
+        notes = list(unique.values())
+
+        if len(notes) == 1:
+            return {notes[0].id: self._summarize_single(notes[0])}
+
+        # Short positional keys keep the response small and avoid echoing UUIDs back
+        keyed = {f"n{i + 1}": note for i, note in enumerate(notes)}
+        sections = []
+        for key, note in keyed.items():
+            sections.append(
+                f"<<<NOTE {key}>>>\n"
+                f"Title hint: {(note.title or '').strip()!r}\n"
+                f"{(note.markdown or '').strip()}\n"
+                f"<<<END NOTE {key}>>>"
+            )
+
+        prompt = f"""
+            You will receive {len(keyed)} separate notes (Markdown), each wrapped in
+            <<<NOTE key>>> ... <<<END NOTE key>>> delimiters. Summarize each note independently.
+
+            Return ONE JSON object whose keys are exactly the note keys ({", ".join(keyed)}).
+            Each value must be a structured summary object with keys:
+            - "title" (string)
+            - "tldr" (string, <= 3 sentences)
+            - "key_points" (array of strings, 3-7 bullets, concise)
+            - "action_items" (array of strings)
+            - "questions" (array of strings)
+            - "keywords" (array of strings, 5-12 items)
+
+            IMPORTANT:
+            - Output MUST be valid JSON and contain only the JSON object—no additional text.
+            - Never mix content between notes.
+            - If a note is empty, return neutral placeholders for it.
+
+            {chr(10).join(sections)}
+        """
+
+        try:
+            data = self.gemini.generate_json_object(prompt, temperature=0.2)
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            # A failed batch call falls back to one call per note, like malformed entries
+            logger.warning("Batch summary of %d notes failed, summarizing one by one: %s", len(keyed), e)
+            data = {}
+
+        results: Dict[str, SummaryDict] = {}
+        for key, note in keyed.items():
+            entry = data.get(key)
+            if _is_valid_entry(entry):
+                results[note.id] = _normalize_summary_dict(entry)
+            else:
+                results[note.id] = self._summarize_single(note)
+        return results
+
+    def _summarize_single(self, note: NoteResponse) -> SummaryDict:
         title_hint = (note.title or "").strip()
         body = (note.markdown or "").strip()
         prompt = f"""
@@ -114,6 +253,37 @@ class SummarizeService:
 
         return summary
 
+    def summarize_and_persist_many(self, note_ids: List[str], owner_id: Optional[str] = None) -> Dict[str, SummaryDict]:
+        """
+        Bulk variant of summarize_and_persist: one fetch, batched model calls,
+        one write. Unknown ids (and, with owner_id, other users' notes) are skipped.
+        """
+        dao = NoteDAO()
+        notes = [NoteResponse(**row) for row in dao.get_notes_by_ids(note_ids, owner_id=owner_id)]
+        summaries = self.summarize_notes(notes)
+        if summaries:
+            dao.update_summaries(summaries)
+        return summaries
+
+
+def _note_chars(note: NoteResponse) -> int:
+    return len(note.markdown or "") + len(note.title or "")
+
+
+def _is_small(note: NoteResponse) -> bool:
+    return _note_chars(note) <= SUMMARY_SMALL_NOTE_CHARS
+
+
+def _is_valid_entry(entry: Any) -> bool:
+    """A batch entry is usable if it is an object with the required keys in the right shape."""
+    if not isinstance(entry, dict):
+        return False
+    return (
+        isinstance(entry.get("title"), str)
+        and isinstance(entry.get("tldr"), str)
+        and isinstance(entry.get("key_points"), list)
+    )
+
 
 def _normalize_summary_dict(d: Dict[str, Any]) -> SummaryDict:
     title = d.get("title") or ""
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from note_service.models.models import NoteResponse
+from note_service.services.typing_helpers import SummaryDict
+
+
+class SummaryBatcher:
+    """
+    Collects summarize requests for small notes over a short window and flushes
+    them as one bulk call.
+
+    Summarize endpoints are sync handlers running in the threadpool, so callers
+    simply block on a Future until their batch is flushed. The first request of a
+    window arms a timer; the batch is flushed when the timer fires or as soon as
+    max_notes requests are pending, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        summarize_many: Callable[[List[NoteResponse]], Dict[str, SummaryDict]],
+        window_s: float = 0.05,
+        max_notes: int = 8,
+    ):
+        self._summarize_many = summarize_many
+        self._window_s = window_s
+        self._max_notes = max(1, max_notes)
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[NoteResponse, Future]] = []
+        self._timer: threading.Timer | None = None
+
+    def submit(self, note: NoteResponse) -> SummaryDict:
+        fut: Future = Future()
+        flush_now = None
+        with self._lock:
+            self._pending.append((note, fut))
+            if len(self._pending) >= self._max_notes:
+                flush_now = self._take_pending()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._window_s, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if flush_now:
+            # The request that fills the batch pays for the call on its own thread
+            self._run(flush_now)
+        return fut.result()
+
+    # ---- internal ----
+    def _take_pending(self) -> List[Tuple[NoteResponse, Future]]:
+        """Must be called with the lock held."""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush_from_timer(self) -> None:
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch: List[Tuple[NoteResponse, Future]]) -> None:
+        try:
+            results = self._summarize_many([note for note, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        for note, fut in batch:
+            summary = results.get(note.id)
+            if summary is None:
+                fut.set_exception(RuntimeError(f"No summary produced for note {note.id}"))
+            else:
+                fut.set_result(summary)
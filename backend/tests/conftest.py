@@ -0,0 +1,3 @@
+# Every test run loads the event loop watchdog plugin; it fails blocking tests once
+# --loop-block-ms (or LOOP_BLOCK_FAIL_MS) is set
+pytest_plugins = ["common.pytest_watchdog"]
@@ -0,0 +1,11 @@
+import pytest
+
+from benchmarks import import_budget
+
+
+@pytest.mark.parametrize("module", sorted(import_budget.DEFAULT_CHECKS))
+def test_import_budget(module):
+    # Best of three, like benchmarks/import_budget.py
+    ms, leaked = min(import_budget.measure(module, import_budget.DEFAULT_CHECKS[module]) for _ in range(3))
+    assert not leaked, f"{module} eagerly imports {', '.join(leaked)}"
+    assert ms <= import_budget.IMPORT_BUDGET_MS, f"{module} takes {ms:.0f} ms to import"
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BLOCKING_TESTS = '''
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common.watchdog import LoopWatchdogMiddleware
+
+app = FastAPI()
+app.add_middleware(LoopWatchdogMiddleware)
+
+
+@app.get("/block")
+async def block():
+    time.sleep(0.3)
+    return {}
+
+
+@app.get("/ok")
+async def ok():
+    return {}
+
+
+def test_blocking():
+    assert TestClient(app).get("/block").status_code == 200
+
+
+def test_not_blocking():
+    with TestClient(app) as client:
+        assert client.get("/ok").status_code == 200
+'''
+
+
+def test_plugin_is_loaded(pytestconfig):
+    assert pytestconfig.pluginmanager.has_plugin("common.pytest_watchdog")
+
+
+def test_blocking_request_fails_its_test(tmp_path):
+    (tmp_path / "test_blocking.py").write_text(BLOCKING_TESTS)
+    env = os.environ.copy()
+    env["PYTHONPATH"] = f"{BACKEND_DIR}{os.pathsep}{env.get('PYTHONPATH', '')}"
+    proc = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+         "-p", "common.pytest_watchdog", "--loop-block-ms", "50", str(tmp_path)],
+        cwd=str(tmp_path),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 1, proc.stdout + proc.stderr
+    # A failure of the blocking test itself (not an error), naming the route
+    assert "1 failed, 1 passed" in proc.stdout, proc.stdout
+    assert "FAILED test_blocking.py::test_blocking" in proc.stdout
+    assert "/block" in proc.stdout
@@ -0,0 +1,16 @@
+-- Migration: Content-Addressed Blob Storage
+
+-- One row per distinct file content, keyed by SHA-256.
+-- Documents with identical bytes share a blob; the file is removed when ref_count reaches 0.
+CREATE TABLE IF NOT EXISTS blob (
+    sha256         TEXT PRIMARY KEY,
+    file_path      TEXT NOT NULL,
+    size           BIGINT NOT NULL,
+    ref_count      INTEGER NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Documents point at their blob. NULL until backfilled by scripts/backfill_blob_hashes.py
+ALTER TABLE document ADD COLUMN IF NOT EXISTS blob_sha256 TEXT REFERENCES blob(sha256);
+
+CREATE INDEX IF NOT EXISTS idx_document_blob_sha256 ON document(blob_sha256);
@@ -0,0 +1,17 @@
+-- Migration: Per-Page Extracted Text for Documents
+
+-- Text extraction runs in the background after upload
+-- status: pending | processing | done | failed | unsupported
+ALTER TABLE document ADD COLUMN IF NOT EXISTS extraction_status TEXT NOT NULL DEFAULT 'pending';
+ALTER TABLE document ADD COLUMN IF NOT EXISTS page_count INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_document_extraction_pending
+    ON document(created_at) WHERE extraction_status IN ('pending', 'processing');
+
+-- One row per page of extracted text (1-based page numbers)
+CREATE TABLE IF NOT EXISTS document_page (
+    document_id    UUID NOT NULL REFERENCES document(id) ON DELETE CASCADE,
+    page_number    INTEGER NOT NULL,
+    text           TEXT NOT NULL,
+    PRIMARY KEY (document_id, page_number)
+);
@@ -0,0 +1,8 @@
+-- Migration: Keyset Pagination Index for Document Listing
+
+-- GET /documents pages through a user's documents ordered by (created_at, id), newest first
+CREATE INDEX IF NOT EXISTS idx_document_owner_created_id
+    ON document(owner_id, created_at DESC, id DESC);
+
+-- Covered by the composite index above (owner_id is its leading column)
+DROP INDEX IF EXISTS idx_document_owner_id;
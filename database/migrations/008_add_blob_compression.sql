@@ -0,0 +1,12 @@
+-- Migration: Compression at Rest and Cold Tier for Blobs
+
+-- encoding: NULL = stored as uploaded, not evaluated yet
+--           'identity' = evaluated, not worth compressing
+--           'gzip' = stored gzip-compressed (blob.size stays the original size)
+ALTER TABLE blob ADD COLUMN IF NOT EXISTS encoding TEXT;
+ALTER TABLE blob ADD COLUMN IF NOT EXISTS stored_size BIGINT;
+-- Updated in batches by the document service when a blob is viewed/downloaded
+ALTER TABLE blob ADD COLUMN IF NOT EXISTS last_accessed_at TIMESTAMPTZ;
+
+-- Candidates for the cold tier sweeper
+CREATE INDEX IF NOT EXISTS idx_blob_uncompressed ON blob(sha256) WHERE encoding IS NULL;
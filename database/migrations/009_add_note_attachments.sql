@@ -0,0 +1,11 @@
+-- Migration: Content-Addressed Attachments for Notes
+
+-- Images pasted into notes as data URIs are stored here once per distinct content
+-- and referenced from note.markdown as /notes/attachments/<sha256>
+CREATE TABLE IF NOT EXISTS note_attachment (
+    sha256         TEXT PRIMARY KEY,
+    content_type   TEXT NOT NULL,
+    size           INTEGER NOT NULL,
+    data           BYTEA NOT NULL,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
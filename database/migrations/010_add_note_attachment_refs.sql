@@ -0,0 +1,20 @@
+-- Migration: Reference Tracking for Note Attachments
+
+-- Which notes link to which attachment, rewritten with every save of the note's
+-- markdown; attachments no note references are deleted by the note service's sweeper
+CREATE TABLE IF NOT EXISTS note_attachment_ref (
+    note_id        UUID NOT NULL REFERENCES note(id) ON DELETE CASCADE,
+    sha256         TEXT NOT NULL,
+    PRIMARY KEY (note_id, sha256)
+);
+CREATE INDEX IF NOT EXISTS idx_note_attachment_ref_sha256 ON note_attachment_ref(sha256);
+
+-- Bumped whenever a note save hands the attachment in again, so the sweeper's grace
+-- period also covers a re-pasted image whose note row isn't committed yet
+ALTER TABLE note_attachment ADD COLUMN IF NOT EXISTS saved_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- References from notes saved before this migration
+INSERT INTO note_attachment_ref (note_id, sha256)
+SELECT DISTINCT n.id, m[1]
+FROM note n, regexp_matches(n.markdown, '/notes/attachments/([0-9a-f]{64})', 'g') AS m
+ON CONFLICT DO NOTHING;
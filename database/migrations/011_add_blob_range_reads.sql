@@ -0,0 +1,5 @@
+-- Migration: Range Reads for the Cold Tier
+
+-- Updated in batches with last_accessed_at when a view/download carries a Range header;
+-- the cold tier sweeper leaves blobs of COLD_TIER_SKIP_TYPES uncompressed while this is recent
+ALTER TABLE blob ADD COLUMN IF NOT EXISTS last_range_read_at TIMESTAMPTZ;
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Backfill content hashes for documents uploaded before content-addressed storage
+(migration 005_add_blob_table.sql).
+
+For every document without a blob_sha256, the file is hashed, linked (or
+copied) into the local blob store as <uploads-dir>/ab/cd/<sha256> unless an
+identical blob already exists, and the document is pointed at the blob. Each
+document is committed on its own, and its original file is removed only after
+the commit, so the script is safe to interrupt and re-run.
+
+Usage:
+    python scripts/backfill_blob_hashes.py --uploads-dir ../backend/uploads [--dry-run]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+
+import psycopg2
+
+DATABASE_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', 5432),
+    'database': os.getenv('DB_NAME', 'app_db'),
+    'user': os.getenv('DB_USER', 'app_user'),
+    'password': os.getenv('DB_PASSWORD', 'app_pass')
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resolve(file_path, base_dir, uploads_dir=None):
+    """
+    Local path of a stored file_path: "local:<key>" is relative to the uploads
+    directory, plain paths to the document service's working directory. Returns
+    None for other storage backends (e.g. "s3:<key>").
+    """
+    scheme, sep, key = file_path.partition(':')
+    if sep and scheme == 'local':
+        return os.path.join(uploads_dir, key)
+    if sep and scheme == 's3':
+        return None
+    if os.path.isabs(file_path):
+        return file_path
+    return os.path.join(base_dir, file_path)
+
+
+def blob_key(sha256):
+    """Same layout as document_service.storage.blob_key."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def link_or_copy(source, target):
+    """Put source's content at target (hard link if possible), never leaving a partial target."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    tmp = f"{target}.{os.getpid()}.part"
+    try:
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        remove_quietly(tmp)
+        raise
+
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        print(f"⚠️  could not remove {path}: {e}")
+
+
+def backfill(uploads_dir, base_dir, dry_run=False):
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    stats = {'hashed': 0, 'deduplicated': 0, 'missing': 0}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, file_path FROM document WHERE blob_sha256 IS NULL ORDER BY created_at")
+            pending = cur.fetchall()
+
+        print(f"Found {len(pending)} documents without a content hash")
+
+        for document_id, file_path in pending:
+            source = resolve(file_path, base_dir)
+            if not os.path.exists(source):
+                print(f"⚠️  {document_id}: file missing ({file_path}), skipping")
+                stats['missing'] += 1
+                continue
+
+            sha256 = sha256_of(source)
+            size = os.path.getsize(source)
+            stored_path = f"local:{blob_key(sha256)}"
+
+            if dry_run:
+                print(f"{document_id}: {sha256}")
+                stats['hashed'] += 1
+                continue
+
+            created = None
+            with conn.cursor() as cur:
+                try:
+                    cur.execute("""
+                        INSERT INTO blob (sha256, file_path, size, ref_count)
+                        VALUES (%s, %s, %s, 1)
+                        ON CONFLICT (sha256) DO UPDATE SET ref_count = blob.ref_count + 1
+                        RETURNING file_path
+                    """, (sha256, stored_path, size))
+                    blob_file_path = cur.fetchone()[0]
+                    blob_target = resolve(blob_file_path, base_dir, uploads_dir)
+
+                    same_file = blob_target is not None and os.path.abspath(blob_target) == os.path.abspath(source)
+                    deduplicated = blob_target is None or os.path.exists(blob_target)
+                    if not deduplicated:
+                        # Link (or copy) rather than move: the source goes only once the row is committed
+                        link_or_copy(source, blob_target)
+                        created = blob_target
+
+                    cur.execute(
+                        "UPDATE document SET blob_sha256 = %s, file_path = %s WHERE id = %s",
+                        (sha256, blob_file_path, document_id),
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    if created is not None:
+                        remove_quietly(created)
+                    print(f"❌ {document_id}: {e}")
+                    continue
+
+            if not same_file:
+                remove_quietly(source)
+            stats['hashed'] += 1
+            if deduplicated:
+                stats['deduplicated'] += 1
+
+        print(f"✅ Hashed {stats['hashed']} documents "
+              f"({stats['deduplicated']} deduplicated, {stats['missing']} missing files)")
+    finally:
+        conn.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill blob hashes for existing documents")
+    parser.add_argument("--uploads-dir", required=True, help="The document service's uploads directory")
+    parser.add_argument("--base-dir", default=None,
+                        help="Directory relative file_path values are resolved from "
+                             "(default: parent of --uploads-dir)")
+    parser.add_argument("--dry-run", action="store_true", help="Only hash and report, change nothing")
+    args = parser.parse_args()
+
+    uploads_dir = os.path.abspath(args.uploads_dir)
+    base_dir = os.path.abspath(args.base_dir or os.path.dirname(uploads_dir))
+    if not os.path.isdir(uploads_dir):
+        print(f"Uploads directory not found: {uploads_dir}")
+        sys.exit(1)
+
+    backfill(uploads_dir, base_dir, dry_run=args.dry_run)
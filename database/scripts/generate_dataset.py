@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Generate a large synthetic dataset for scale testing (indexes, pagination, load tests).
+
+Creates --users students with a skewed number of notes and documents each (a few
+heavy users, a long tail of light ones):
+
+  - notes: Markdown with log-normal sizes (median ~1.5 KB, capped at 64 KB), some
+    linked to one of the owner's documents, quiz/flashcard id arrays, about 40%
+    with a summary, about 10% archived
+  - documents: PDFs, text and Markdown files pointing at a pool of --blobs shared
+    blobs (so ref counts and deduplication look real), with extracted page text
+  - blob files: written to --uploads-dir in the document service's local layout
+    (<sha256[:2]>/<sha256[2:4]>/<sha256>) if given. Without it, rows only (downloads 404)
+
+Rows are streamed into COPY, in one transaction, followed by ANALYZE. The same --seed
+and --as-of give the same data. Generated users have @dataset.example emails and
+the password "password". --reset removes an earlier run's users (with their notes,
+documents and pages) and the blobs only they used.
+
+Usage:
+    python scripts/generate_dataset.py --users 1000 --notes 100000 --documents 20000
+    python scripts/generate_dataset.py --reset --users 10000 --notes 2000000 --uploads-dir ../backend/uploads
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+
+DATABASE_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': os.getenv('DB_PORT', 5432),
+    'database': os.getenv('DB_NAME', 'app_db'),
+    'user': os.getenv('DB_USER', 'app_user'),
+    'password': os.getenv('DB_PASSWORD', 'app_pass')
+}
+
+EMAIL_DOMAIN = 'dataset.example'
+PASSWORD = 'password'
+MAX_MARKDOWN_CHARS = 64 * 1024
+
+WORDS = (
+    "entropy gradient lecture theorem proof vector matrix enzyme protein cell market equilibrium "
+    "algorithm complexity graph recursion essay thesis citation experiment hypothesis variable "
+    "integral derivative momentum energy photosynthesis mitochondria revolution treaty empire "
+    "supply demand inflation neuron synapse genome mutation velocity acceleration circuit voltage "
+    "sonnet metaphor narrative archive source primary secondary survey sample regression variance"
+).split()
+
+# (content type, extension, share of documents)
+DOCUMENT_TYPES = [
+    ('application/pdf', '.pdf', 0.75),
+    ('text/plain', '.txt', 0.10),
+    ('text/markdown', '.md', 0.10),
+    ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx', 0.05),
+]
+
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_value(value):
+    """One field in COPY's text format."""
+    if value is None:
+        return '\\N'
+    return str(value).translate(_ESCAPES)
+
+
+def copy_line(values):
+    return '\t'.join(copy_value(v) for v in values) + '\n'
+
+
+class CopyStream:
+    """File-like object for copy_expert, reading COPY text lines from an iterator."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ''
+        self.rows = 0
+
+    def read(self, size=-1):
+        chunks, length = [self._buffer], len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+            self.rows += 1
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def random_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def sentence(rng, n=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def skewed_index(rng, n):
+    """0..n-1, with low indices much more likely (heavy users, popular blobs)."""
+    return int(n * rng.random() ** 2)
+
+
+class Corpus:
+    """
+    Pre-generated Markdown, already escaped for COPY, that notes and pages are
+    sliced from on paragraph boundaries (generating text per row is far too slow).
+    """
+
+    def __init__(self, rng, chars=4 * 1024 * 1024):
+        paragraphs, total = [], 0
+        while total < chars:
+            kind = rng.random()
+            if kind < 0.1:
+                text = '## ' + sentence(rng, rng.randint(2, 6))
+            elif kind < 0.4:
+                text = '\n'.join('- ' + sentence(rng, rng.randint(4, 12)) for _ in range(rng.randint(2, 6)))
+            elif kind < 0.45:
+                text = '```python\n' + '\n'.join(
+                    f"{rng.choice(WORDS)} = {rng.choice(WORDS)}({rng.randint(0, 99)})" for _ in range(rng.randint(2, 8))
+                ) + '\n```'
+            else:
+                text = ' '.join(sentence(rng) for _ in range(rng.randint(2, 6)))
+            paragraphs.append(copy_value(text))
+            total += len(paragraphs[-1]) + 4
+        self.separator = copy_value('\n\n')
+        self.text = self.separator.join(paragraphs)
+        self.starts, offset = [], 0
+        for paragraph in paragraphs:
+            self.starts.append(offset)
+            offset += len(paragraph) + len(self.separator)
+        self.starts.append(offset)  # sentinel: one past the end
+        # Slices may start only where a maximum-length slice still fits
+        self.max_start = bisect.bisect_left(self.starts, len(self.text) - MAX_MARKDOWN_CHARS)
+
+    def slice(self, rng, length):
+        """About `length` characters of whole paragraphs (escaped)."""
+        first = rng.randrange(self.max_start)
+        start = self.starts[first]
+        last = max(first + 1, bisect.bisect_left(self.starts, start + length))
+        return self.text[start:self.starts[last] - len(self.separator)]
+
+
+def timestamps(rng, as_of, days):
+    created = as_of - timedelta(seconds=rng.random() * days * 86400)
+    updated = created + timedelta(seconds=rng.random() * (as_of - created).total_seconds())
+    return created, updated
+
+
+# --------------------------------------------------------------------
+# Rows
+# --------------------------------------------------------------------
+
+def blob_pool(args):
+    """[(sha256, content_type, extension, size, content)] for the shared blobs."""
+    rng = random.Random(f'{args.seed}:blobs')
+    pool = []
+    for i in range(args.blobs):
+        content_type, extension, _ = rng.choices(DOCUMENT_TYPES, weights=[t[2] for t in DOCUMENT_TYPES])[0]
+        size = int(min(args.max_blob_kb * 1024, max(1024, rng.lognormvariate(10.5, 1.0))))
+        header = b'%PDF-1.4\n' if content_type == 'application/pdf' else b''
+        content = header + f'edunote dataset blob {args.seed}/{i}\n'.encode() + rng.randbytes(size)
+        content = content[:size]
+        pool.append((hashlib.sha256(content).hexdigest(), content_type, extension, size, content))
+    return pool
+
+
+def user_ids(args):
+    rng = random.Random(f'{args.seed}:user-ids')
+    return [random_uuid(rng) for _ in range(args.users)]
+
+
+def user_rows(args, users, password_hash, as_of):
+    rng = random.Random(f'{args.seed}:users')
+    for i, user_id in enumerate(users):
+        created, _ = timestamps(rng, as_of, args.days)
+        yield copy_line((user_id, f'student{i:07d}@{EMAIL_DOMAIN}', f'Student {i}', password_hash, created.isoformat()))
+
+
+def document_rows(args, users, pool, as_of, documents_by_user, references, extracted):
+    rng = random.Random(f'{args.seed}:documents')
+    for _ in range(args.documents):
+        document_id = random_uuid(rng)
+        owner = skewed_index(rng, len(users))
+        sha256, content_type, extension, size, _ = pool[skewed_index(rng, len(pool))]
+        created, updated = timestamps(rng, as_of, args.days)
+        title = sentence(rng, rng.randint(2, 6))[:-1]
+        if rng.random() < 0.97:
+            status, page_count = 'done', rng.randint(1, args.max_pages)
+        else:
+            status, page_count = 'failed', None
+        documents_by_user.setdefault(owner, []).append(document_id)
+        if page_count:
+            extracted.append((document_id, page_count))
+        references[sha256] = references.get(sha256, 0) + 1
+        yield copy_line((
+            document_id, title, title.lower().replace(' ', '-') + extension, f'local:{blob_key(sha256)}', size,
+            content_type, users[owner], sentence(rng, 10) if rng.random() < 0.3 else None,
+            created.isoformat(), updated.isoformat(), sha256, status, page_count,
+        ))
+
+
+def page_rows(args, corpus, extracted):
+    """Extracted text for the (document id, page count) pairs document_rows collected."""
+    rng = random.Random(f'{args.seed}:pages')
+    for document_id, page_count in extracted:
+        for page_number in range(1, page_count + 1):
+            yield f'{document_id}\t{page_number}\t{corpus.slice(rng, rng.randint(300, 2500))}\n'
+
+
+def note_rows(args, users, corpus, as_of, documents_by_user):
+    rng = random.Random(f'{args.seed}:notes')
+    summaries = [copy_value(json.dumps(summary_json(rng))) for _ in range(500)]
+    mu = 7.3  # median ~1.5 KB
+    for _ in range(args.notes):
+        owner = skewed_index(rng, len(users))
+        created, updated = timestamps(rng, as_of, args.days)
+        length = int(min(MAX_MARKDOWN_CHARS, max(20, rng.lognormvariate(mu, 1.1))))
+        documents = documents_by_user.get(owner)
+        document_id = rng.choice(documents) if documents and rng.random() < 0.15 else None
+        quiz_ids = [random_uuid(rng) for _ in range(rng.randint(1, 5))] if rng.random() < 0.2 else []
+        flashcard_ids = [random_uuid(rng) for _ in range(rng.randint(1, 5))] if rng.random() < 0.25 else []
+        summarized = rng.random() < 0.4
+        summary_at = updated + timedelta(seconds=rng.random() * (as_of - updated).total_seconds()) if summarized else None
+        # Markdown and summary are pre-escaped; every other field is escape-free
+        yield '\t'.join((
+            random_uuid(rng), users[owner], document_id or '\\N', sentence(rng, rng.randint(2, 8))[:-1],
+            corpus.slice(rng, length), '{' + ','.join(quiz_ids) + '}', '{' + ','.join(flashcard_ids) + '}',
+            random_uuid(rng) if rng.random() < 0.05 else '\\N', 't' if rng.random() < 0.1 else 'f',
+            created.isoformat(), updated.isoformat(),
+            rng.choice(summaries) if summarized else '\\N', summary_at.isoformat() if summarized else '\\N',
+        )) + '\n'
+
+
+def summary_json(rng):
+    words = rng.sample(WORDS, 10)
+    return {
+        'title': ' '.join(words[:3]).title(),
+        'tldr': ' '.join(sentence(rng) for _ in range(2)),
+        'key_points': [sentence(rng, 8) for _ in range(rng.randint(3, 7))],
+        'action_items': [sentence(rng, 6) for _ in range(rng.randint(0, 3))],
+        'questions': [sentence(rng, 8)[:-1] + '?' for _ in range(rng.randint(0, 3))],
+        'keywords': words[:rng.randint(5, 10)],
+    }
+
+
+def blob_key(sha256):
+    """Same layout as document_service.storage.blob_key."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+# --------------------------------------------------------------------
+# Loading
+# --------------------------------------------------------------------
+
+def copy(cur, table, columns, lines):
+    stream = CopyStream(lines)
+    start = time.perf_counter()
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=1024 * 1024)
+    elapsed = time.perf_counter() - start
+    print(f"  {table:<14} {stream.rows:>10,} rows in {elapsed:6.1f}s ({stream.rows / max(elapsed, 1e-9) * 60:>12,.0f} rows/min)")
+    return stream.rows
+
+
+def reset(cur, uploads_dir):
+    """Remove generated users (cascading to their notes, documents and pages) and blobs only they used."""
+    cur.execute(f"""
+        CREATE TEMP TABLE dataset_refs ON COMMIT DROP AS
+        SELECT d.blob_sha256 AS sha256, count(*) AS refs
+          FROM document d JOIN app_user u ON u.id = d.owner_id
+         WHERE u.email LIKE '%%@{EMAIL_DOMAIN}' AND d.blob_sha256 IS NOT NULL
+         GROUP BY d.blob_sha256
+    """)
+    cur.execute(f"DELETE FROM app_user WHERE email LIKE '%%@{EMAIL_DOMAIN}'")
+    users = cur.rowcount
+    cur.execute("UPDATE blob b SET ref_count = GREATEST(b.ref_count - r.refs, 0) FROM dataset_refs r WHERE b.sha256 = r.sha256")
+    cur.execute("""
+        DELETE FROM blob b USING dataset_refs r
+         WHERE b.sha256 = r.sha256 AND b.ref_count = 0
+           AND NOT EXISTS (SELECT 1 FROM document d WHERE d.blob_sha256 = b.sha256)
+        RETURNING b.sha256
+    """)
+    removed = [row[0] for row in cur.fetchall()]
+    if uploads_dir:
+        for sha256 in removed:
+            try:
+                os.remove(os.path.join(uploads_dir, blob_key(sha256)))
+            except OSError:
+                pass
+    print(f"🧹 Removed {users} generated users and {len(removed)} blobs")
+
+
+def write_blobs(pool, uploads_dir):
+    for sha256, _, _, _, content in pool:
+        path = os.path.join(uploads_dir, blob_key(sha256))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+
+def hash_password(password):
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt_sha256"]).hash(password)
+
+
+def generate(args):
+    as_of = datetime.combine(args.as_of, datetime.min.time(), tzinfo=timezone.utc)
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+            if args.reset:
+                reset(cur, args.uploads_dir)
+            if args.users <= 0:
+                conn.commit()
+                return
+
+            print(f"Generating {args.users:,} users, {args.notes:,} notes, {args.documents:,} documents "
+                  f"(seed {args.seed}, as of {args.as_of})")
+            corpus = Corpus(random.Random(f'{args.seed}:corpus'))
+            pool = blob_pool(args) if args.documents else []
+            start = time.perf_counter()
+
+            users = user_ids(args)
+            copy(cur, 'app_user', ('id', 'email', 'display_name', 'password', 'created_at'),
+                 user_rows(args, users, hash_password(PASSWORD), as_of))
+
+            documents_by_user, references, extracted = {}, {}, []
+            if args.documents:
+                # Documents reference blobs, so the pool goes in first (it may already exist)
+                # and gets its ref counts once the documents are in
+                cur.execute("CREATE TEMP TABLE dataset_blob (LIKE blob INCLUDING DEFAULTS) ON COMMIT DROP")
+                copy(cur, 'dataset_blob', ('sha256', 'file_path', 'size', 'ref_count', 'encoding', 'stored_size'), (
+                    copy_line((sha256, f'local:{blob_key(sha256)}', size, 0, 'identity', size))
+                    for sha256, _, _, size, _ in pool
+                ))
+                cur.execute("INSERT INTO blob SELECT * FROM dataset_blob ON CONFLICT (sha256) DO NOTHING")
+                copy(cur, 'document', (
+                    'id', 'title', 'filename', 'file_path', 'file_size', 'content_type', 'owner_id', 'description',
+                    'created_at', 'updated_at', 'blob_sha256', 'extraction_status', 'page_count',
+                ), document_rows(args, users, pool, as_of, documents_by_user, references, extracted))
+                execute_values(cur, """
+                    UPDATE blob b SET ref_count = b.ref_count + r.refs
+                      FROM (VALUES %s) AS r (sha256, refs)
+                     WHERE b.sha256 = r.sha256
+                """, list(references.items()))
+                # Pool entries no document picked
+                cur.execute("""
+                    DELETE FROM blob b USING dataset_blob d
+                     WHERE b.sha256 = d.sha256 AND b.ref_count = 0
+                       AND NOT EXISTS (SELECT 1 FROM document x WHERE x.blob_sha256 = b.sha256)
+                """)
+                pool = [p for p in pool if p[0] in references]
+                if args.pages:
+                    copy(cur, 'document_page', ('document_id', 'page_number', 'text'), page_rows(args, corpus, extracted))
+
+            copy(cur, 'note', (
+                'id', 'owner_id', 'document_id', 'title', 'markdown', 'quiz_ids', 'flashcard_ids', 'chat_id',
+                'is_archived', 'created_at', 'updated_at', 'summary_json', 'summary_updated_at',
+            ), note_rows(args, users, corpus, as_of, documents_by_user))
+
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f"✅ Loaded in {elapsed:.1f}s")
+
+        if args.uploads_dir and pool:
+            write_blobs(pool, args.uploads_dir)
+            print(f"📁 Wrote {len(pool)} blob files to {args.uploads_dir}")
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in ('app_user', 'note', 'document', 'document_page', 'blob'):
+                cur.execute(f"ANALYZE {table}")
+    except errors.UniqueViolation as e:
+        conn.rollback()
+        print(f"❌ {e.pgerror.strip()}\n   Data from an earlier run is still there; pass --reset to replace it.")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--notes', type=int, default=100000)
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--blobs', type=int, default=200, help='Distinct files the documents share')
+    parser.add_argument('--max-blob-kb', type=int, default=512, help='Cap on blob file size')
+    parser.add_argument('--max-pages', type=int, default=30, help='Extracted pages per document, up to')
+    parser.add_argument('--no-pages', dest='pages', action='store_false', help="Don't generate document_page rows")
+    parser.add_argument('--days', type=int, default=365, help='Spread of created_at before --as-of')
+    parser.add_argument('--as-of', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        default=datetime.now(timezone.utc).date(), help='Newest timestamp (YYYY-MM-DD, default today)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--uploads-dir', help="Write the blob files here (the document service's UPLOAD_DIR)")
+    parser.add_argument('--reset', action='store_true', help='First remove data from earlier runs')
+    args = parser.parse_args()
+    if args.documents and args.blobs <= 0:
+        parser.error('--blobs must be positive when generating documents')
+    generate(args)
+
+
+if __name__ == '__main__':
+    main()
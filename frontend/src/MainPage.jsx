@@ -42,6 +42,7 @@ export default function MainPage({ user, onLogout }) {
   const [documents, setDocuments] = useState([]);
   const [selectedDocument, setSelectedDocument] = useState(null);
   const [isLoadingDocuments, setIsLoadingDocuments] = useState(false);
+  const [documentsCursor, setDocumentsCursor] = useState(null);
   
   // Delete confirmation state
   const [showDeleteConfirm, setShowDeleteConfirm] = useState(false);
@@ -81,8 +82,9 @@ export default function MainPage({ user, onLogout }) {
       setIsLoadingDocuments(true);
       
       try {
-        const docs = await getUserDocuments(user.id);
+        const { documents: docs, nextCursor } = await getUserDocuments(user.id);
         setDocuments(docs);
+        setDocumentsCursor(nextCursor);
       } catch (error) {
         console.error("Failed to fetch documents:", error);
       } finally {
@@ -93,6 +95,21 @@ export default function MainPage({ user, onLogout }) {
     fetchDocuments();
   }, [user?.id]);
 
+  // Load the next page of documents (the list starts with the newest page only)
+  const loadMoreDocuments = async () => {
+    if (!documentsCursor || isLoadingDocuments) return;
+    setIsLoadingDocuments(true);
+    try {
+      const { documents: docs, nextCursor } = await getUserDocuments(user.id, { cursor: documentsCursor });
+      setDocuments(prev => [...prev, ...docs]);
+      setDocumentsCursor(nextCursor);
+    } catch (error) {
+      console.error("Failed to load more documents:", error);
+    } finally {
+      setIsLoadingDocuments(false);
+    }
+  };
+
   // Transform notes data into lectures structure
   const transformNotesToLectures = (notes) => {
     // Group notes by document_id or create individual lectures
@@ -523,9 +540,11 @@ export default function MainPage({ user, onLogout }) {
     
     // Refresh documents list
     try {
-      const docs = await getUserDocuments(user.id);
+      // New uploads are the newest documents, so they are on the first page
+      const { documents: docs, nextCursor } = await getUserDocuments(user.id);
       console.log("Refreshed documents:", docs);
       setDocuments(docs);
+      setDocumentsCursor(nextCursor);
       
       // If a PDF was uploaded, select it for viewing
       const pdfUploads = uploadedFiles.filter(f => f.file.type === 'application/pdf');
@@ -920,6 +939,10 @@ export default function MainPage({ user, onLogout }) {
                     <select
                       value={selectedDocument?.id || ''}
                       onChange={(e) => {
+                        if (e.target.value === '__more__') {
+                          loadMoreDocuments();
+                          return;
+                        }
                         const doc = documents.find(d => d.id === e.target.value);
                         setSelectedDocument(doc || null);
                       }}
@@ -931,6 +954,11 @@ export default function MainPage({ user, onLogout }) {
                           {doc.title} ({doc.content_type === 'application/pdf' ? 'PDF' : 'Other'})
                         </option>
                       ))}
+                      {documentsCursor && (
+                        <option value="__more__" disabled={isLoadingDocuments}>
+                          {isLoadingDocuments ? 'Loading...' : 'Load more documents...'}
+                        </option>
+                      )}
                     </select>
                   )}
                   <button 
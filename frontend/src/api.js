@@ -100,7 +100,11 @@ export async function summarizeNote(noteId) {
 const NOTES_API_BASE = import.meta.env.VITE_NOTES_API_BASE || "http://localhost:8001";
 
 export async function summarizeNotePersist(id) {
-  const res = await fetch(`${NOTES_API_BASE}/notes/${id}/summary`, { method: "PUT" });
+  // With the session cookie, so the rate limit applies per user rather than per address
+  const res = await fetch(`${NOTES_API_BASE}/notes/${id}/summary`, {
+    method: "PUT",
+    credentials: "include",
+  });
   if (!res.ok) throw new Error(`Summarize failed (${res.status})`);
   return res.json();
 }
@@ -118,13 +122,16 @@ export async function uploadDocument(formData) {
   return res.json();
 }
 
-export async function getUserDocuments(ownerId) {
-  const res = await fetch(`/documents?owner_id=${ownerId}`);
+export async function getUserDocuments(ownerId, { cursor = null, pageSize = 50 } = {}) {
+  // One page, newest first; pass the returned nextCursor to get the next one (null on the last page)
+  const params = new URLSearchParams({ owner_id: ownerId, limit: String(pageSize) });
+  if (cursor) params.set("cursor", cursor);
+  const res = await fetch(`/documents?${params}`);
   if (!res.ok) {
     const data = await res.json().catch(() => ({}));
     throw new Error(data.detail || "Failed to get user documents");
   }
-  return res.json();
+  return { documents: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
 }
 
 export async function getDocument(documentId) {
@@ -6,10 +6,10 @@ export default defineConfig({
   plugins: [react()],
   server: {
     proxy: {
-      // forwards /auth/* to FastAPI on :8000
-      "/auth": "http://localhost:8000",
-      "/notes": "http://localhost:8001",
-      "/documents": "http://localhost:8002"
+      // forwards /auth/* to FastAPI on :8000; xfwd adds X-Forwarded-For (see RATE_LIMIT_TRUSTED_PROXIES)
+      "/auth": { target: "http://localhost:8000", xfwd: true },
+      "/notes": { target: "http://localhost:8001", xfwd: true },
+      "/documents": { target: "http://localhost:8002", xfwd: true }
     }
   }
 })